@@ -0,0 +1,135 @@
+"""Approximate nearest-neighbour search: an IVF index in pure NumPy.
+
+Rows of the embedding store are clustered with spherical k-means; a query
+scores the centroids, probes the nprobe closest lists and scores only the rows
+in them. The index is built offline and saved next to the embedding store:
+
+    python ann_index.py build puhtad_andmed_embeddings [--lists 256]
+
+and is used by the app when config.SEARCH_BACKEND == "ivf".
+"""
+import argparse
+import os
+
+import numpy as np
+
+from embedding_store import load_store, read_header
+
+IVF_SUFFIX = ".ivf.npz"
+
+
+def _assign(matrix: np.ndarray, centroids: np.ndarray, batch: int = 8192) -> np.ndarray:
+    """Nearest centroid (by dot product) of every row, computed in batches."""
+    labels = np.empty(len(matrix), dtype=np.int32)
+    for start in range(0, len(matrix), batch):
+        labels[start:start + batch] = np.argmax(matrix[start:start + batch] @ centroids.T, axis=1)
+    return labels
+
+
+def spherical_kmeans(matrix: np.ndarray, n_lists: int, iters: int = 10, seed: int = 0,
+                     sample: int = 100_000) -> np.ndarray:
+    """Unit-norm k-means centroids, trained on at most *sample* rows."""
+    rng = np.random.default_rng(seed)
+    train = matrix if len(matrix) <= sample else matrix[np.sort(rng.choice(len(matrix), sample, replace=False))]
+    train = np.asarray(train, dtype=np.float32)
+    centroids = train[rng.choice(len(train), n_lists, replace=False)].copy()
+    for _ in range(iters):
+        labels = _assign(train, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, train)
+        empty = np.bincount(labels, minlength=n_lists) == 0
+        # Re-seed empty lists with random rows so every list stays useful.
+        sums[empty] = train[rng.choice(len(train), int(empty.sum()))]
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        centroids = sums / np.where(norms == 0, 1, norms)
+    return centroids
+
+
+class IVFIndex:
+    """Centroids plus the matrix rows of every list stored back to back (CSR layout)."""
+
+    def __init__(self, centroids: np.ndarray, list_offsets: np.ndarray, list_rows: np.ndarray,
+                 store_sha256: str = ""):
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self.list_rows = list_rows
+        self.store_sha256 = store_sha256
+
+    @classmethod
+    def build(cls, matrix: np.ndarray, n_lists: int | None = None, iters: int = 10,
+              store_sha256: str = "") -> "IVFIndex":
+        if n_lists is None:
+            n_lists = int(np.clip(round(2 * np.sqrt(len(matrix))), 1, 4096))
+        n_lists = min(n_lists, len(matrix))
+        centroids = spherical_kmeans(matrix, n_lists, iters)
+        labels = _assign(matrix, centroids)
+        list_rows = np.argsort(labels, kind="stable").astype(np.int32)
+        list_offsets = np.concatenate([[0], np.cumsum(np.bincount(labels, minlength=n_lists))])
+        return cls(centroids, list_offsets, list_rows, store_sha256)
+
+    def save(self, path: str):
+        tmp = path + ".tmp.npz"
+        np.savez(tmp, centroids=self.centroids, list_offsets=self.list_offsets,
+                 list_rows=self.list_rows, store_sha256=np.array(self.store_sha256))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "IVFIndex":
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data["centroids"], data["list_offsets"], data["list_rows"], str(data["store_sha256"]))
+
+    def candidates(self, query_vec: np.ndarray, nprobe: int) -> np.ndarray:
+        """Matrix rows of the nprobe lists whose centroids are closest to the query."""
+        nprobe = min(nprobe, len(self.centroids))
+        probe = np.argpartition(-(self.centroids @ query_vec), nprobe - 1)[:nprobe]
+        return np.concatenate([self.list_rows[self.list_offsets[i]:self.list_offsets[i + 1]] for i in probe])
+
+    def search(self, matrix: np.ndarray, query_vec: np.ndarray, k: int, nprobe: int,
+               keep: np.ndarray | None = None):
+        """Scores only the probed rows, restricted to *keep* (a boolean row mask) when given.
+        Returns (rows, scores) or None when fewer than k candidates survive the filter."""
+        rows = self.candidates(query_vec, nprobe)
+        if keep is not None:
+            rows = rows[keep[rows]]
+        if len(rows) < k:
+            return None
+        return rows, matrix[rows] @ query_vec
+
+
+def index_path(base: str) -> str:
+    return base + IVF_SUFFIX
+
+
+def load_for_store(base: str):
+    """The saved index for the store *base*, or None if it is missing or built from other data."""
+    path = index_path(base)
+    if not os.path.exists(path):
+        return None
+    index = IVFIndex.load(path)
+    if index.store_sha256 != read_header(base)["sha256"]:
+        print(f"Hoiatus: {path} on ehitatud teiste embeddingute pealt, kasutan täpset otsingut.")
+        return None
+    return index
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_build = sub.add_parser("build", help="Ehita IVF indeks embedding-hoidlast")
+    p_build.add_argument("base")
+    p_build.add_argument("--lists", type=int, default=None)
+    p_build.add_argument("--iters", type=int, default=10)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        matrix, _, header = load_store(args.base)
+        index = IVFIndex.build(matrix, args.lists, args.iters, header["sha256"])
+        index.save(index_path(args.base))
+        sizes = np.diff(index.list_offsets)
+        print(f"IVF: {len(index.centroids)} listi, {len(matrix):,} rida "
+              f"(listi suurus min {sizes.min()}, mediaan {int(np.median(sizes))}, max {sizes.max()}) "
+              f"→ {index_path(args.base)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,11 @@
 import pandas as pd
 import streamlit as st
 from dotenv import load_dotenv
-from openai import OpenAI
 
 from config import ASSISTANT_AVATAR, EAP_DEFAULT, FILTER_NONE, USER_AVATAR
-from data_loader import get_models
+from data_loader import get_test_cases, models_ready, start_loading
 from filters import get_pending_filters_tuple
+from llm_client import get_client
 from query_handlers import handle_followup_query
 from session_state import init_session_state
 from testing import run_test_cases
@@ -20,6 +20,7 @@ load_dotenv()
 
 
 def main():
+    start_loading()
     st.set_page_config(
         page_title="AI Kursuste Nõustaja · TÜ",
         page_icon="🎓",
@@ -29,12 +30,14 @@ def main():
     apply_custom_css()
 
     init_session_state()
-    embedder, df, embeddings_df, test_cases_df = get_models()
+    test_cases_df = get_test_cases()
     api_key, test_count, run_tests = render_top_panel(test_cases_df)
+    if not models_ready():
+        st.caption("⏳ Keelemudel laeb taustal – päringu võib juba sisestada, vastus tuleb kohe kui mudel on valmis.")
 
-    client = OpenAI(base_url="https://openrouter.ai/api/v1", api_key=api_key) if api_key else None
+    client = get_client(api_key) if api_key else None
 
-    render_chat_filter_gate(api_key, client, embedder, df, embeddings_df)
+    render_chat_filter_gate(api_key, client)
     render_chat_history()
 
     prompt = st.chat_input("Kirjelda, mida soovid õppida...")
@@ -43,7 +46,7 @@ def main():
         if not api_key:
             st.error("Palun sisesta OpenRouter API võti ülapaneelis, et teste jooksutada!")
         else:
-            run_test_cases(client, embedder, df, embeddings_df, test_cases_df, test_count)
+            run_test_cases(client, test_cases_df, test_count)
 
     last_results = st.session_state.get("last_test_results", pd.DataFrame())
     last_summary = st.session_state.get("last_test_summary", {"total": 0, "passed": 0, "failed": 0})
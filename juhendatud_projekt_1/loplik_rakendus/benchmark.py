@@ -0,0 +1,1070 @@
+"""Offline benchmarks for the retrieval pipeline.
+
+Run from this directory, next to the data files:
+
+    python benchmark.py search [--scale 50] [--queries 200]
+    python benchmark.py load
+    python benchmark.py store [--scale 1 10]
+    python benchmark.py filters [--samples 500]
+    python benchmark.py strategy [--scale 1 10]
+    python benchmark.py embedcache
+    python benchmark.py ann [--scale 1 10] [--nprobe 1 4 8 16 32]
+    python benchmark.py quant [--scale 1 10]
+    python benchmark.py lexical [--queries 50]
+    python benchmark.py startup [--runs 3]
+    python benchmark.py imports [--save-baseline] [--tolerance 0.25]
+    python benchmark.py harvest [--courses 60] [--latency-ms 150] [--rate 10 50]
+    python benchmark.py cleaning [--raw toorandmed_aasta.csv | --synthetic 20000]
+    python benchmark.py memory [--scale 1 10]
+    python benchmark.py resultcache [--requests 500] [--scale 1 10]
+    python benchmark.py history [--turns 15]
+    python benchmark.py stream [--tokens 1500] [--rate 150]
+    python benchmark.py llmclient [--requests 20] [--fail-rate 0.3]
+    python benchmark.py hedge [--requests 60] [--stall-rate 0.1] [--stall-ms 5000]
+    python benchmark.py compact [--cases 77] [--tokens-per-s 60]
+    python benchmark.py context [--cases 77] [--live]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from config import (
+    CLEAN_CHUNK_ROWS,
+    DATA_CSV,
+    DATA_EMBEDDING_STORE,
+    DATA_EMBEDDINGS,
+    DATA_SENTENCE_STORE,
+    EAP_DEFAULT,
+    EMBEDDING_MODEL,
+    FILTER_NONE,
+    HARVEST_RATE,
+    HARVEST_WORKERS,
+    QUERY_CACHE_DB,
+    TEST_CASES_FILE,
+)
+from ann_index import IVFIndex
+from course_store import CourseStore, memory_summary
+from embedding_cache import QueryEmbeddingCache
+from embedding_store import QuantizedMatrix, build_embedding_matrix, load_store, store_exists
+from filter_index import EQUALITY_COLUMNS, SUBSTRING_COLUMNS, FilterIndex
+from filters import build_filter_mask
+from rag import retrieve, top_k_indices
+
+SAMPLE_FILTERS = [
+    (FILTER_NONE, FILTER_NONE, FILTER_NONE, FILTER_NONE, FILTER_NONE, EAP_DEFAULT),
+    ("kevad", "eesti keel", FILTER_NONE, FILTER_NONE, FILTER_NONE, EAP_DEFAULT),
+    (FILTER_NONE, "inglise keel", "magistriõpe", FILTER_NONE, "Tartu linn", (3, 6)),
+    ("sügis", FILTER_NONE, "bakalaureuseõpe", "veebiõpe", FILTER_NONE, (1, 12)),
+]
+
+
+def _peak_mib(fn) -> float:
+    """Peak Python/NumPy heap allocated while running *fn*, in MiB."""
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 2**20
+
+
+def _timeit(fn, repeats: int) -> float:
+    """Median wall time of *fn* in milliseconds."""
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return float(np.median(times))
+
+
+def load_corpus(scale: int = 1):
+    """Reads the real corpus; with scale > 1 tiles it into a synthetic catalogue with jittered vectors."""
+    df = pd.read_csv(DATA_CSV)
+    embeddings_df = pd.read_pickle(DATA_EMBEDDINGS)
+    if scale > 1:
+        rng = np.random.default_rng(0)
+        copies_df, copies_emb = [], []
+        for i in range(scale):
+            suffix = f"#{i}" if i else ""
+            copies_df.append(df.assign(unique_ID=df["unique_ID"].astype(str) + suffix))
+            vectors = np.stack(embeddings_df["embedding"].values).astype(np.float32)
+            if i:
+                vectors = vectors + rng.normal(0, 0.01, vectors.shape).astype(np.float32)
+            copies_emb.append(pd.DataFrame({
+                "unique_ID": embeddings_df["unique_ID"].astype(str) + suffix,
+                "embedding": list(vectors),
+            }))
+        df = pd.concat(copies_df, ignore_index=True)
+        embeddings_df = pd.concat(copies_emb, ignore_index=True)
+    return df, embeddings_df
+
+
+def bench_search(scale: int, n_queries: int, k: int = 5, repeats: int = 3):
+    """Old per-query stack + cosine_similarity + sort_values vs. the precomputed matrix + argpartition."""
+    from sklearn.metrics.pairwise import cosine_similarity
+
+    df, embeddings_df = load_corpus(scale)
+    dim = len(embeddings_df["embedding"].iloc[0])
+    queries = np.random.default_rng(1).normal(size=(n_queries, dim)).astype(np.float32)
+
+    merged_old = pd.merge(df, embeddings_df, on="unique_ID")
+
+    def old_path():
+        for q in queries:
+            emb = np.stack(merged_old["embedding"].values)
+            scored = merged_old.copy()
+            scored["score"] = cosine_similarity([q], emb)[0]
+            scored.sort_values("score", ascending=False).head(k)
+
+    start = time.perf_counter()
+    emb_matrix, row_ids = build_embedding_matrix(embeddings_df)
+    build_ms = (time.perf_counter() - start) * 1000
+    merged_new = pd.merge(df, pd.DataFrame({"unique_ID": row_ids, "emb_row": np.arange(len(row_ids))}),
+                          on="unique_ID")
+    rows = merged_new["emb_row"].to_numpy()
+    queries_norm = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+    def new_path():
+        for q in queries_norm:
+            scores = (emb_matrix @ q)[rows]
+            merged_new.iloc[top_k_indices(scores, k)]
+
+    old_ms = _timeit(old_path, repeats) / n_queries
+    new_ms = _timeit(new_path, repeats) / n_queries
+    print(f"Korpus: {len(merged_new):,} rida × {dim} (scale={scale}), maatriksi ehitus {build_ms:.1f} ms")
+    print(f"  vana (stack + cosine_similarity + sort_values): {old_ms:8.3f} ms/päring")
+    print(f"  uus  (float32 maatriks + argpartition):         {new_ms:8.3f} ms/päring")
+    print(f"  kiirendus: {old_ms / new_ms:.1f}x")
+
+
+def bench_load(repeats: int = 3):
+    """Cold load of the legacy pickle vs. opening the memmapped store (plus one full scan)."""
+    def from_pickle():
+        matrix, _ = build_embedding_matrix(pd.read_pickle(DATA_EMBEDDINGS))
+        return matrix
+
+    def from_store():
+        matrix, _, _ = load_store(DATA_EMBEDDING_STORE)
+        return matrix
+
+    if not store_exists(DATA_EMBEDDING_STORE):
+        print(f"Hoidlat '{DATA_EMBEDDING_STORE}' ei leitud – käivita enne embedding_store.py convert.")
+        return
+    query = np.random.default_rng(1).normal(size=from_store().shape[1]).astype(np.float32)
+    print(f"  pickle → maatriks:        {_timeit(from_pickle, repeats):8.1f} ms")
+    print(f"  memmap avamine:           {_timeit(from_store, repeats):8.3f} ms")
+    print(f"  memmap avamine + 1 otsing: {_timeit(lambda: from_store() @ query, repeats):8.1f} ms")
+
+
+def bench_store(scale: int, n_queries: int, k: int = 5, repeats: int = 3):
+    """Per-query merge + mask + copy (old handle_first_query) vs. CourseStore row ids."""
+    from sklearn.metrics.pairwise import cosine_similarity
+
+    df, embeddings_df = load_corpus(scale)
+    dim = len(embeddings_df["embedding"].iloc[0])
+    queries = np.random.default_rng(1).normal(size=(n_queries, dim)).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    store = CourseStore(df, *build_embedding_matrix(embeddings_df))
+
+    def old_query(q, filters):
+        merged = pd.merge(df, embeddings_df, on="unique_ID")
+        filtered_df = merged[build_filter_mask(merged, *filters)].copy()
+        if filtered_df.empty:
+            return
+        scored = filtered_df.copy()
+        scored["score"] = cosine_similarity([q], np.stack(scored["embedding"].values))[0]
+        scored.sort_values("score", ascending=False).head(k)
+
+    def new_query(q, filters):
+        top_rows, scores, _ = store.search(q, store.filter(filters), k)
+        store.rows_frame(top_rows, scores)
+
+    print(f"Korpus: {len(store):,} rida × {dim} (scale={scale})")
+    for name, query_fn in (("vana (merge + mask + copy)", old_query), ("uus (CourseStore)", new_query)):
+        def run():
+            for q in queries:
+                for filters in SAMPLE_FILTERS:
+                    query_fn(q, filters)
+
+        per_query = _timeit(run, repeats) / (n_queries * len(SAMPLE_FILTERS))
+        peak = _peak_mib(lambda: query_fn(queries[0], SAMPLE_FILTERS[0]))
+        print(f"  {name:28s} {per_query:8.2f} ms/päring · tipp-mälu päringu kohta {peak:8.1f} MiB")
+
+
+def filter_candidates(df: pd.DataFrame, samples: int, seed: int = 0) -> list[tuple]:
+    """Every single-column filter plus random combinations, drawn from the values present in *df*."""
+    options = {}
+    for col in EQUALITY_COLUMNS + SUBSTRING_COLUMNS:
+        values = df[col].dropna().astype(str)
+        if col in SUBSTRING_COLUMNS:
+            values = values.str.split(", ").explode()
+        options[col] = [FILTER_NONE] + sorted(values.unique()) + ["puudub-andmetes"]
+    eap_ranges = [EAP_DEFAULT, (1, 3), (3, 6), (6, 6), (5, 36), (30, 36)]
+    columns = list(options)
+
+    none = (FILTER_NONE,) * len(columns)
+    candidates = [none + (eap,) for eap in eap_ranges]
+    for i, col in enumerate(columns):
+        for val in options[col]:
+            candidates.append(none[:i] + (val,) + none[i + 1:] + (EAP_DEFAULT,))
+    rng = np.random.default_rng(seed)
+    for _ in range(samples):
+        combo = tuple(options[col][rng.integers(len(options[col]))] for col in columns)
+        candidates.append(combo + (eap_ranges[rng.integers(len(eap_ranges))],))
+    return candidates
+
+
+def bench_filters(samples: int):
+    """Times FilterIndex against build_filter_mask on the shipped CSV, loaded like the app
+    does (test_filter_index.py checks that both give the same rows)."""
+    from data_loader import read_courses
+
+    df = read_courses(DATA_CSV)
+    index = FilterIndex(df)
+    candidates = filter_candidates(df, samples)
+    old_ms = _timeit(lambda: [build_filter_mask(df, *f) for f in candidates], 1) / len(candidates)
+    cold = FilterIndex(df, cache_size=0)
+    new_ms = _timeit(lambda: [cold.rows_for(f) for f in candidates], 3) / len(candidates)
+    cached_ms = _timeit(lambda: [index.rows_for(f) for f in candidates], 3) / len(candidates)
+    print(f"{len(candidates):,} filtrikombinatsiooni")
+    print(f"  build_filter_mask:        {old_ms:8.3f} ms/filter")
+    print(f"  FilterIndex (ilma LRU-ta): {new_ms:8.3f} ms/filter")
+    print(f"  FilterIndex (LRU tabamus): {cached_ms:8.4f} ms/filter")
+
+
+def bench_strategy(scale: int, n_queries: int = 20, k: int = 5):
+    """Full scan + score masking vs. gathering the selected rows, across filter selectivities."""
+    import course_store
+
+    df, embeddings_df = load_corpus(scale)
+    store = CourseStore(df, *build_embedding_matrix(embeddings_df))
+    rng = np.random.default_rng(2)
+    queries = rng.normal(size=(n_queries, store.matrix.shape[1])).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    threshold = course_store.SEARCH_FULL_SCAN_MIN_SELECTIVITY
+    print(f"Korpus: {len(store):,} rida (scale={scale}); lävi praegu {threshold:.0%}")
+
+    for selectivity in (0.01, 0.05, 0.1, 0.2, 0.3, 0.5, 0.8, 1.0):
+        rows = np.sort(rng.choice(len(store), max(1, int(selectivity * len(store))), replace=False))
+        timings = {}
+        for strategy, forced in (("full_scan", 0.0), ("gather", 1.01)):
+            course_store.SEARCH_FULL_SCAN_MIN_SELECTIVITY = forced
+            timings[strategy] = _timeit(lambda: [store.search(q, rows, k) for q in queries], 3) / n_queries
+        course_store.SEARCH_FULL_SCAN_MIN_SELECTIVITY = threshold
+        best = min(timings, key=timings.get)
+        print(f"  {selectivity:5.0%}: full_scan {timings['full_scan']:7.3f} ms · "
+              f"gather {timings['gather']:7.3f} ms → {best}")
+
+
+def bench_embedding_cache():
+    """Encodes the test-suite queries without cache, with a warm LRU and from the SQLite file only."""
+    from sentence_transformers import SentenceTransformer
+
+    queries = pd.read_csv(TEST_CASES_FILE).iloc[:, 0].astype(str).tolist()
+    model = SentenceTransformer(EMBEDDING_MODEL)
+    model.encode(["soojendus"])
+
+    def run(embedder):
+        return _timeit(lambda: [embedder.encode([q]) for q in queries], 1) / len(queries)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "cache.sqlite")
+        cache = QueryEmbeddingCache(model, EMBEDDING_MODEL, db_path)
+        print(f"{len(queries)} testpäringut, mudel {EMBEDDING_MODEL}")
+        print(f"  ilma vahemäluta:        {run(model):9.3f} ms/päring")
+        print(f"  külm vahemälu:          {run(cache):9.3f} ms/päring")
+        print(f"  soe LRU:                {run(cache):9.3f} ms/päring")
+        restarted = QueryEmbeddingCache(model, EMBEDDING_MODEL, db_path)
+        print(f"  pärast taaskäivitust:   {run(restarted):9.3f} ms/päring (SQLite)")
+        print(f"  loendurid: {restarted.stats_snapshot()}")
+
+
+def encode_test_queries() -> np.ndarray:
+    """Normalised vectors of the testjuhtumid.csv queries (through the persistent query cache)."""
+    from sentence_transformers import SentenceTransformer
+
+    queries = pd.read_csv(TEST_CASES_FILE).iloc[:, 0].astype(str).tolist()
+    embedder = QueryEmbeddingCache(SentenceTransformer(EMBEDDING_MODEL), EMBEDDING_MODEL, QUERY_CACHE_DB)
+    vectors = embedder.encode(queries)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def bench_ann(scale: int, nprobes: list[int], k: int = 5):
+    """Recall@k and latency of the IVF backend against exact search, unfiltered and with sample filters."""
+    import course_store
+
+    queries = encode_test_queries()
+    df, embeddings_df = load_corpus(scale)
+    store = CourseStore(df, *build_embedding_matrix(embeddings_df))
+    start = time.perf_counter()
+    ivf = IVFIndex.build(store.matrix)
+    build_s = time.perf_counter() - start
+    print(f"Korpus: {len(store):,} rida (scale={scale}), IVF {len(ivf.centroids)} listi, ehitus {build_s:.1f} s")
+
+    filter_rows = [store.filter(f) for f in SAMPLE_FILTERS]
+    exact = [[set(store.search(q, rows, k)[0]) for rows in filter_rows] for q in queries]
+    exact_ms = _timeit(lambda: [store.search(q, filter_rows[0], k) for q in queries], 3) / len(queries)
+    print(f"  täpne:       recall@{k} 1.000 · {exact_ms:7.3f} ms/päring")
+
+    default_nprobe = course_store.IVF_NPROBE
+    store.ann_index = ivf
+    for nprobe in nprobes:
+        course_store.IVF_NPROBE = nprobe
+        hits, strategies = [], set()
+        for q, expected in zip(queries, exact):
+            for rows, exp in zip(filter_rows, expected):
+                found, _, info = store.search(q, rows, k)
+                hits.append(len(exp & set(found)) / max(len(exp), 1))
+                strategies.add(info["strategy"])
+        ms = _timeit(lambda: [store.search(q, filter_rows[0], k) for q in queries], 3) / len(queries)
+        print(f"  nprobe={nprobe:<4d} recall@{k} {np.mean(hits):.3f} · {ms:7.3f} ms/päring "
+              f"(strateegiad: {', '.join(sorted(strategies))})")
+    course_store.IVF_NPROBE = default_nprobe
+
+
+def bench_quantization(scale: int, k: int = 5):
+    """Memory, first-pass scan speed and recall drift of int8/float16 copies with exact rescoring."""
+    queries = encode_test_queries()
+    df, embeddings_df = load_corpus(scale)
+    exact_store = CourseStore(df, *build_embedding_matrix(embeddings_df))
+    rows = exact_store.all_rows()
+    expected = [set(exact_store.search(q, rows, k)[0]) for q in queries]
+    f32_bytes = exact_store.matrix.nbytes
+    f32_ms = _timeit(lambda: [exact_store.matrix @ q for q in queries], 3) / len(queries)
+    print(f"Korpus: {len(exact_store):,} rida (scale={scale})")
+    print(f"  float32: {f32_bytes / 2**20:8.1f} MiB · skaneerimine {f32_ms:7.3f} ms/päring")
+
+    for kind in ("int8", "float16"):
+        quantized = QuantizedMatrix.from_matrix(kind, exact_store.matrix)
+        store = CourseStore(df, exact_store.matrix, exact_store.meta["unique_ID"].to_numpy(), quantized=quantized)
+        scan_ms = _timeit(lambda: [quantized.scores(q) for q in queries], 3) / len(queries)
+        search_ms = _timeit(lambda: [store.search(q, rows, k) for q in queries], 3) / len(queries)
+        raw_recall = np.mean([len(exp & set(top_k_indices(quantized.scores(q), k))) / k
+                              for q, exp in zip(queries, expected)])
+        recall = np.mean([len(exp & set(store.search(q, rows, k)[0])) / k for q, exp in zip(queries, expected)])
+        saved = 1 - quantized.codes.nbytes / f32_bytes
+        print(f"  {kind:8s} {quantized.codes.nbytes / 2**20:8.1f} MiB (-{saved:.0%}) · "
+              f"skaneerimine {scan_ms:7.3f} ms ({f32_ms / scan_ms:.2f}x) · otsing+üle hindamine {search_ms:7.3f} ms · "
+              f"recall@{k} ilma/koos üle hindamisega {raw_recall:.3f}/{recall:.3f}")
+
+
+def bench_lexical(n_queries: int, k: int = 5):
+    """Course-code lookups through the exact-match fast path vs. the dense path, plus hybrid search cost."""
+    from sentence_transformers import SentenceTransformer
+
+    df, embeddings_df = load_corpus()
+    start = time.perf_counter()
+    store = CourseStore(df, *build_embedding_matrix(embeddings_df))
+    print(f"Korpus: {len(store):,} rida; indeksite ehitus (sh BM25) {time.perf_counter() - start:.2f} s")
+    codes = store.meta["aine_kood"].dropna().astype(str).sample(n_queries, random_state=0, replace=True).tolist()
+    rows = store.all_rows()
+    embedder = SentenceTransformer(EMBEDDING_MODEL)
+    embedder.encode(["soojendus"])
+
+    def dense(query):
+        q = embedder.encode([query])[0]
+        return store.search(q / np.linalg.norm(q), rows, k)
+
+    fast_ms = _timeit(lambda: [retrieve(c, store, rows, embedder, k) for c in codes], 3) / len(codes)
+    dense_ms = _timeit(lambda: [dense(c) for c in codes], 1) / len(codes)
+    print(f"  ainekoodi päring, kiirtee: {fast_ms:9.4f} ms/päring")
+    print(f"  ainekoodi päring, dense:   {dense_ms:9.3f} ms/päring")
+    questions = [f"Millised kursused sarnanevad {c}-ga?" for c in codes]
+    mentioned_ms = _timeit(lambda: [retrieve(q, store, rows, embedder, k) for q in questions], 1) / len(questions)
+    print(f"  kood pikemas küsimuses (RRF): {mentioned_ms:6.3f} ms/päring")
+
+    queries = pd.read_csv(TEST_CASES_FILE).iloc[:, 0].astype(str).tolist()
+    bm25_ms = _timeit(lambda: [store.lexical_search(q, rows, 50) for q in queries], 3) / len(queries)
+    print(f"  BM25 + top-50 testpäringutel: {bm25_ms:7.3f} ms/päring")
+
+
+_STARTUP_PROBE = """
+import json, time
+start = time.perf_counter()
+from data_loader import get_test_cases, models_ready, start_loading
+from rag import retrieve
+future = start_loading()
+get_test_cases()
+painted = time.perf_counter()
+was_ready = models_ready()
+embedder, store = future.result()
+ready = time.perf_counter()
+retrieve("masinõpe algajatele", store, store.all_rows(), embedder, 5)
+answered = time.perf_counter()
+print(json.dumps({"paint": painted - start, "ready": ready - start, "answer": answered - start,
+                  "first_query": answered - ready, "was_ready": was_ready}))
+"""
+
+
+def bench_startup(runs: int = 3):
+    """Time-to-first-paint and time-to-first-answer (retrieval only, no LLM) in fresh processes.
+
+    Before the change main() blocked on the model load, so the first paint came
+    only after the load; now it comes right after the imports while the load
+    continues in the background."""
+    results = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", _STARTUP_PROBE], capture_output=True, text=True, check=True)
+        results.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    median = {key: float(np.median([r[key] for r in results])) for key in ("paint", "ready", "answer", "first_query")}
+    print(f"  esimene joonistus, enne (sünkroonne laadimine): {median['ready']:7.2f} s")
+    print(f"  esimene joonistus, nüüd (taustalaadimine):       {median['paint']:7.2f} s")
+    print(f"  esimene vastus (otsing, ilma LLM-ita):           {median['answer']:7.2f} s")
+    print(f"  esimese päringu otsing pärast soojendust:        {median['first_query'] * 1000:7.1f} ms")
+
+
+IMPORT_TARGETS = ("app7", "testing", "rag")
+# Loaded lazily (model loader thread, after an API key is known); importing them at
+# module level would put seconds back on every cold start, whatever the hardware.
+IMPORT_DEFERRED = ("torch", "sentence_transformers", "transformers", "sklearn", "openai", "httpx")
+# Committed; after an intended change, or on much slower or faster hardware, re-record it
+# with --save-baseline and commit the file.
+IMPORT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "import_baseline.json")
+
+
+def import_profile(module: str):
+    """Imports *module* in a fresh interpreter under -X importtime.
+    Returns (total_s, {top-level package: self time in s}) for the module's own import tree."""
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                         capture_output=True, text=True, check=True,
+                         cwd=os.path.dirname(os.path.abspath(__file__)))
+    entries = []
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        entries.append((int(self_us), int(cumulative_us), len(name) - len(name.lstrip()) - 1, name.strip()))
+    end = max(i for i, entry in enumerate(entries) if entry[3] == module and entry[2] == 0)
+    start = end
+    while start > 0 and entries[start - 1][2] > 0:  # children are printed before their parent
+        start -= 1
+    packages = {}
+    for self_us, _, _, name in entries[start:end + 1]:
+        root = name.split(".")[0]
+        packages[root] = packages.get(root, 0.0) + self_us / 1e6
+    return entries[end][1] / 1e6, packages
+
+
+def bench_imports(runs: int = 3, tolerance: float = 0.25, save_baseline: bool = False) -> bool:
+    """Cold import of the app's entry modules, summarised per top-level package.
+    Fails when an entry module imports a package of IMPORT_DEFERRED, when it is *tolerance*
+    slower than IMPORT_BASELINE, or when the baseline is missing (unless *save_baseline*).
+    Returns False on a regression."""
+    baseline = {}
+    if os.path.exists(IMPORT_BASELINE):
+        with open(IMPORT_BASELINE, encoding="utf-8") as f:
+            baseline = json.load(f)
+    elif not save_baseline:
+        print(f"Baasjoont '{IMPORT_BASELINE}' pole: salvesta see --save-baseline abil.")
+    measured, ok = {}, bool(baseline) or save_baseline
+    for module in IMPORT_TARGETS:
+        profiles = [import_profile(module) for _ in range(runs)]
+        total = float(np.median([p[0] for p in profiles]))
+        measured[module] = round(total, 4)
+        eager = [name for name in IMPORT_DEFERRED if name in profiles[-1][1]]
+        limit = baseline.get(module, float("inf") if save_baseline else 0.0) * (1 + tolerance)
+        status = "OK" if total <= limit and not eager else "REGRESSIOON"
+        ok &= total <= limit and not eager
+        print(f"  {module:8s} {total * 1000:7.0f} ms  (baasjoon {baseline.get(module, float('nan')) * 1000:5.0f} ms)  {status}")
+        if eager:
+            print(f"           impordib kohe: {', '.join(eager)}")
+        heaviest = sorted(profiles[-1][1].items(), key=lambda item: -item[1])[:6]
+        print("           " + ", ".join(f"{name} {sec * 1000:.0f} ms" for name, sec in heaviest))
+    if save_baseline:
+        with open(IMPORT_BASELINE, "w", encoding="utf-8") as f:
+            json.dump(measured, f, indent=2)
+            f.write("\n")
+        print(f"Baasjoon salvestatud → {IMPORT_BASELINE}")
+    return ok
+
+
+def _record_fake_ois2(directory: str, n_courses: int, first_page: int = 20):
+    """Writes stub recordings for a synthetic course list in the shape of the ÕIS2 API."""
+    from ois2_harvester import LIST_CHUNK_SIZE, recording_name
+
+    def dump(name, payload):
+        with open(os.path.join(directory, name), "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False)
+
+    courses = [{"uuid": f"c{i:05d}", "code": f"LTAT.{i // 1000:02d}.{i % 1000:03d}",
+                "latest_version_uuid": f"v{i:05d}"} for i in range(n_courses)]
+    dump(recording_name("GET", "/api/courses"), courses[:first_page])
+    offset = first_page
+    while True:
+        body = json.dumps({"start": offset, "take": LIST_CHUNK_SIZE}, sort_keys=True).encode("utf-8")
+        chunk = courses[offset:offset + LIST_CHUNK_SIZE]
+        dump(recording_name("POST", "/api/courses", body), chunk)
+        if not chunk:
+            break
+        offset += len(chunk)
+    for c in courses:
+        overview = {"description": {"et": f"Aine {c['code']} kirjeldus", "en": f"Course {c['code']}"},
+                    "learning_outcomes": [{"et": "oskab", "en": "can"}]}
+        dump(recording_name("GET", f"/api/courses/{c['uuid']}"),
+             {"uuid": c["uuid"], "code": c["code"], "title": {"et": c["code"], "en": c["code"]},
+              "credits": 6, "overview": overview})
+        dump(recording_name("GET", f"/api/courses/{c['uuid']}/versions"),
+             [{"uuid": c["latest_version_uuid"], "isLatest": True, "overview": overview,
+               "target": {"semester": {"et": "kevad"}}}])
+
+
+def bench_harvest(n_courses: int, latency_ms: float, rates: list[float], workers: int = HARVEST_WORKERS):
+    """Notebook-style sequential loop (0.1 s pause per course) vs. the concurrent harvester,
+    both against the replay stub with simulated network latency."""
+    from ois2_harvester import HarvestJournal, OIS2Client, _fetch_course, harvest
+    from ois2_stub_server import serve
+
+    with tempfile.TemporaryDirectory() as tmp:
+        _record_fake_ois2(tmp, n_courses)
+        server = serve(tmp, latency_s=latency_ms / 1000, fail_rate=0.02)
+        url = f"http://127.0.0.1:{server.server_address[1]}/api/courses"
+
+        client = OIS2Client(url, rate=1000, pool_size=1)
+        start = time.perf_counter()
+        courses = client.list_courses()
+        for course in courses:
+            _fetch_course(client, course)
+            time.sleep(0.1)
+        print(f"  märkmiku tsükkel (1 lõim, 0,1 s paus):   {time.perf_counter() - start:6.1f} s, {len(courses)} ainet")
+
+        for rate in rates:
+            journal = HarvestJournal(os.path.join(tmp, f"paevik_{rate}.sqlite"))
+            client = OIS2Client(url, rate=rate, pool_size=workers)
+            start = time.perf_counter()
+            stats = harvest(client, journal, client.list_courses(), workers)
+            print(f"  harvester ({workers} lõime, {rate:g} päringut/s):   {time.perf_counter() - start:6.1f} s, "
+                  f"pärisin {stats['fetched']}, vigu {stats['failed']}, kordusi {client.stats['retries']}")
+        start = time.perf_counter()
+        client = OIS2Client(url, rate=rates[-1], pool_size=workers)
+        stats = harvest(client, journal, client.list_courses(), workers)
+        print(f"  kordus muutumata andmetega:             {time.perf_counter() - start:6.1f} s, "
+              f"vahele jäetud {stats['skipped']}, päringuid {client.stats['requests']}")
+        journal.close()
+        server.shutdown()
+
+
+NOTEBOOK_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+def _synthetic_raw_export(path: str, n_rows: int, seed: int = 0):
+    """A raw export with the columns and JSON cell shapes the cleaning notebook reads."""
+    rng = np.random.default_rng(seed)
+    people = [f"Õppejõud {i}" for i in range(300)]
+    levels = [{"code": c, "et": et} for c, et in
+              [("BAKALAUREUS", "bakalaureuseõpe"), ("MAGISTER", "magistriõpe"), ("DOKTOR", "doktoriõpe")]]
+
+    def lecturers():
+        return json.dumps([{"person_name": str(p), "id": int(i)} for i, p in enumerate(rng.choice(people, 2))])
+
+    def schedule():
+        days = rng.integers(5, 12, size=rng.integers(0, 6))
+        return json.dumps([{"time": f"2025-02-{d:02d}T{int(rng.integers(8, 20)):02d}:15:00+02:00"} for d in days])
+
+    def prerequisites():
+        if rng.random() < 0.7:
+            return None
+        return json.dumps([{"code": f"LTAT.0{int(rng.integers(1, 9))}.00{int(rng.integers(1, 9))}",
+                            "title": {"et": "Eeldusaine"},
+                            "alternatives": [{"code": "MTMS.01.001", "title": {"en": "Alt"}}]}])
+
+    raw = pd.DataFrame({
+        "code": [f"LTAT.{i // 1000:02d}.{i % 1000:03d}" for i in range(n_rows)],
+        "title__et": [f"Aine {i}" for i in range(n_rows)],
+        "version__title__et": [None if i % 3 else f"Aine {i} (v)" for i in range(n_rows)],
+        "title__en": [f"Course {i}" for i in range(n_rows)],
+        "credits": rng.choice([3.0, 6.0, 2.25, np.nan], n_rows),
+        "version__credits": rng.choice([6.0, np.nan], n_rows),
+        "additional_info__duration_in_semesters": rng.choice([1, 2, np.nan], n_rows, p=[0.7, 0.1, 0.2]),
+        "general__type__et": rng.choice(["tavaline aine", "lõputöö", None], n_rows, p=[0.9, 0.05, 0.05]),
+        "overview__description__et": ["Kirjeldus " * int(rng.integers(5, 60)) for _ in range(n_rows)],
+        "version__target__semester__et": rng.choice(["kevad", "sügis", " kevad "], n_rows),
+        "version__target__study_type__et": "päevaõpe",
+        "version__target__language__et": rng.choice(["eesti keel", "inglise keel"], n_rows),
+        "version__target__course_main_structural_unit__city": rng.choice(["Tartu linn", None], n_rows),
+        "version__additional_info__study_levels": [
+            json.dumps([levels[int(j)] for j in rng.choice(3, int(rng.integers(1, 3)), replace=False)])
+            for _ in range(n_rows)],
+        "version__participants__lecturers": [lecturers() for _ in range(n_rows)],
+        "version__schedule__entries": [schedule() for _ in range(n_rows)],
+        "additional_info__prerequisites": [prerequisites() for _ in range(n_rows)],
+        "additional_info__assessment_scale__et": "Eristav (A, B, C, D, E, F, mi)",
+        "unused__wide_column": "x" * 200,
+    })
+    raw.to_csv(path, index=False)
+
+
+def _run_cleaning_notebook(raw_path: str, out_path: str):
+    """Executes the cleaning notebook's processing cells (not the report/plot cells) as they are."""
+    with open(os.path.join(NOTEBOOK_DIR, "andmete_puhastamine.ipynb"), encoding="utf-8") as f:
+        cells = [c for c in json.load(f)["cells"] if c["cell_type"] == "code"]
+    namespace = {"pd": pd, "np": np, "json": json, "os": os, "INPUT_FILE": raw_path, "OUTPUT_FILE": out_path}
+    with contextlib.redirect_stdout(io.StringIO()):
+        for cell in cells[1:8]:  # load, prefilter, resolve, JSON, categoricals, description, save
+            exec("".join(cell["source"]), namespace)
+
+
+def bench_cleaning(raw_path: str | None, synthetic_rows: int, chunk_rows: int = CLEAN_CHUNK_ROWS) -> bool:
+    """Notebook vs. streaming pipeline: wall time, peak heap and identical output."""
+    from data_cleaning import clean_file
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if raw_path is None or not os.path.exists(raw_path):
+            print(f"  Toorandmeid ei leitud, genereerin {synthetic_rows:,} sünteetilist rida.")
+            raw_path = os.path.join(tmp, "toorandmed.csv")
+            _synthetic_raw_export(raw_path, synthetic_rows)
+        nb_out, new_out = os.path.join(tmp, "notebook.csv"), os.path.join(tmp, "pipeline.csv")
+
+        start = time.perf_counter()
+        _run_cleaning_notebook(raw_path, nb_out)
+        nb_s = time.perf_counter() - start
+        start = time.perf_counter()
+        clean_file(raw_path, new_out, chunk_rows)
+        new_s = time.perf_counter() - start
+        nb_peak = _peak_mib(lambda: _run_cleaning_notebook(raw_path, nb_out))
+        new_peak = _peak_mib(lambda: clean_file(raw_path, new_out, chunk_rows))
+
+        expected = pd.read_csv(nb_out, dtype=str, keep_default_na=False)
+        got = pd.read_csv(new_out, dtype=str, keep_default_na=False)
+        same = expected.equals(got)
+        print(f"  märkmik:   {nb_s:7.2f} s, tipp-mälu {nb_peak:7.1f} MiB")
+        print(f"  torujuhe:  {new_s:7.2f} s, tipp-mälu {new_peak:7.1f} MiB ({chunk_rows:,} rida partiis)")
+        print(f"  kiirendus: {nb_s / new_s:.1f}x; väljund {'identne' if same else 'ERINEB'} ({len(got):,} rida)")
+        if not same and expected.shape == got.shape:
+            diff = (expected != got).any()
+            print(f"  erinevad veerud: {', '.join(diff[diff].index)}")
+        return same
+
+
+def _object_strings(df: pd.DataFrame) -> pd.DataFrame:
+    """*df* with every non-numeric column as object strings, i.e. pandas' pre-Arrow default."""
+    return df.apply(lambda col: col if pd.api.types.is_numeric_dtype(col) else col.astype(object))
+
+
+def bench_memory(scale: int, k: int = 8, repeats: int = 20):
+    """Per-worker footprint of the course table: default dtypes vs typed schema + text side store."""
+    from data_loader import read_courses
+
+    df, embeddings_df = load_corpus(scale)
+    matrix, row_ids = build_embedding_matrix(embeddings_df)
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, "kursused.csv")
+        df.to_csv(csv_path, index=False)
+        default = CourseStore(_object_strings(pd.read_csv(csv_path)), matrix, row_ids)
+        typed = CourseStore(read_courses(csv_path), matrix, row_ids, version=f"s{scale}",
+                            text_store=os.path.join(tmp, "tekstid"))
+        rows = np.random.default_rng(0).choice(len(typed), k, replace=False)
+
+        print(f"Korpus: {len(typed):,} kursust (scale={scale})")
+        for name, store in (("vaikimisi dtype'id", default), ("tüübitud + kõrvalhoidla", typed)):
+            memory = memory_summary(store.memory_report)
+            fetch_ms = _timeit(lambda: (store.rows_frame(rows), store.snippets[rows]), repeats)
+            print(f"  {name:24s} {memory['now_mib']:8.1f} MiB töötaja kohta · "
+                  f"top-{k} read + kontekst {fetch_ms:6.2f} ms"
+                  + (f" · kettal {memory['disk_mib']:.1f} MiB (ühine)" if memory["disk_mib"] else ""))
+        before, now = memory_summary(default.memory_report)["now_mib"], memory_summary(typed.memory_report)["now_mib"]
+        print(f"  vähenemine töötaja kohta: {before - now:.1f} MiB (−{1 - now / before:.0%})")
+        same = list(default.snippets[rows]) == list(typed.snippets[rows])
+        print(f"  kontekstiplokid {'identsed' if same else 'ERINEVAD'}")
+
+
+def bench_result_cache(scale: int, n_requests: int, k: int = 8):
+    """Replays test-suite queries with SAMPLE_FILTERS, Zipf-distributed as in a lecture room
+    where many ask the same thing: miss vs hit latency of the retrieval stage and the hit rate."""
+    from sentence_transformers import SentenceTransformer
+
+    from rag import cached_rank_for_context
+    from result_cache import RetrievalCache
+
+    df, embeddings_df = load_corpus(scale)
+    store = CourseStore(df, *build_embedding_matrix(embeddings_df), version=f"s{scale}")
+    model = SentenceTransformer(EMBEDDING_MODEL)
+    model.encode(["soojendus"])
+    queries = pd.read_csv(TEST_CASES_FILE).iloc[:, 0].astype(str).tolist()
+    pairs = [(q, f) for q in queries for f in SAMPLE_FILTERS]
+    rng = np.random.default_rng(0)
+    picks = np.minimum(rng.zipf(1.3, n_requests) - 1, len(pairs) - 1)
+
+    cache = RetrievalCache()
+    times = {True: [], False: []}
+    for i in picks:
+        query, filters = pairs[i]
+        start = time.perf_counter()
+        _, _, _, info = cached_rank_for_context(query, store, filters, model, cache, k)
+        times[info["result_cache"]["hit"]].append((time.perf_counter() - start) * 1000)
+    stats = cache.stats_snapshot()
+    print(f"Korpus: {len(store):,} kursust (scale={scale}), {n_requests} päringut {len(pairs)} erinevast")
+    print(f"  arvutatud: {np.median(times[False]):8.3f} ms mediaan ({len(times[False])} korda)")
+    if times[True]:
+        print(f"  tabamus:   {np.median(times[True]):8.3f} ms mediaan ({len(times[True])} korda)")
+    print(f"  tabamuste määr {stats['hit_rate']:.0%}, kirjeid {stats['size']}")
+
+
+def bench_history(n_turns: int, courses_per_answer: int = 3):
+    """Prompt tokens per turn of a long simulated chat: whole history vs fit_history."""
+    from history import fit_history
+    from llm import build_system_prompt
+    from tokens import count_tokens
+
+    df, embeddings_df = load_corpus()
+    store = CourseStore(df, *build_embedding_matrix(embeddings_df))
+    queries = pd.read_csv(TEST_CASES_FILE).iloc[:, 0].astype(str).tolist()
+    rng = np.random.default_rng(0)
+    rows = rng.choice(len(store), 5, replace=False)
+    context = "\n\n".join(f"{i}. {s}" for i, s in enumerate(store.snippets[rows], 1))
+    system_prompt = build_system_prompt(context, store.names[rows].tolist(), "filtrid puuduvad", len(store), len(store))
+
+    messages, full_total, sent_total = [], 0, 0
+    print(f"{'käik':>5} {'kogu ajalugu':>13} {'fit_history':>12}")
+    for turn in range(n_turns):
+        messages.append({"role": "user", "content": queries[turn % len(queries)]})
+        sent, info = fit_history(system_prompt, messages)
+        full_total += info["full_tokens"]
+        sent_total += info["sent_tokens"]
+        if turn % 3 == 0 or turn == n_turns - 1:
+            print(f"{turn + 1:5d} {info['full_tokens']:13,} {info['sent_tokens']:12,}")
+        # A typical answer: a few courses in the format the system prompt asks for.
+        answer_rows = rng.choice(rows, courses_per_answer, replace=False)
+        messages.append({"role": "assistant", "content": "\n\n".join(
+            f"- **{store.names[r]}**\n  - Aine kood: {store.meta['aine_kood'].iloc[r]}\n  - "
+            + store.snippets[r][:400] for r in answer_rows)})
+    print(f"  sisendtokeneid kokku: {full_total:,} → {sent_total:,} (−{1 - sent_total / full_total:.0%}), "
+          f"süsteemiprompt {count_tokens(system_prompt['content']):,}")
+
+
+class _CountingPlaceholder:
+    """Stands in for st.empty(): serialises every render the way Streamlit's Markdown element
+    is sent to the browser and counts renders and bytes."""
+
+    def __init__(self):
+        from streamlit.proto.Markdown_pb2 import Markdown
+
+        self._proto = Markdown
+        self.renders = 0
+        self.bytes = 0
+        self.seconds = 0.0
+
+    def markdown(self, text):
+        start = time.perf_counter()
+        self.bytes += len(self._proto(body=text).SerializeToString())
+        self.seconds += time.perf_counter() - start
+        self.renders += 1
+
+
+def bench_stream(n_tokens: int, rate: float):
+    """Per-token re-rendering vs StreamRenderer for a paced fake stream of *n_tokens* pieces."""
+    from llm import render_stream
+
+    df, _ = load_corpus()
+    words = " ".join(df["kirjeldus"].dropna().astype(str).head(200)).split()
+    pieces = [w + ("\n\n" if i % 80 == 79 else " ") for i, w in enumerate(words[:n_tokens])]
+
+    def paced():
+        start = time.perf_counter()
+        for i, piece in enumerate(pieces):
+            delay = start + i / rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            yield piece
+
+    def per_token(placeholder):
+        text = ""
+        for piece in paced():
+            text += piece
+            placeholder.markdown(text)
+
+    print(f"{len(pieces)} tükki kiirusega {rate:.0f}/s, vastus {len(''.join(pieces)):,} märki")
+    for name, run in (("iga token (vana)", per_token), ("koondatud (uus)", lambda p: render_stream(paced(), p))):
+        placeholder = _CountingPlaceholder()
+        run(placeholder)
+        print(f"  {name:18s} {placeholder.renders:6,} renderdust · {placeholder.bytes / 2**20:7.2f} MiB brauserisse · "
+              f"serialiseerimine {placeholder.seconds * 1000:7.1f} ms")
+
+
+def bench_llm_client(n_requests: int, fail_rate: float):
+    """New OpenAI client per request (old app7) vs the shared get_client, against mock_llm_server."""
+    import openai
+
+    import llm_client
+    from mock_llm_server import serve
+
+    messages = [{"role": "system", "content": "1. Masinõpe (LTAT.02.002)\n   Kood: LTAT.02.002"},
+                {"role": "user", "content": "masinõpe"}]
+
+    def run(server, make_client, stream):
+        base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+        failed = 0
+        start = time.perf_counter()
+        for _ in range(n_requests):
+            try:
+                response = make_client(base_url).chat.completions.create(
+                    model="mock", messages=messages, stream=stream)
+                if stream:
+                    "".join(chunk.choices[0].delta.content or "" for chunk in response if chunk.choices)
+            except openai.APIError:
+                failed += 1
+        return time.perf_counter() - start, failed
+
+    def fresh(base_url):
+        return openai.OpenAI(base_url=base_url, api_key="mock", max_retries=0)
+
+    print(f"{n_requests} päringut mock-serveri vastu (openai {openai.__version__})")
+    for stream in (False, True):
+        for name, make_client in (("uus klient igal korral", fresh),
+                                  ("jagatud get_client", lambda url: llm_client.get_client("mock", url))):
+            server = serve()
+            seconds, failed = run(server, make_client, stream)
+            print(f"  {'voog' if stream else 'tervik'} · {name:22s} {server.stats['connections']:3d} ühendust · "
+                  f"{seconds * 1000 / n_requests:6.1f} ms/päring · ebaõnnestus {failed}")
+            server.shutdown()
+
+    print(f"Süstitud vigade osakaal {fail_rate:.0%}:")
+    for name, make_client in (("ilma kordusteta", fresh),
+                              ("get_client + kordused", lambda url: llm_client.get_client("mock", url))):
+        server = serve(fail_rate=fail_rate)
+        seconds, failed = run(server, make_client, True)
+        print(f"  {name:22s} {server.stats['failures']:3d} süstitud viga · kasutajani jõudis {failed}/{n_requests}")
+        server.shutdown()
+    print(f"  get_client: {llm_client.stats_snapshot()}")
+
+
+def bench_hedge(n_requests: int, stall_rate: float, stall_ms: float, ttft_ms: float = 300):
+    """TTFT of one model vs hedged dispatch over LLM_MODELS when the first model sometimes stalls."""
+    import llm_client
+    from config import LLM_MODELS
+    from llm_dispatch import HedgedCompletion, ModelLatency
+    from mock_llm_server import serve
+
+    messages = [{"role": "system", "content": "1. Masinõpe (LTAT.02.002)\n   Kood: LTAT.02.002"},
+                {"role": "user", "content": "masinõpe"}]
+    print(f"{n_requests} päringut · TTFT {ttft_ms:.0f} ms · {LLM_MODELS[0]} takerdub {stall_rate:.0%} "
+          f"päringutest {stall_ms:.0f} ms võrra")
+    for name, models in (("üks mudel", LLM_MODELS[:1]), ("varupäringutega", LLM_MODELS)):
+        server = serve(ttft_s=ttft_ms / 1000, stall_rate=stall_rate, stall_s=stall_ms / 1000,
+                       stall_models=LLM_MODELS[:1])
+        client = llm_client.get_client("mock", f"http://127.0.0.1:{server.server_address[1]}/v1")
+        latency = ModelLatency()
+        ttfts = []
+        for _ in range(n_requests):
+            start = time.perf_counter()
+            deltas = HedgedCompletion(client, messages, models, latency).deltas()
+            next(deltas)
+            ttfts.append(time.perf_counter() - start)
+            for _ in deltas:
+                pass
+        ttft = np.array(ttfts) * 1000
+        primary = latency.snapshot()[LLM_MODELS[0]]
+        print(f"  {name:16s} TTFT p50 {np.percentile(ttft, 50):6.0f} ms · p95 {np.percentile(ttft, 95):6.0f} ms · "
+              f"max {ttft.max():6.0f} ms · takerdusi {server.stats['stalls']} · "
+              f"varupäringuid {primary['hedged']} (katkestatud {server.stats['cancelled']}) · "
+              f"lõpuks ooteaeg {primary['deadline_s']:.1f} s")
+        server.shutdown()
+
+
+def bench_compact(n_cases: int, tokens_per_s: float, ttft_ms: float = 400):
+    """Free-text vs compact JSON answers on the test suite against mock_llm_server:
+    tokens, time per answer and pass rate."""
+    from sentence_transformers import SentenceTransformer
+
+    import llm_client
+    from mock_llm_server import serve
+    from testing import answer_test_case, evaluate_case
+
+    df, embeddings_df = load_corpus()
+    store = CourseStore(df, *build_embedding_matrix(embeddings_df), version="s1")
+    model = SentenceTransformer(EMBEDDING_MODEL)
+    cases = pd.read_csv(TEST_CASES_FILE).head(n_cases)
+    course_codes = store.meta["aine_kood"].tolist()
+    server = serve(ttft_s=ttft_ms / 1000, tokens_per_s=tokens_per_s)
+    client = llm_client.get_client("mock", f"http://127.0.0.1:{server.server_address[1]}/v1")
+
+    print(f"{len(cases)} testjuhtumit · mock TTFT {ttft_ms:.0f} ms, {tokens_per_s:.0f} tokenit/s")
+    totals = {}
+    for name, compact in (("vabatekst (vana)", False), ("kompaktne JSON", True)):
+        prompt = completion = passed = 0
+        seconds = []
+        for query, expected in cases.iloc[:, :2].itertuples(index=False):
+            start = time.perf_counter()
+            answer, answer_ids, rag_ids, usage = answer_test_case(client, str(query), store, model, compact)
+            seconds.append(time.perf_counter() - start)
+            prompt += usage.prompt_tokens if usage else 0
+            completion += usage.completion_tokens if usage else 0
+            passed += evaluate_case(str(expected).strip(), rag_ids, answer, course_codes, answer_ids)[0]
+        totals[compact] = completion
+        print(f"  {name:17s} sisend {prompt / len(cases):7.0f} · väljund {completion / len(cases):6.0f} tokenit/vastus · "
+              f"vastus {np.median(seconds):5.2f} s mediaan · läbitud {passed}/{len(cases)}")
+    server.shutdown()
+    if totals[False]:
+        print(f"  väljundtokeneid {1 - totals[True] / totals[False]:.0%} vähem")
+
+
+def bench_context(n_cases: int, live: bool = False) -> bool:
+    """Snippet vs encoded context on the test suite, both fitted to CONTEXT_TOKEN_BUDGET: prompt
+    tokens per request as counted by the endpoint (mock_llm_server, or OpenRouter with *live*),
+    courses in the context and pass rate. False if the encoded context passes fewer cases."""
+    from sentence_transformers import SentenceTransformer
+
+    import llm_client
+    from mock_llm_server import serve
+    from testing import answer_test_case, evaluate_case
+
+    df, embeddings_df = load_corpus()
+    store = CourseStore(df, *build_embedding_matrix(embeddings_df), version="s1", sentence_store=DATA_SENTENCE_STORE)
+    model = SentenceTransformer(EMBEDDING_MODEL)
+    cases = pd.read_csv(TEST_CASES_FILE).head(n_cases)
+    course_codes = store.meta["aine_kood"].tolist()
+    server = None
+    if live:
+        client = llm_client.get_client(os.environ["OPENROUTER_API_KEY"])
+    else:
+        server = serve(ttft_s=0.05, tokens_per_s=2000)
+        client = llm_client.get_client("mock", f"http://127.0.0.1:{server.server_address[1]}/v1")
+
+    print(f"{len(cases)} testjuhtumit · {'OpenRouter' if live else 'mock'} · "
+          f"lausehoidla {'olemas' if store.sentences is not None else 'puudub (juhtlaused)'}")
+    results = {}
+    for name, encode in (("plokid (vana)", False), ("kodeeritud", True)):
+        prompt_tokens, n_courses, passed = [], [], 0
+        for query, expected in cases.iloc[:, :2].itertuples(index=False):
+            answer, answer_ids, rag_ids, usage = answer_test_case(client, str(query), store, model, encode=encode)
+            if usage:
+                prompt_tokens.append(usage.prompt_tokens)
+            n_courses.append(len(rag_ids))
+            passed += evaluate_case(str(expected).strip(), rag_ids, answer, course_codes, answer_ids)[0]
+        results[encode] = (np.mean(prompt_tokens) if prompt_tokens else 0.0, passed)
+        print(f"  {name:14s} sisend {results[encode][0]:7.0f} tokenit/päring"
+              + (f" (p50 {np.median(prompt_tokens):.0f}, max {max(prompt_tokens)})" if prompt_tokens else "")
+              + f" · {np.mean(n_courses):.1f} kursust/päring · läbitud {passed}/{len(cases)}")
+    if server is not None:
+        server.shutdown()
+    (before, passed_before), (after, passed_after) = results[False], results[True]
+    if before:
+        print(f"  sisendtokeneid {1 - after / before:.0%} vähem")
+    ok = passed_after >= passed_before
+    print("  läbitud testide arv " + ("ei langenud" if ok else f"langes: {passed_before} → {passed_after}"))
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_search = sub.add_parser("search", help="Vektorotsingu latentsus: vana vs uus tee")
+    p_search.add_argument("--scale", type=int, nargs="+", default=[1, 50])
+    p_search.add_argument("--queries", type=int, default=20)
+    sub.add_parser("load", help="Külmkäivitus: pickle vs memmap hoidla")
+    p_store = sub.add_parser("store", help="Päringu latentsus ja tipp-mälu: merge vs CourseStore")
+    p_store.add_argument("--scale", type=int, nargs="+", default=[1, 10])
+    p_store.add_argument("--queries", type=int, default=10)
+    p_filters = sub.add_parser("filters", help="FilterIndex vs build_filter_mask: kiirus")
+    p_filters.add_argument("--samples", type=int, default=500)
+    p_strategy = sub.add_parser("strategy", help="Otsingustrateegia valik selektiivsuse järgi")
+    p_strategy.add_argument("--scale", type=int, nargs="+", default=[1, 10])
+    sub.add_parser("embedcache", help="Päringuvektorite vahemälu mõju testpäringutele")
+    p_ann = sub.add_parser("ann", help="IVF recall@k ja latentsus vs täpne otsing")
+    p_ann.add_argument("--scale", type=int, nargs="+", default=[1, 10])
+    p_ann.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    p_quant = sub.add_parser("quant", help="int8/float16 koopia: mälu, kiirus ja recall")
+    p_quant.add_argument("--scale", type=int, nargs="+", default=[1, 10])
+    p_lexical = sub.add_parser("lexical", help="Ainekoodi kiirtee ja BM25 latentsus")
+    p_lexical.add_argument("--queries", type=int, default=50)
+    p_startup = sub.add_parser("startup", help="Aeg esimese joonistuse ja esimese vastuseni")
+    p_startup.add_argument("--runs", type=int, default=3)
+    p_imports = sub.add_parser("imports", help="Moodulite impordiaeg vs salvestatud baasjoon")
+    p_imports.add_argument("--runs", type=int, default=3)
+    p_imports.add_argument("--tolerance", type=float, default=0.25)
+    p_imports.add_argument("--save-baseline", action="store_true")
+    p_harvest = sub.add_parser("harvest", help="ÕIS2 laadija vs märkmiku tsükkel stub-serveri vastu")
+    p_harvest.add_argument("--courses", type=int, default=60)
+    p_harvest.add_argument("--latency-ms", type=float, default=150)
+    p_harvest.add_argument("--rate", type=float, nargs="+", default=[HARVEST_RATE, 50])
+    p_cleaning = sub.add_parser("cleaning", help="Andmete puhastus: märkmik vs voogtöötlus")
+    p_cleaning.add_argument("--raw", default="toorandmed_aasta.csv")
+    p_cleaning.add_argument("--synthetic", type=int, default=20_000)
+    p_cleaning.add_argument("--chunk-rows", type=int, default=CLEAN_CHUNK_ROWS)
+    p_memory = sub.add_parser("memory", help="Kursuste tabeli mälu: vaikimisi vs tüübitud + kõrvalhoidla")
+    p_memory.add_argument("--scale", type=int, nargs="+", default=[1, 10])
+    p_result = sub.add_parser("resultcache", help="Otsingutulemuste vahemälu: tabamuse vs arvutuse latentsus")
+    p_result.add_argument("--requests", type=int, default=500)
+    p_result.add_argument("--scale", type=int, nargs="+", default=[1, 10])
+    p_history = sub.add_parser("history", help="Pika vestluse sisendtokenid: kogu ajalugu vs eelarve")
+    p_history.add_argument("--turns", type=int, default=15)
+    p_stream = sub.add_parser("stream", help="Voogedastuse renderdamine: iga token vs koondatud")
+    p_stream.add_argument("--tokens", type=int, default=1500)
+    p_stream.add_argument("--rate", type=float, default=150)
+    p_llm = sub.add_parser("llmclient", help="Jagatud LLM-i klient: ühendused ja kordused mock-serveri vastu")
+    p_llm.add_argument("--requests", type=int, default=20)
+    p_llm.add_argument("--fail-rate", type=float, default=0.3)
+    p_hedge = sub.add_parser("hedge", help="Varupäringud: TTFT sabalatentsus, kui põhimudel takerdub")
+    p_hedge.add_argument("--requests", type=int, default=60)
+    p_hedge.add_argument("--stall-rate", type=float, default=0.1)
+    p_hedge.add_argument("--stall-ms", type=float, default=5000)
+    p_compact = sub.add_parser("compact", help="Kompaktne JSON-vastus vs vabatekst testjuhtumitel")
+    p_compact.add_argument("--cases", type=int, default=77)
+    p_compact.add_argument("--tokens-per-s", type=float, default=60)
+    p_context = sub.add_parser("context", help="Kodeeritud LLM-i kontekst vs plokid: sisendtokenid ja läbitud testid")
+    p_context.add_argument("--cases", type=int, default=77)
+    p_context.add_argument("--live", action="store_true", help="OpenRouteri vastu (OPENROUTER_API_KEY)")
+    args = parser.parse_args()
+
+    if args.command == "search":
+        for scale in args.scale:
+            bench_search(scale, args.queries)
+    elif args.command == "load":
+        bench_load()
+    elif args.command == "store":
+        for scale in args.scale:
+            bench_store(scale, args.queries)
+    elif args.command == "filters":
+        bench_filters(args.samples)
+    elif args.command == "strategy":
+        for scale in args.scale:
+            bench_strategy(scale)
+    elif args.command == "embedcache":
+        bench_embedding_cache()
+    elif args.command == "ann":
+        for scale in args.scale:
+            bench_ann(scale, args.nprobe)
+    elif args.command == "quant":
+        for scale in args.scale:
+            bench_quantization(scale)
+    elif args.command == "lexical":
+        bench_lexical(args.queries)
+    elif args.command == "startup":
+        bench_startup(args.runs)
+    elif args.command == "imports":
+        raise SystemExit(0 if bench_imports(args.runs, args.tolerance, args.save_baseline) else 1)
+    elif args.command == "harvest":
+        bench_harvest(args.courses, args.latency_ms, args.rate)
+    elif args.command == "cleaning":
+        raise SystemExit(0 if bench_cleaning(args.raw, args.synthetic, args.chunk_rows) else 1)
+    elif args.command == "memory":
+        for scale in args.scale:
+            bench_memory(scale)
+    elif args.command == "resultcache":
+        for scale in args.scale:
+            bench_result_cache(scale, args.requests)
+    elif args.command == "history":
+        bench_history(args.turns)
+    elif args.command == "stream":
+        bench_stream(args.tokens, args.rate)
+    elif args.command == "llmclient":
+        bench_llm_client(args.requests, args.fail_rate)
+    elif args.command == "hedge":
+        bench_hedge(args.requests, args.stall_rate, args.stall_ms)
+    elif args.command == "compact":
+        bench_compact(args.cases, args.tokens_per_s)
+    elif args.command == "context":
+        raise SystemExit(0 if bench_context(args.cases, args.live) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""Compact answers: the model only picks courses by unique_ID, with a one-sentence reason.
+
+Name, code, ÕIS link, EAP, language, study mode and semester come from the
+course data instead of the completion, so they cost no output tokens and
+cannot be hallucinated: a pick whose ID is not among the context courses is
+dropped.
+"""
+import json
+
+import pandas as pd
+
+from config import COMPACT_JSON_MODE_MODELS
+
+NO_MATCH_TEXT = "Sobivaid kursuseid ei leidu."
+RESPONSE_FORMAT = {"type": "json_object"}
+JSON_WHITESPACE = " \t\n\r"
+_decoder = json.JSONDecoder()
+
+
+def json_mode_requests() -> dict:
+    """Per-model request options for the hedged dispatch: JSON mode only for the models
+    in COMPACT_JSON_MODE_MODELS; parse_picks copes with the others' plain text."""
+    return {model: {"response_format": RESPONSE_FORMAT} for model in COMPACT_JSON_MODE_MODELS}
+
+
+def _skip_whitespace(text: str, pos: int) -> int:
+    while pos < len(text) and text[pos] in JSON_WHITESPACE:
+        pos += 1
+    return pos
+
+
+def _opens_container(text: str, start: int) -> bool | None:
+    """Whether the object at *start* holds an array or object as its first value, like the
+    {"kursused": [...]} wrapper, rather than being a pick; None until that much has arrived."""
+    try:
+        _, pos = _decoder.raw_decode(text, _skip_whitespace(text, start + 1))  # the first key
+    except ValueError:
+        return None
+    pos = _skip_whitespace(text, pos)
+    if pos < len(text) and text[pos] == ":":
+        pos = _skip_whitespace(text, pos + 1)
+    return text[pos] in "[{" if pos < len(text) else None
+
+
+def _scan_picks(text: str, pos: int = 0, final: bool = True) -> tuple[list[tuple[str, str]], int]:
+    """(id, reason) of every complete pick object in *text* from *pos* on, and the offset to
+    resume from once more text has arrived. Objects are decoded with the JSON decoder, so
+    braces inside a reason are fine. Unless *final*, an object that does not decode yet is
+    taken to be still streaming, and the scan stops there unless it is the wrapper."""
+    picks = []
+    while (start := text.find("{", pos)) != -1:
+        try:
+            obj, end = _decoder.raw_decode(text, start)
+        except ValueError:
+            if not final and not _opens_container(text, start):
+                return picks, start
+            pos = start + 1  # into the wrapper, or past a malformed pick
+            continue
+        if isinstance(obj, dict) and "id" in obj:
+            picks.append((str(obj["id"]).strip(), " ".join(str(obj.get("sobivus", "")).split())))
+            pos = end
+        elif any(isinstance(value, (dict, list)) for value in obj.values()):
+            pos = start + 1  # a complete wrapper: its picks are inside
+        else:
+            pos = end
+    return picks, len(text)
+
+
+def parse_picks(text: str, allowed_ids) -> list[tuple[str, str]]:
+    """(unique_ID, reason) pairs of every complete pick in *text*, in order, known IDs only."""
+    picks, seen = [], set()
+    for uid, reason in _scan_picks(text)[0]:
+        if uid in allowed_ids and uid not in seen:
+            seen.add(uid)
+            picks.append((uid, reason))
+    return picks
+
+
+def _value(row: pd.Series, column: str) -> str:
+    value = row.get(column)
+    return "?" if value is None or pd.isna(value) or str(value) == "" else str(value)
+
+
+def render_card(row: pd.Series, reason: str) -> str:
+    """Markdown of one course in the layout the full prompt asks the model for."""
+    name = _value(row, "nimi_et")
+    if name == "?":
+        name = _value(row, "nimi_en")
+    code = _value(row, "aine_kood")
+    lines = [
+        f"- **{name}**",
+        f"  - Aine kood: {code}",
+        f"  - ÕIS link: https://ois2.ut.ee/#/courses/{code}",
+        f"  - EAP: {_value(row, 'eap')} | Keel: {_value(row, 'keel')} | "
+        f"Õppeviis: {_value(row, 'veebiope')} | Semester: {_value(row, 'semester')}",
+    ]
+    if reason:
+        lines.append(f"  - Sobivus: {reason}")
+    return "\n".join(lines)
+
+
+class CardStream:
+    """Turns the streamed JSON of a compact answer into course cards of *courses* (the
+    context's rows_frame), yielding each card as soon as its pick is complete."""
+
+    def __init__(self, courses: pd.DataFrame):
+        unique = courses.drop_duplicates("unique_ID")
+        self.courses = unique.set_index(unique["unique_ID"].astype(str))
+        self.raw = ""
+        self.picks = []
+        self._scanned = 0  # everything before this offset is parsed already
+
+    def __call__(self, deltas):
+        for delta in deltas:
+            self.raw += delta
+            yield from self._cards(final=False)
+        yield from self._cards(final=True)
+        if not self.picks:
+            yield NO_MATCH_TEXT
+
+    def _cards(self, final: bool):
+        picks, self._scanned = _scan_picks(self.raw, self._scanned, final)
+        for uid, reason in picks:
+            if uid in self.courses.index and uid not in self.picked_ids:
+                self.picks.append((uid, reason))
+                yield ("\n\n" if len(self.picks) > 1 else "") + render_card(self.courses.loc[uid], reason)
+
+    @property
+    def picked_ids(self) -> list[str]:
+        return [uid for uid, _ in self.picks]
@@ -1,9 +1,71 @@
+import os
+
 FILTER_NONE = "Pole oluline"
 MODEL_NAME = "google/gemma-3-27b-it"
+LLM_BASE_URL = os.getenv("LLM_BASE_URL", "https://openrouter.ai/api/v1")  # mock_llm_server.py: http://127.0.0.1:8766/v1
+LLM_MAX_CONCURRENCY = 8  # samaaegseid LLM-i päringuid protsessi kohta
+LLM_QUEUE_TIMEOUT_S = 30.0  # kaua vaba päringukohta oodatakse, enne kui päring veaga katkeb
+LLM_MAX_RETRIES = 4  # 429/5xx ja ühenduse vead, eksponentsiaalse ooteajaga
+LLM_TIMEOUT_S = 60.0
+LLM_DEADLINE_S = 45.0  # kogu vastuse ülempiir koos varumudelitega, esimesest päringust viimase tokenini
+LLM_KEEPALIVE_S = 120.0  # kui kaua jõude ühendus basseinis avatuna hoitakse
+LLM_MODELS = [MODEL_NAME, "mistralai/mistral-small-3.2-24b-instruct", "meta-llama/llama-3.3-70b-instruct"]  # põhimudel, siis varumudelid
+HEDGE_DEADLINE_S = 3.0  # ooteaeg esimesele tokenile enne varumudelile saatmist, kuni mudeli statistikat pole
+HEDGE_DEADLINE_MIN_S = 1.5
+HEDGE_DEADLINE_MAX_S = 15.0
+HEDGE_MIN_SAMPLES = 20  # nii mitme mõõtmise järel asendab mudeli TTFT p95 vaikimisi ooteaja
+HEDGE_WINDOW = 200  # viimased TTFT mõõtmised mudeli kohta
+COMPACT_ANSWERS = False  # esimese päringu vastus JSON-ina (unique_ID + sobivus), kaardid kuvatakse andmetest
+COMPACT_JSON_MODE_MODELS = [MODEL_NAME]  # neile saadetakse response_format; teistele piisab prompti juhisest
+EMBEDDING_MODEL = "BAAI/bge-m3"
 DATA_CSV = "puhtad_andmed.csv"
 DATA_EMBEDDINGS = "puhtad_andmed_embeddings.pkl"
+DATA_EMBEDDING_STORE = "puhtad_andmed_embeddings"
+DATA_TEXT_STORE = "puhtad_andmed_tekstid"  # pikad tekstiveerud kettal (text_store.py); None = kõik mälus
+DATA_SENTENCE_STORE = "puhtad_andmed_laused"  # lausete vektorid (sentence_store.py); puudumisel juhtlaused
+CATEGORY_COLUMNS = ("semester", "keel", "linn", "oppeaste", "veebiope", "hindamisskaala", "oppetoovorm", "teaduskond")
+TEXT_STORE_COLUMNS = (  # loetakse kettalt ainult näidatavate kursuste jaoks
+    "kirjeldus", "eesmargid", "opivaljundid", "kirjeldus_et", "kirjeldus_en", "eeldusained",
+    "opitulemused_et", "opitulemused_en", "hindamise_eeltingimused", "hindamise_meetod",
+)
 LOG_FILE = "tagasiside_log.csv"
 TEST_CASES_FILE = "testjuhtumid.csv"
 EAP_DEFAULT = (1, 36)
+FILTER_CACHE_SIZE = 64
+SEARCH_FULL_SCAN_MIN_SELECTIVITY = 0.3
+SEARCH_BACKEND = "exact"  # "exact" või "ivf" (vajab: python ann_index.py build ...)
+IVF_NPROBE = 8
+EMBEDDING_QUANTIZATION = None  # None, "int8" või "float16" (vajab: python embedding_store.py quantize ...)
+RESCORE_CANDIDATES = 200
+HYBRID_SEARCH = True  # BM25 + semantiline otsing, liidetud RRF-iga
+HYBRID_CANDIDATES = 50
+RRF_K = 60
+LEXICAL_FIELDS = ("aine_kood", "nimi_et", "nimi_en", "kirjeldus", "eesmargid", "opivaljundid")
+RAG_MAX_RESULTS = 8
+CONTEXT_TOKEN_BUDGET = 1800  # kursuste konteksti tokenite ülempiir süsteemiprompti sees
+CONTEXT_ENCODER = True  # kompaktne kontekst (context_encoder.py); False = eelrenderdatud plokid
+CONTEXT_SENTENCES = 3  # päringule lähimat lauset kursuse kohta
+CONTEXT_SENTENCE_CHARS = 240
+STREAM_FLUSH_S = 0.05  # voogedastatud vastuse kuvamise intervall (lisaks igal lõigu lõpul)
+CHAT_TOKEN_BUDGET = 4000  # ühe LLM-i päringu sisendi ülempiir: süsteemiprompt + vestluse ajalugu
+HISTORY_KEEP_TURNS = 3  # viimased küsimus-vastus paarid lähevad sõna-sõnalt, vanemad kokkuvõttena
+OIS2_API_URL = "https://ois2.ut.ee/api/courses"
+HARVEST_JOURNAL = "ois2_paevik.sqlite"  # ois2_harvester.py: iga aine olek, võimaldab katkestatud laadimist jätkata
+HARVEST_WORKERS = 8
+HARVEST_RATE = 10.0  # päringut sekundis (viisakus ÕIS2 serveri vastu)
+CLEAN_CHUNK_ROWS = 5000  # data_cleaning.py: toorandmete ridu korraga mälus
+EMBED_BATCH_SIZE = 32  # embedding_build.py: kursuseid ühes kodeerimispartiis
+EMBED_WORKERS = 1  # embedding_build.py: paralleelseid protsesse (igaüks laeb oma mudeli)
+DATA_HOT_RELOAD = True  # jälgi andmefaile ja vaheta uus andmestik sisse ilma taaskäivituseta
+DATA_RELOAD_DEBOUNCE_S = 2.0
+QUERY_CACHE_SIZE = 1024
+QUERY_CACHE_DB = "paringute_vektorid.sqlite"  # None = ainult mälus
+QUERY_CACHE_DB_MAX_ROWS = 50_000
+CACHE_PRUNE_SLACK = 0.1  # SQLite vahemälu kärbitakse alles siis, kui see on piirist 10% üle
+RESULT_CACHE_SIZE = 512  # valmis otsingutulemusi (päring + filtrid) protsessi kohta
+RESULT_CACHE_TTL_S = 600.0
+RESPONSE_CACHE_DB = "vastuste_vahemalu.sqlite"  # LLM-i vastused korduvatele küsimustele; None = välja lülitatud
+RESPONSE_CACHE_MAX_ROWS = 5000
+RESPONSE_CACHE_MIN_SIMILARITY = 0.95  # päringuvektorite koosinussarnasus, millest alates vastus taaskasutatakse
 USER_AVATAR = "avatar_user.svg"
 ASSISTANT_AVATAR = "avatar_assistant.svg"
@@ -0,0 +1,45 @@
+"""Shared pytest fixtures: a CourseStore over testdata/kursused.csv with a toy embedder."""
+import zlib
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from course_store import CourseStore
+from data_loader import read_courses
+from embedding_store import build_embedding_matrix
+from lexical_index import tokenize
+
+FIXTURE_CSV = Path(__file__).with_name("testdata") / "kursused.csv"
+
+
+class HashEmbedder:
+    """Bag of words hashed into 32 dimensions: texts sharing words are similar.
+    Records every text it encodes."""
+
+    dim = 32
+
+    def __init__(self):
+        self.encoded = []
+
+    def encode(self, texts, **kwargs):
+        self.encoded += list(texts)
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for token in tokenize(text):
+                vectors[i, zlib.crc32(token.encode("utf-8")) % self.dim] += 1.0
+        return vectors
+
+
+@pytest.fixture
+def embedder():
+    return HashEmbedder()
+
+
+@pytest.fixture
+def store():
+    df = read_courses(FIXTURE_CSV)
+    texts = (df["nimi_et"].astype(str) + " " + df["kirjeldus"].astype(str)).tolist()
+    embeddings = pd.DataFrame({"unique_ID": df["unique_ID"], "embedding": list(HashEmbedder().encode(texts))})
+    return CourseStore(df, *build_embedding_matrix(embeddings), version="test")
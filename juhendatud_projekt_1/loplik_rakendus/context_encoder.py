@@ -0,0 +1,113 @@
+"""Compact LLM context for the courses of one answer.
+
+Compared with the pre-rendered snippets of snippets.py:
+- a field with the same value for every course (often keel or linn) is
+  written once, above the courses;
+- field labels are one-letter keys, explained once by a legend line;
+- the unique_ID doubles as the course code unless they differ;
+- instead of the first 500 + 300 + 300 characters of description, goals and
+  outcomes, a course gets its CONTEXT_SENTENCES sentences most similar to the
+  query (precomputed vectors, sentence_store.py), or without those the lead
+  sentences of its description.
+
+The token budget is applied to this encoding, so the saving buys room for
+more courses rather than only a shorter prompt.
+"""
+import numpy as np
+import pandas as pd
+
+from config import CONTEXT_SENTENCE_CHARS, CONTEXT_SENTENCES, CONTEXT_TOKEN_BUDGET
+from sentence_store import split_sentences
+from snippets import fit_to_budget
+from tokens import count_tokens
+
+FIELD_KEYS = (("eap", "E"), ("semester", "S"), ("keel", "L"), ("veebiope", "V"), ("oppeaste", "A"), ("linn", "T"))
+LEGEND = (
+    "Võtmed: K ainekood (kui erineb ID-st), E EAP, S semester, L keel, V õppeviis, A õppeaste, T linn. "
+    "Kriipsuga read on laused kursuse kirjeldusest, eesmärkidest ja õpiväljunditest."
+)
+
+
+def _clean(value) -> str | None:
+    if value is None or pd.isna(value):
+        return None
+    value = str(value).strip()
+    return value if value and value != "?" else None
+
+
+def _shorten(sentence: str, limit: int = CONTEXT_SENTENCE_CHARS) -> str:
+    return sentence if len(sentence) <= limit else sentence[:limit].rsplit(" ", 1)[0] + " …"
+
+
+def _render(store, frame: pd.DataFrame, rows: np.ndarray, sentences: list) -> tuple[list[str], list[str]]:
+    """(head lines, one text block per course) of the encoded context of *rows*."""
+    n = len(frame)
+    values = {
+        col: [_clean(v) for v in frame[col]] if col in frame.columns else [None] * n
+        for col, _ in FIELD_KEYS
+    }
+    shared = {
+        col: column[0] for col, column in values.items()
+        if n > 1 and column[0] is not None and all(v == column[0] for v in column)
+    }
+    head = [LEGEND]
+    if shared:
+        head.append("Kõigil kursustel: " + " · ".join(f"{key} {shared[col]}" for col, key in FIELD_KEYS
+                                                        if col in shared))
+    blocks = []
+    for i, (row, uid) in enumerate(zip(rows, frame["unique_ID"].astype(str))):
+        name = store.names[row]
+        name_en = _clean(frame["nimi_en"].iloc[i]) if "nimi_en" in frame.columns else None
+        lines = [f"[{i + 1}] {uid} {name}" + (f" ({name_en})" if name_en and name_en != name else "")]
+        fields = []
+        code = _clean(frame["aine_kood"].iloc[i]) if "aine_kood" in frame.columns else None
+        if code and code != uid:
+            fields.append(f"K {code}")
+        fields += [f"{key} {values[col][i]}" for col, key in FIELD_KEYS
+                   if col not in shared and values[col][i] is not None]
+        if fields:
+            lines.append(" · ".join(fields))
+        lines += [f"- {_shorten(s)}" for s in sentences[i]]
+        blocks.append("\n".join(lines))
+    return head, blocks
+
+
+def encode_context(store, rows: np.ndarray, query_vector=None, n_sentences: int = CONTEXT_SENTENCES,
+                   token_budget: int = CONTEXT_TOKEN_BUDGET):
+    """Context text for *rows* of the CourseStore, best first: as many of them as fit into
+    *token_budget* in this encoding. *query_vector* is a callable returning the normalised
+    query vector, called only if the store has sentence vectors. Returns (context_text, info);
+    info["context_courses"] is how many of *rows* the text covers, and the *_before counts
+    are what the snippet context would have sent under the same budget."""
+    rows = np.asarray(rows)
+    frame = store.rows_frame(rows)
+    query_vec = query_vector() if query_vector is not None and store.sentences is not None else None
+    sentences = [store.sentences.best(row, query_vec, n_sentences) if query_vec is not None else []
+                 for row in rows]
+    fallback = [i for i, found in enumerate(sentences) if not found]
+    if fallback:
+        descriptions = store.text("kirjeldus", rows[fallback])
+        for i, text in zip(fallback, descriptions):
+            sentences[i] = split_sentences(text)[:n_sentences]
+
+    # Dropping a course can only make more fields shared, so the text never grows back.
+    fit = len(rows)
+    while True:
+        head, blocks = _render(store, frame.iloc[:fit], rows[:fit], sentences[:fit])
+        block_tokens = np.array([count_tokens(block) for block in blocks])
+        smaller = fit_to_budget(block_tokens, token_budget - count_tokens("\n".join(head)))
+        if smaller >= fit:
+            break
+        fit = smaller
+
+    context_text = "\n".join(head) + "\n\n" + "\n\n".join(blocks)
+    fit_before = fit_to_budget(store.snippet_tokens[rows], token_budget)
+    tokens_before = int(store.snippet_tokens[rows[:fit_before]].sum()) + sum(
+        count_tokens(f"- {name}") for name in store.names[rows[:fit_before]])
+    return context_text, {
+        "context_courses": fit,
+        "context_tokens": count_tokens(context_text),
+        "context_courses_before": fit_before,
+        "context_tokens_before": tokens_before,
+        "sentences_by_query": sum(1 for i in range(fit) if i not in fallback),
+    }
@@ -0,0 +1,200 @@
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from config import IVF_NPROBE, RESCORE_CANDIDATES, SEARCH_FULL_SCAN_MIN_SELECTIVITY, TEXT_STORE_COLUMNS
+from filter_index import FilterIndex
+from lexical_index import LexicalIndex
+from rag import top_k_indices
+from sentence_store import load_sentence_index
+from snippets import build_snippets
+from text_store import open_text_store
+
+MIB = 1024 * 1024
+
+
+def memory_summary(report: pd.DataFrame) -> dict:
+    """Per-worker totals of a CourseStore.memory_report in MiB; disk_mib is shared by all workers."""
+    before, now = float(report["enne_baite"].sum()) / MIB, float(report["nüüd_baite"].sum()) / MIB
+    return {
+        "before_mib": round(before, 2),
+        "now_mib": round(now, 2),
+        "saved": round(1 - now / before, 3) if before else 0.0,
+        "disk_mib": round(report.attrs.get("disk_bytes", 0) / MIB, 2),
+    }
+
+
+class CourseStore:
+    """Course metadata aligned row-by-row with the normalised embedding matrix.
+
+    Built by data_loader once per dataset version and never modified afterwards,
+    so a reload swaps in a new store instead of touching this one. Callers pass
+    around integer row ids instead of merged or copied DataFrames; only the
+    final top-k rows become a DataFrame.
+
+    With *text_store* (a file base name), the long text columns and the
+    rendered snippets move to a memory-mapped side store once the indexes are
+    built, and only the compact columns stay in the per-worker DataFrame.
+
+    With *sentence_store* (a sentence_store.py base name), self.sentences holds
+    the precomputed sentence vectors of every row for the context encoder.
+    """
+
+    def __init__(self, df: pd.DataFrame, emb_matrix: np.ndarray, row_ids, ann_index=None, quantized=None,
+                 version: str = "", text_store: str | None = None, sentence_store: str | None = None):
+        self.version = version
+        emb_rows = pd.DataFrame({"unique_ID": row_ids, "_emb_row": np.arange(len(row_ids))})
+        meta = pd.merge(df, emb_rows, on="unique_ID").sort_values("_emb_row", kind="stable")
+        order = meta.pop("_emb_row").to_numpy()
+        meta["unique_ID"] = meta["unique_ID"].astype(df["unique_ID"].dtype)  # the merge widens it to object
+        if len(order) == len(emb_matrix) and (order == np.arange(len(order))).all():
+            # Usual case: keep the (possibly memory-mapped) matrix as is, no copy.
+            self.matrix = emb_matrix
+        else:
+            self.matrix = np.ascontiguousarray(emb_matrix[order])
+            if ann_index is not None or quantized is not None:
+                print("Hoiatus: metaandmed ja embeddingud ei kattu ridade kaupa, "
+                      "IVF indeks ja kvantiseeritud koopia jäävad kasutamata.")
+                ann_index = quantized = None
+        self.ann_index = ann_index
+        # Optional int8/float16 copy for the first pass; self.matrix is then read only to rescore.
+        self.quantized = quantized
+        self.meta = meta.reset_index(drop=True)
+        self.filter_index = FilterIndex(self.meta)
+        self.lexical = LexicalIndex(self.meta)
+        # Context blocks for the LLM, rendered once; query time is a gather and join.
+        self.snippets, self.snippet_tokens, self.names = build_snippets(self.meta)
+        self.sentences = load_sentence_index(sentence_store, self.meta)
+
+        before = self._column_bytes(self.meta, as_object=True)
+        before["(kontekstiplokid)"] = sum(sys.getsizeof(s) for s in self.snippets) + self.snippets.nbytes
+        self.texts = None
+        if text_store:
+            moved = [c for c in TEXT_STORE_COLUMNS if c in self.meta.columns]
+            side = self.meta[moved].assign(**{"(kontekstiplokid)": self.snippets})
+            self.texts = open_text_store(text_store, side, version)
+            self.snippets = self.texts["(kontekstiplokid)"]
+            self.meta = self.meta.drop(columns=moved)
+        self.memory_report = self._memory_report(before)
+
+    def __len__(self):
+        return len(self.meta)
+
+    @staticmethod
+    def _column_bytes(frame: pd.DataFrame, as_object: bool = False) -> dict:
+        if as_object:
+            # What the columns take with pandas' default object strings, i.e. before the typed schema.
+            frame = frame.apply(lambda col: col if pd.api.types.is_numeric_dtype(col) else col.astype(object))
+        return {col: int(size) for col, size in frame.memory_usage(index=False, deep=True).items()}
+
+    def _memory_report(self, before: dict) -> pd.DataFrame:
+        """Bytes per column before and after the typed schema and side store, in this worker."""
+        now = self._column_bytes(self.meta)
+        rows = []
+        for col, old in before.items():
+            if col in now:
+                rows.append((col, str(self.meta[col].dtype), old, now[col], "mälu"))
+            elif self.texts is not None and col in self.texts.columns:
+                column = self.texts[col]
+                rows.append((col, "tekst kettal", old, column.nbytes, "ketas"))
+            else:
+                rows.append((col, str(self.snippets.dtype), old, int(self.snippets.nbytes), "mälu"))
+        report = pd.DataFrame(rows, columns=["veerg", "dtype", "enne_baite", "nüüd_baite", "asukoht"])
+        report.attrs["disk_bytes"] = self.texts.disk_bytes if self.texts is not None else 0
+        return report
+
+    def text(self, column: str, rows: np.ndarray) -> np.ndarray:
+        """Values of *column* for *rows*, from the side store if the column was moved there."""
+        if self.texts is not None and column in self.texts.columns:
+            return self.texts[column][rows]
+        return self.meta[column].to_numpy(dtype=object)[rows]
+
+    def all_rows(self) -> np.ndarray:
+        return np.arange(len(self.meta))
+
+    def filter(self, filters: tuple) -> np.ndarray:
+        """Row ids matching the sidebar filter tuple (see get_pending_filters_tuple)."""
+        # The EAP range may arrive as a list; the LRU key has to be hashable.
+        return self.filter_index.rows_for((*filters[:5], tuple(filters[5])))
+
+    def row_mask(self, rows: np.ndarray) -> np.ndarray | None:
+        """Boolean mask for row ids or a mask; None when every row is selected."""
+        rows = np.asarray(rows)
+        if rows.dtype == bool:
+            return None if rows.all() else rows
+        if len(rows) == len(self):
+            return None
+        keep = np.zeros(len(self), dtype=bool)
+        keep[rows] = True
+        return keep
+
+    def lexical_search(self, query: str, rows: np.ndarray, k: int) -> np.ndarray:
+        """Best-first row ids with a positive BM25 score among *rows*."""
+        scores = self.lexical.scores(query)
+        keep = self.row_mask(rows)
+        if keep is not None:
+            scores[~keep] = 0
+        return top_k_indices(scores, min(k, int(np.count_nonzero(scores))))
+
+    def _first_pass(self, query_vec: np.ndarray, ids: np.ndarray | None = None) -> np.ndarray:
+        """Scores of all rows (ids=None) or of *ids*; approximate when a quantized copy is loaded."""
+        if self.quantized is not None:
+            return self.quantized.scores(query_vec, ids)
+        return self.matrix @ query_vec if ids is None else self.matrix[ids] @ query_vec
+
+    def search(self, query_vec: np.ndarray, rows: np.ndarray, k: int):
+        """Top-k of *rows* (row ids or a boolean mask) by cosine similarity, searched in place.
+
+        Broad filters score the whole shared matrix and mask the scores; narrow
+        filters gather only the selected rows. With a quantized copy the first
+        pass keeps RESCORE_CANDIDATES rows, which are then rescored exactly from
+        the full-precision matrix. Returns (row_ids, scores, info), best first.
+        """
+        start = time.perf_counter()
+        rows = np.asarray(rows)
+        count = int(rows.sum()) if rows.dtype == bool else len(rows)
+        selectivity = count / len(self) if len(self) else 0.0
+        first_k = max(k, RESCORE_CANDIDATES) if self.quantized is not None else k
+
+        if selectivity >= SEARCH_FULL_SCAN_MIN_SELECTIVITY:
+            keep = self.row_mask(rows)
+            found = None
+            if self.ann_index is not None:
+                found = self.ann_index.search(self.matrix, query_vec, min(k, count), IVF_NPROBE, keep)
+            if found is not None:
+                # Approximate: only the probed IVF lists are scored, filter pushed into the candidates.
+                strategy = "ivf"
+                candidate_rows, candidate_scores = found
+                top = top_k_indices(candidate_scores, k)
+                top_rows, top_scores = candidate_rows[top], candidate_scores[top]
+            else:
+                strategy = "full_scan"
+                scores = self._first_pass(query_vec)
+                if keep is not None:
+                    scores[~keep] = -np.inf
+                top = top_k_indices(scores, min(first_k, count))
+                top_rows, top_scores = top, scores[top]
+        else:
+            strategy = "gather"
+            ids = np.flatnonzero(rows) if rows.dtype == bool else rows
+            scores = self._first_pass(query_vec, ids)
+            top = top_k_indices(scores, first_k)
+            top_rows, top_scores = ids[top], scores[top]
+
+        info = {"strategy": strategy, "candidates": count, "selectivity": round(selectivity, 4)}
+        if self.quantized is not None and strategy != "ivf":
+            candidates = np.sort(top_rows)  # sorted, so the memmap is read front to back
+            exact = self.matrix[candidates] @ query_vec
+            top = top_k_indices(exact, k)
+            top_rows, top_scores = candidates[top], exact[top]
+            info["first_pass"] = self.quantized.kind
+            info["rescored"] = len(exact)
+        info["search_ms"] = round((time.perf_counter() - start) * 1000, 3)
+        return top_rows[:k], top_scores[:k], info
+
+    def rows_frame(self, rows: np.ndarray, scores: np.ndarray | None = None) -> pd.DataFrame:
+        """Metadata for *rows* in the given order, with an optional score column."""
+        frame = self.meta.iloc[rows]
+        return frame.assign(score=scores) if scores is not None else frame.copy()
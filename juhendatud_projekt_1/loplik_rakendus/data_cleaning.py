@@ -0,0 +1,339 @@
+"""Streaming version of andmete_puhastamine.ipynb: raw ÕIS2 export -> cleaned course table.
+
+    python data_cleaning.py toorandmed_aasta.csv andmed_puhastatud.csv [--chunk-rows 5000]
+    python data_cleaning.py toorandmed_aasta.csv andmed_puhastatud.parquet
+
+The export is read in chunks and only the columns the cleaning uses are parsed,
+so memory is bounded by the chunk size rather than the export size. Within a
+chunk every step is columnar: JSON cells are parsed once per distinct value,
+schedule timestamps are converted in one call, and the full description is
+assembled with vectorised string operations. The output matches the
+notebook's row by row. Next to it a ``.manifest.json`` records the source and
+output checksums, row counts and a content hash per course (keyed by aine_kood,
+the course's unique_ID in the app table), so a later step can pick out the
+courses that changed with changed_courses().
+
+The default output keeps the notebook's name: puhtad_andmed.csv, which the app
+reads, is built from this table by a later step and has different columns.
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import time
+
+import numpy as np
+import pandas as pd
+
+from config import CLEAN_CHUNK_ROWS
+
+DEFENSE_KEYWORDS = ["kaitsmise", "lõputöö", "magistritöö", "bakalaureusetöö", "doktoritöö"]
+
+# (new column, general column, version column); the version value wins when present.
+MERGE_MAPPING = [
+    ("nimi_et", "title__et", "version__title__et"),
+    ("nimi_en", "title__en", "version__title__en"),
+    ("eap", "credits", "version__credits"),
+    ("kirjeldus_et", "overview__description__et", "version__overview__description__et"),
+    ("kirjeldus_en", "overview__description__en", "version__overview__description__en"),
+    ("opitulemused_et", "overview__learning_outcomes_text_et", "version__overview__learning_outcomes_text_et"),
+    ("opitulemused_en", "overview__learning_outcomes_text_en", "version__overview__learning_outcomes_text_en"),
+]
+RENAME_MAPPING = [
+    ("aine_kood", "code"),
+    ("semester", "version__target__semester__et"),
+    ("oppeaste", "version__target__study_type__et"),
+    ("keel", "version__target__language__et"),
+    ("oppetoovorm", "version__target__study_type__et"),
+    ("oppeaste_json", "version__additional_info__study_levels"),
+    ("hindamisskaala", "additional_info__assessment_scale__et"),
+    ("linn", "version__target__course_main_structural_unit__city"),
+    ("teaduskond", "version__target__faculty__name__et"),
+    ("oppejoud_json", "version__participants__lecturers"),
+    ("toimumisajad_json", "version__schedule__entries"),
+    ("eeldusained_json", "additional_info__prerequisites"),
+    ("hindamise_eeltingimused", "version__grading__grade_preconditions__et"),
+    ("hindamise_meetod", "version__grading__grade_evaluation__et"),
+]
+FILTER_COLUMNS = ["additional_info__duration_in_semesters", "general__type__et"]
+NUMERIC_COLUMNS = ["credits", "version__credits", "additional_info__duration_in_semesters"]
+SOURCE_COLUMNS = set(FILTER_COLUMNS) | {c for _, *cols in MERGE_MAPPING for c in cols} | {c for _, c in RENAME_MAPPING}
+
+CATEGORICAL_COLUMNS = ["semester", "linn", "keel", "oppeaste", "oppetoovorm", "teaduskond", "hindamisskaala"]
+# (label, column) in the order create_full_description joins them.
+DESCRIPTION_FIELDS = [
+    ("Aine kood", "aine_kood"),
+    ("Nimi (ET)", "nimi_et"),
+    ("Nimi (EN)", "nimi_en"),
+    ("EAP", "eap"),
+    ("Semester", "semester"),
+    ("Õppeastmed", "oppeaste"),
+    ("Õppetöö vorm", "oppetoovorm"),
+    ("Keel", "keel"),
+    ("Hindamisskaala", "hindamisskaala"),
+    ("Linn", "linn"),
+    ("Teaduskond", "teaduskond"),
+    ("Õppejõud", "oppejoud"),
+    ("Toimumisajad", "toimumisajad"),
+    ("Kirjeldus", "kirjeldus_et"),
+    ("Eeldusained", "eeldusained"),
+    ("Õpitulemused", "opitulemused_et"),
+    ("Hindamise eeltingimused", "hindamise_eeltingimused"),
+    ("Hindamise meetod", "hindamise_meetod"),
+]
+FINAL_COLUMNS = [
+    "aine_kood", "nimi_et", "nimi_en", "eap", "semester", "hindamisskaala", "oppeaste", "oppetoovorm",
+    "keel", "linn", "teaduskond", "oppejoud", "toimumisajad", "kirjeldus_et", "kirjeldus_en",
+    "eeldusained", "opitulemused_et", "opitulemused_en", "hindamise_eeltingimused", "hindamise_meetod",
+    "kirjeldus",
+]
+
+WEEK_DAYS_ET = ["Esmaspäev", "Teisipäev", "Kolmapäev", "Neljapäev", "Reede", "Laupäev", "Pühapäev"]
+ISO_DATE_RE = re.compile(r"^(\d{4}-\d{2}-\d{2})(?:[T ]|$)")
+
+
+def parse_json_safe(json_str):
+    if pd.isna(json_str) or json_str == "":
+        return None
+    try:
+        return json.loads(json_str)
+    except (json.JSONDecodeError, TypeError):
+        return None
+
+
+def _per_distinct(values: pd.Series, fn) -> np.ndarray:
+    """fn(parsed JSON) for every cell, evaluated once per distinct string."""
+    codes, uniques = pd.factorize(values)
+    results = np.empty(len(uniques) + 1, dtype=object)
+    results[:-1] = [fn(parse_json_safe(u)) for u in uniques]
+    results[-1] = None  # code -1 = missing cell
+    return results[codes]
+
+
+def lecturers_from(data):
+    if not data:
+        return None
+    names = [p.get("person_name") for p in data if isinstance(p, dict) and p.get("person_name")]
+    return ", ".join(sorted(set(names))) if names else None
+
+
+def study_levels_from(data):
+    if not data:
+        return None
+    levels = [item.get("et") for item in data if isinstance(item, dict) and item.get("et")]
+    return ", ".join(sorted(set(levels))) if levels else None
+
+
+def _title(obj) -> str:
+    return (obj.get("et", "") or obj.get("en", "")) if isinstance(obj, dict) else ""
+
+
+def prerequisites_from(data):
+    """'(CODE "Title") VÕI (ALT "Title"); ...' as in the notebook's extract_prerequisites."""
+    if not data or not isinstance(data, list):
+        return None
+    prerequisites = []
+    for item in data:
+        if not isinstance(item, dict) or not item.get("code", ""):
+            continue
+        code, title = item["code"], _title(item.get("title", {}))
+        options = [f'({code} "{title}")' if title else f"({code})"]
+        alternatives = item.get("alternatives", [])
+        if isinstance(alternatives, list):
+            for alt in alternatives:
+                if isinstance(alt, dict) and alt.get("code", ""):
+                    alt_title = _title(alt.get("title", {}))
+                    options.append(f'({alt["code"]} "{alt_title}")' if alt_title else f'({alt["code"]})')
+        prerequisites.append(" VÕI ".join(options))
+    return "; ".join(prerequisites) if prerequisites else None
+
+
+def schedule_days(values: pd.Series) -> np.ndarray:
+    """Estonian week days (Monday first) on which each course meets, from the schedule JSON.
+
+    All timestamps of the chunk are converted at once; ISO timestamps only need
+    their date part, because the notebook took the day in the timestamp's own
+    offset. Anything else goes through pd.to_datetime one by one, as before.
+    """
+    codes, uniques = pd.factorize(values)
+    owners, stamps = [], []
+    for i, raw in enumerate(uniques):
+        data = parse_json_safe(raw)
+        if not data:
+            continue
+        for entry in data:
+            if isinstance(entry, dict):
+                time_str = entry.get("time") or entry.get("start_time")
+                if time_str:
+                    owners.append(i)
+                    stamps.append(time_str)
+
+    weekday = np.full(len(stamps), -1, dtype=np.int64)
+    iso = [ISO_DATE_RE.match(s) if isinstance(s, str) else None for s in stamps]
+    iso_pos = [j for j, m in enumerate(iso) if m]
+    if iso_pos:
+        dates = pd.to_datetime([iso[j].group(1) for j in iso_pos], format="%Y-%m-%d", errors="coerce")
+        weekday[iso_pos] = np.where(dates.isna(), -1, dates.dayofweek)
+    for j, m in enumerate(iso):
+        if m is None:
+            dt = pd.to_datetime(stamps[j], errors="coerce")
+            if not pd.isna(dt):
+                weekday[j] = dt.dayofweek
+
+    masks = np.zeros(len(uniques) + 1, dtype=np.int64)
+    valid = weekday >= 0
+    np.bitwise_or.at(masks, np.asarray(owners, dtype=np.int64)[valid], 1 << weekday[valid])
+    labels = np.array([", ".join(d for b, d in enumerate(WEEK_DAYS_ET) if m >> b & 1) or None
+                       for m in range(128)], dtype=object)
+    return labels[masks[codes]]
+
+
+def prefilter(df: pd.DataFrame) -> pd.DataFrame:
+    """Drops courses lasting more than one semester and thesis/defence courses."""
+    if "additional_info__duration_in_semesters" in df.columns:
+        duration = df["additional_info__duration_in_semesters"]
+        df = df[duration.isna() | (duration <= 1)]
+    if "general__type__et" in df.columns:
+        defense = df["general__type__et"].fillna("").str.lower().str.contains("|".join(DEFENSE_KEYWORDS))
+        df = df[~defense]
+    return df
+
+
+def resolve_fields(df: pd.DataFrame) -> pd.DataFrame:
+    """New clean columns, preferring the course version's value over the general one."""
+    out = pd.DataFrame(index=df.index)
+    for new_col, base, version in MERGE_MAPPING:
+        if base in df.columns and version in df.columns:
+            out[new_col] = df[version].fillna(df[base])
+        elif version in df.columns or base in df.columns:
+            out[new_col] = df[version if version in df.columns else base]
+        else:
+            out[new_col] = np.nan
+    for new_col, source in RENAME_MAPPING:
+        out[new_col] = df[source] if source in df.columns else np.nan
+    return out
+
+
+def create_full_description(df: pd.DataFrame) -> pd.Series:
+    """"Label: value" parts of all present fields joined with " | ", for every row at once."""
+    text = np.full(len(df), "", dtype=object)
+    for label, col in DESCRIPTION_FIELDS:
+        values = df[col]
+        present = values.notna().to_numpy()
+        part = (label + ": " + values.astype(str)).fillna("").to_numpy(dtype=object)
+        text = np.where(present, np.where(text == "", part, text + " | " + part), text)
+    return pd.Series(text, index=df.index, dtype=object)
+
+
+def clean_chunk(raw: pd.DataFrame) -> pd.DataFrame:
+    df = resolve_fields(prefilter(raw))
+    df["oppejoud"] = _per_distinct(df["oppejoud_json"], lecturers_from)
+    df["toimumisajad"] = schedule_days(df["toimumisajad_json"])
+    df["oppeaste"] = _per_distinct(df["oppeaste_json"], study_levels_from)
+    df["eeldusained"] = _per_distinct(df["eeldusained_json"], prerequisites_from)
+    for col in CATEGORICAL_COLUMNS:
+        df[col] = df[col].astype(str).str.strip().replace(["nan", "None", ""], np.nan)
+    df["kirjeldus"] = create_full_description(df)
+    return df[FINAL_COLUMNS]
+
+
+def _sha256(path: str, block: int = 1 << 22) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(block):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _course_hashes(chunk: pd.DataFrame, hashes: dict):
+    """Folds the content hash of every row of *chunk* into *hashes* (aine_kood -> sha256);
+    a code on several rows gets one hash over all of them, in file order."""
+    values = chunk[FINAL_COLUMNS].astype(object).where(chunk[FINAL_COLUMNS].notna(), "").astype(str)
+    rows = values[FINAL_COLUMNS[0]].str.cat([values[c] for c in FINAL_COLUMNS[1:]], sep="\x1f")
+    for code, row in zip(values["aine_kood"], rows):
+        hashes.setdefault(code, hashlib.sha256()).update(row.encode("utf-8") + b"\x1e")
+
+
+def changed_courses(old: dict, new: dict) -> tuple[list, list, list]:
+    """(added, changed, removed) aine_kood values between two manifests of clean_file."""
+    old_courses, new_courses = old.get("courses", {}), new.get("courses", {})
+    added = sorted(new_courses.keys() - old_courses.keys())
+    removed = sorted(old_courses.keys() - new_courses.keys())
+    changed = sorted(code for code in new_courses.keys() & old_courses.keys()
+                     if new_courses[code] != old_courses[code])
+    return added, changed, removed
+
+
+def _parquet_writer(path: str, first: pd.DataFrame):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise SystemExit("Parquet väljundiks on vaja pyarrow paketti (pip install pyarrow).") from e
+    schema = pa.schema([(c, pa.float64() if c == "eap" else pa.string()) for c in first.columns])
+    writer = pq.ParquetWriter(path, schema)
+    return lambda chunk: writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False)), writer
+
+
+def clean_file(src: str, dst: str, chunk_rows: int = CLEAN_CHUNK_ROWS) -> dict:
+    """Cleans *src* into *dst* (.csv or .parquet) chunk by chunk and writes the manifest."""
+    start = time.perf_counter()
+    tmp = dst + ".tmp"
+    rows_in = rows_out = 0
+    write, parquet = None, None
+    hashes = {}
+    reader = pd.read_csv(
+        src, usecols=lambda c: c in SOURCE_COLUMNS, chunksize=chunk_rows,
+        # Fixed dtypes, so every chunk is parsed the same way the whole file would be.
+        dtype={c: "float64" if c in NUMERIC_COLUMNS else object for c in SOURCE_COLUMNS},
+    )
+    for raw in reader:
+        rows_in += len(raw)
+        chunk = clean_chunk(raw)
+        rows_out += len(chunk)
+        _course_hashes(chunk, hashes)
+        if dst.endswith(".parquet"):
+            if write is None:
+                write, parquet = _parquet_writer(tmp, chunk)
+            write(chunk)
+        else:
+            chunk.to_csv(tmp, mode="a" if write else "w", header=not write, index=False)
+            write = True
+    if parquet is not None:
+        parquet.close()
+    if write is None:
+        pd.DataFrame(columns=FINAL_COLUMNS).to_csv(tmp, index=False)
+    os.replace(tmp, dst)
+
+    manifest = {
+        "source": os.path.basename(src),
+        "source_sha256": _sha256(src),
+        "output": os.path.basename(dst),
+        "output_sha256": _sha256(dst),
+        "rows_in": rows_in,
+        "rows_out": rows_out,
+        "columns": FINAL_COLUMNS,
+        "chunk_rows": chunk_rows,
+        "seconds": round(time.perf_counter() - start, 3),
+        "courses": {code: digest.hexdigest() for code, digest in hashes.items()},
+    }
+    with open(dst + ".manifest.json", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("src", nargs="?", default="toorandmed_aasta.csv")
+    parser.add_argument("dst", nargs="?", default="andmed_puhastatud.csv")
+    parser.add_argument("--chunk-rows", type=int, default=CLEAN_CHUNK_ROWS)
+    args = parser.parse_args()
+
+    manifest = clean_file(args.src, args.dst, args.chunk_rows)
+    print(f"Puhastatud {manifest['rows_in']:,} → {manifest['rows_out']:,} rida "
+          f"{manifest['seconds']:.1f} s-ga → {args.dst} (+ .manifest.json)")
+
+
+if __name__ == "__main__":
+    main()
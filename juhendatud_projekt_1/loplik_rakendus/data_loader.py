@@ -1,20 +1,212 @@
+import hashlib
+import importlib.util
+import io
 import os
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
 
 import pandas as pd
 import streamlit as st
-from sentence_transformers import SentenceTransformer
 
-from config import DATA_CSV, DATA_EMBEDDINGS, TEST_CASES_FILE
+from ann_index import load_for_store
+from config import (
+    CATEGORY_COLUMNS,
+    DATA_CSV,
+    DATA_EMBEDDING_STORE,
+    DATA_EMBEDDINGS,
+    DATA_HOT_RELOAD,
+    DATA_RELOAD_DEBOUNCE_S,
+    DATA_SENTENCE_STORE,
+    DATA_TEXT_STORE,
+    EMBEDDING_MODEL,
+    EMBEDDING_QUANTIZATION,
+    QUERY_CACHE_DB,
+    RESPONSE_CACHE_DB,
+    SEARCH_BACKEND,
+    TEST_CASES_FILE,
+)
+from course_store import CourseStore
+from dataset_watcher import DataFileWatcher
+from embedding_cache import QueryEmbeddingCache
+from embedding_store import (
+    HEADER_SUFFIX,
+    build_embedding_matrix,
+    load_quantized,
+    load_store,
+    sha256_file,
+    store_exists,
+    verify_store,
+)
+from response_cache import ResponseCache
+from result_cache import RetrievalCache
+
+PROCESS_START = time.perf_counter()
+LOAD_TIMINGS = {}
+# Arrow strings are one buffer per column instead of a Python object per cell; without pyarrow
+# the text columns keep pandas' default dtype.
+STRING_DTYPE = pd.StringDtype("pyarrow") if importlib.util.find_spec("pyarrow") else None
+
+
+def read_courses(source) -> pd.DataFrame:
+    """Reads the course CSV with the compact schema: categoricals for the low-cardinality
+    filter columns, Arrow-backed strings for the other text columns, numbers as inferred."""
+    df = pd.read_csv(source, dtype={col: "category" for col in CATEGORY_COLUMNS})
+    if STRING_DTYPE is not None:
+        text_columns = [
+            col for col in df.columns
+            if col not in CATEGORY_COLUMNS and not pd.api.types.is_numeric_dtype(df[col])
+        ]
+        df[text_columns] = df[text_columns].astype(STRING_DTYPE)
+    return df
+
+
+def load_embeddings(verify: bool = False):
+    """Returns (emb_matrix, row_ids, checksum): the memmapped store if present, else the
+    legacy pickle. With *verify*, the store's checksums are recomputed first."""
+    if store_exists(DATA_EMBEDDING_STORE):
+        if verify and not verify_store(DATA_EMBEDDING_STORE):
+            raise ValueError(f"Embedding-hoidla '{DATA_EMBEDDING_STORE}' kontrollsummad ei klapi.")
+        emb_matrix, row_ids, header = load_store(DATA_EMBEDDING_STORE)
+        return emb_matrix, row_ids, header["sha256"]
+    emb_matrix, row_ids = build_embedding_matrix(pd.read_pickle(DATA_EMBEDDINGS))
+    return emb_matrix, row_ids, sha256_file(DATA_EMBEDDINGS)
+
+
+def load_store_from_disk(verify: bool = False) -> CourseStore:
+    # The CSV is hashed and parsed from the same bytes, so the version always matches the data.
+    with open(DATA_CSV, "rb") as f:
+        csv_bytes = f.read()
+    emb_matrix, row_ids, emb_sha = load_embeddings(verify)
+    version = f"{hashlib.sha256(csv_bytes).hexdigest()[:8]}-{emb_sha[:8]}"
+    ann_index = quantized = None
+    if store_exists(DATA_EMBEDDING_STORE):
+        if SEARCH_BACKEND == "ivf":
+            ann_index = load_for_store(DATA_EMBEDDING_STORE)
+        if EMBEDDING_QUANTIZATION:
+            quantized = load_quantized(DATA_EMBEDDING_STORE, EMBEDDING_QUANTIZATION)
+    return CourseStore(read_courses(io.BytesIO(csv_bytes)), emb_matrix, row_ids, ann_index, quantized, version,
+                       DATA_TEXT_STORE, DATA_SENTENCE_STORE)
+
+
+def load_models():
+    """Loads the embedder and the course store. Returns (embedder, store)."""
+    global _store
+    # Imported here: torch makes it by far the slowest import of the app.
+    from sentence_transformers import SentenceTransformer
+
+    start = time.perf_counter()
+    model = SentenceTransformer(EMBEDDING_MODEL)
+    # Warm-up so the first real query does not pay for lazy torch initialisation.
+    model.encode(["soojendus"])
+    LOAD_TIMINGS["embedder_s"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    store = _store = load_store_from_disk()
+    LOAD_TIMINGS["store_s"] = time.perf_counter() - start
+    LOAD_TIMINGS["ready_after_import_s"] = time.perf_counter() - PROCESS_START
+    print(f"Mudel ja andmed laetud {LOAD_TIMINGS['ready_after_import_s']:.1f} s pärast käivitust "
+          f"(andmestik {store.version}).")
+    if DATA_HOT_RELOAD:
+        _watcher.start()
+    return QueryEmbeddingCache(model, EMBEDDING_MODEL, QUERY_CACHE_DB), store
+
+
+def reload_store() -> bool:
+    """Builds a store from the files now on disk and swaps it in if the data changed.
+    Runs on the loader thread, never on a request. Returns True if a new version went live."""
+    global _store
+    start = time.perf_counter()
+    try:
+        store = load_store_from_disk(verify=True)
+    except (OSError, ValueError, KeyError, pd.errors.ParserError) as e:
+        # Usually a half-written export; the next file event triggers another attempt.
+        print(f"Hoiatus: uut andmestikku ei õnnestunud laadida ({e}), jätkan versiooniga {_store.version}.")
+        return False
+    except Exception:
+        # Anything else (e.g. a schema change CourseStore does not handle) would otherwise
+        # vanish with the discarded executor future and silently stop hot reload.
+        print(f"Hoiatus: uue andmestiku laadimine ebaõnnestus ootamatult, jätkan versiooniga {_store.version}:")
+        traceback.print_exc()
+        return False
+    if store.version == _store.version:
+        return False
+    old_version = _store.version
+    # One reference assignment: new requests get the new store, requests that already
+    # hold the old one finish on it, and its memmap stays valid because the store
+    # files are replaced by rename, not rewritten in place.
+    _store = store
+    # Keys carry the version, so old entries could never hit again; this just frees them.
+    retrieval_cache.invalidate()
+    print(f"Andmestik vahetatud: {old_version} → {store.version} ({len(store):,} kursust, "
+          f"{time.perf_counter() - start:.1f} s).")
+    return True
+
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="mudeli-laadija")
+_models_future = None
+_store = None
+_start_lock = threading.Lock()
+retrieval_cache = RetrievalCache()
+_watcher = DataFileWatcher(
+    [DATA_CSV, DATA_EMBEDDINGS, DATA_EMBEDDING_STORE + HEADER_SUFFIX],
+    lambda: _executor.submit(reload_store),
+    DATA_RELOAD_DEBOUNCE_S,
+)
+
+
+def _forget_failed(future):
+    """A failed load is not kept: the next start_loading submits a new one (missing data
+    files or a failed model download may be fixed by then)."""
+    global _models_future
+    if future.exception() is not None:
+        with _start_lock:
+            if _models_future is future:
+                _models_future = None
+
+
+def start_loading():
+    """Starts the background load once per process; later calls return the same future.
+    Called first thing in app7.main, so the page renders while the model loads, but
+    merely importing this module (tests, benchmarks) loads nothing."""
+    global _models_future
+    with _start_lock:
+        started = _models_future is None
+        if started:
+            _models_future = _executor.submit(load_models)
+        future = _models_future
+    if started:
+        # Outside the lock: the callback runs right here if the load has already failed.
+        future.add_done_callback(_forget_failed)
+    return future
+
+
+def models_ready() -> bool:
+    future = _models_future
+    return future is not None and future.done() and future.exception() is None
 
 
-@st.cache_resource
 def get_models():
-    embedder = SentenceTransformer("BAAI/bge-m3")
-    df = pd.read_csv(DATA_CSV)
-    embeddings_df = pd.read_pickle(DATA_EMBEDDINGS)
+    """Waits for the background load, showing a status box meanwhile.
+    Returns (embedder, store) with the store of the currently active dataset version."""
+    future = start_loading()
+    if not future.done():
+        with st.status("Laen keelemudelit ja kursuste andmeid…") as status:
+            future.result()
+            status.update(label="Keelemudel ja andmed laetud.", state="complete")
+    embedder, _ = future.result()
+    return embedder, _store
+
+
+@st.cache_resource
+def get_response_cache() -> ResponseCache | None:
+    """The process-wide LLM answer cache, or None when RESPONSE_CACHE_DB is off."""
+    return ResponseCache(RESPONSE_CACHE_DB) if RESPONSE_CACHE_DB else None
 
-    test_cases_df = pd.DataFrame()
-    if os.path.exists(TEST_CASES_FILE):
-        test_cases_df = pd.read_csv(TEST_CASES_FILE)
 
-    return embedder, df, embeddings_df, test_cases_df
+@st.cache_data
+def get_test_cases() -> pd.DataFrame:
+    if os.path.exists(TEST_CASES_FILE):
+        return pd.read_csv(TEST_CASES_FILE)
+    return pd.DataFrame()
@@ -0,0 +1,65 @@
+import os
+import threading
+
+
+class DataFileWatcher:
+    """Calls *on_change* (debounced) after one of *paths* is created, modified or moved into place.
+
+    Uses watchdog when it is installed; without it start() returns False and
+    the app simply keeps the dataset it started with.
+    """
+
+    def __init__(self, paths, on_change, debounce_s: float):
+        self.paths = {os.path.abspath(p) for p in paths}
+        self.on_change = on_change
+        self.debounce_s = debounce_s
+        self._timer = None
+        self._lock = threading.Lock()
+        self._observer = None
+
+    def _notify(self, *paths):
+        if not any(path and os.path.abspath(path) in self.paths for path in paths):
+            return
+        # Exports rewrite several files in a row; act once, after they have settled.
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(self.debounce_s, self.on_change)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def start(self) -> bool:
+        try:
+            from watchdog.events import FileSystemEventHandler
+            from watchdog.observers import Observer
+        except ImportError:
+            print("Hoiatus: watchdog puudub, andmefailide muutusi ei jälgita.")
+            return False
+
+        watcher = self
+
+        class _Handler(FileSystemEventHandler):
+            # Only writes count: reading the files during a reload must not trigger another one.
+            def on_created(self, event):
+                watcher._notify(event.src_path)
+
+            def on_modified(self, event):
+                watcher._notify(event.src_path)
+
+            def on_moved(self, event):
+                watcher._notify(event.dest_path)
+
+        self._observer = Observer()
+        for directory in {os.path.dirname(p) for p in self.paths}:
+            if os.path.isdir(directory):
+                self._observer.schedule(_Handler(), directory, recursive=False)
+        self._observer.daemon = True
+        self._observer.start()
+        return True
+
+    def stop(self):
+        if self._observer is not None:
+            self._observer.stop()
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
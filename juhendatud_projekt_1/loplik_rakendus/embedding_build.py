@@ -0,0 +1,225 @@
+"""Incremental embedding build: re-encodes only the courses whose text changed.
+
+Every course is encoded from its full description (the ``kirjeldus`` column
+written by the cleaning step's create_full_description). The SHA-256 of that
+text is kept next to the embedding store, so a rebuild after a new export
+encodes only new or changed unique_IDs, drops removed ones and reuses the rest:
+
+    python embedding_build.py puhtad_andmed.csv puhtad_andmed_embeddings [--workers 4] [--batch-size 32]
+
+Texts are sorted by length before batching, so a batch pads to similar lengths.
+Every finished batch is saved under ``<base>.build/``; rerunning the same
+command after an interruption skips the batches already there.
+"""
+import argparse
+import glob
+import hashlib
+import multiprocessing
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from ann_index import index_path
+from config import EMBED_BATCH_SIZE, EMBED_WORKERS, EMBEDDING_MODEL
+from embedding_store import (
+    QUANTIZED_SUFFIXES,
+    build_embedding_matrix,
+    load_content_hashes,
+    load_store,
+    read_header,
+    store_exists,
+    write_store,
+)
+
+TEXT_COLUMN = "kirjeldus"
+CHECKPOINT_SUFFIX = ".build"
+
+_model = None
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _init_worker(model_name: str, threads: int):
+    global _model
+    from sentence_transformers import SentenceTransformer
+    try:
+        import torch
+        torch.set_num_threads(threads)  # workers share the cores instead of oversubscribing them
+    except ImportError:
+        pass
+    _model = SentenceTransformer(model_name)
+
+
+def _encode(texts: list[str]) -> np.ndarray:
+    return np.asarray(_model.encode(texts, batch_size=len(texts), normalize_embeddings=True), dtype=np.float32)
+
+
+def length_sorted_batches(texts: list[str], batch_size: int) -> list[np.ndarray]:
+    """Positions of *texts* grouped into batches of similar length, longest first."""
+    order = np.argsort([-len(t) for t in texts], kind="stable")
+    return [order[start:start + batch_size] for start in range(0, len(order), batch_size)]
+
+
+def padding_waste(texts: list[str], batches: list[np.ndarray]) -> float:
+    """Share of padded positions (characters as a proxy for tokens) across *batches*."""
+    lengths = np.array([len(t) for t in texts])
+    padded = sum(lengths[b].max() * len(b) for b in batches if len(b))
+    return 1 - lengths.sum() / padded if padded else 0.0
+
+
+def _existing_vectors(base: str, model_name: str, trust_existing: bool, pickle_path: str | None):
+    """(matrix, {unique_ID: row}, {unique_ID: hash}) of vectors that may be reused."""
+    if store_exists(base):
+        model = read_header(base).get("model")
+        if model is not None and model != model_name:
+            print(f"Hoidla on tehtud mudeliga {model}, kodeerin kõik uuesti mudeliga {model_name}.")
+            return None, {}, {}
+        matrix, unique_ids, _ = load_store(base)
+        hashes = load_content_hashes(base)
+    elif pickle_path:
+        matrix, unique_ids = build_embedding_matrix(pd.read_pickle(pickle_path))
+        hashes = {}
+    else:
+        return None, {}, {}
+    if not hashes and not trust_existing:
+        print("Olemasolevatel vektoritel puuduvad sisuräsid – kodeerin kõik uuesti (vt --trust-existing).")
+        return None, {}, {}
+    return matrix, {uid: row for row, uid in enumerate(unique_ids.tolist())}, hashes
+
+
+def _load_checkpoints(directory: str, model_name: str) -> dict:
+    """unique_ID -> (hash, vector) from the batches an earlier run already finished."""
+    done = {}
+    for path in sorted(glob.glob(os.path.join(directory, "batch_*.npz"))):
+        with np.load(path, allow_pickle=False) as batch:
+            if str(batch["model"]) != model_name:
+                continue
+            for uid, digest, vec in zip(batch["ids"].tolist(), batch["hashes"].tolist(), batch["vectors"]):
+                done[uid] = (digest, vec)
+    return done
+
+
+def _save_checkpoint(directory: str, number: int, ids, hashes, vectors, model_name: str):
+    path = os.path.join(directory, f"batch_{number:06d}.npz")
+    np.savez(path + ".tmp.npz", ids=np.asarray(ids, dtype=str), hashes=np.asarray(hashes, dtype=str),
+             vectors=vectors, model=np.array(model_name))
+    os.replace(path + ".tmp.npz", path)
+
+
+def build(csv_path: str, base: str, model_name: str = EMBEDDING_MODEL, workers: int = EMBED_WORKERS,
+          batch_size: int = EMBED_BATCH_SIZE, trust_existing: bool = False,
+          pickle_path: str | None = None) -> dict:
+    """Brings the store *base* in line with the courses in *csv_path*. Returns summary counts."""
+    start = time.perf_counter()
+    df = pd.read_csv(csv_path, usecols=["unique_ID", TEXT_COLUMN])
+    duplicates = df["unique_ID"].duplicated()
+    if duplicates.any():
+        print(f"Hoiatus: {int(duplicates.sum())} korduvat unique_ID-d, kasutan esimest.")
+        df = df[~duplicates]
+    if df.empty:
+        # An empty store would replace a good one and leave the app with nothing to search.
+        raise ValueError(f"'{csv_path}' ei sisalda ühtegi kursust; hoidla '{base}' jääb muutmata.")
+    unique_ids = df["unique_ID"].astype(str).tolist()
+    texts = df[TEXT_COLUMN].fillna("").astype(str).tolist()
+    hashes = [content_hash(t) for t in texts]
+
+    old_matrix, old_rows, old_hashes = _existing_vectors(base, model_name, trust_existing, pickle_path)
+    reuse = [
+        uid in old_rows and (old_hashes.get(uid) == digest if old_hashes else True)
+        for uid, digest in zip(unique_ids, hashes)
+    ]
+
+    checkpoint_dir = base + CHECKPOINT_SUFFIX
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    done = _load_checkpoints(checkpoint_dir, model_name)
+    todo = [i for i, ok in enumerate(reuse)
+            if not ok and done.get(unique_ids[i], (None,))[0] != hashes[i]]
+    resumed = sum(1 for i, ok in enumerate(reuse) if not ok) - len(todo)
+
+    todo_texts = [texts[i] for i in todo]
+    batches = length_sorted_batches(todo_texts, batch_size)
+    if batches:
+        unsorted = [np.arange(s, min(s + batch_size, len(todo))) for s in range(0, len(todo), batch_size)]
+        print(f"Kodeerin {len(todo):,} kursust {len(batches)} partiis ({workers} protsessi), "
+              f"täitmine {padding_waste(todo_texts, batches):.0%} "
+              f"(sortimata oleks {padding_waste(todo_texts, unsorted):.0%}).")
+    number = len(glob.glob(os.path.join(checkpoint_dir, "batch_*.npz")))
+
+    def finish(batch, vectors):
+        nonlocal number
+        rows = [todo[j] for j in batch]
+        ids, digests = [unique_ids[r] for r in rows], [hashes[r] for r in rows]
+        _save_checkpoint(checkpoint_dir, number, ids, digests, vectors, model_name)
+        number += 1
+        done.update(zip(ids, zip(digests, vectors)))
+        print(f"  partii {number}: {len(rows)} kursust valmis")
+
+    threads = max(1, (os.cpu_count() or 1) // max(workers, 1))
+    if workers > 1 and len(batches) > 1:
+        context = multiprocessing.get_context("spawn")  # torch does not survive fork reliably
+        with ProcessPoolExecutor(workers, mp_context=context, initializer=_init_worker,
+                                 initargs=(model_name, threads)) as pool:
+            futures = {pool.submit(_encode, [todo_texts[j] for j in batch]): batch for batch in batches}
+            for future in as_completed(futures):
+                finish(futures[future], future.result())
+    elif batches:
+        _init_worker(model_name, threads)
+        for batch in batches:
+            finish(batch, _encode([todo_texts[j] for j in batch]))
+
+    dim = old_matrix.shape[1] if old_matrix is not None else next(iter(done.values()))[1].shape[0]
+    matrix = np.empty((len(unique_ids), dim), dtype=np.float32)
+    reused, encoded = np.flatnonzero(reuse), np.flatnonzero(~np.asarray(reuse, dtype=bool))
+    if len(reused):
+        matrix[reused] = old_matrix[[old_rows[unique_ids[i]] for i in reused]]
+    if len(encoded):
+        matrix[encoded] = np.stack([done[unique_ids[i]][1] for i in encoded])
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    matrix /= np.where(norms == 0, 1, norms)
+    write_store(base, matrix, unique_ids, hashes, model_name)
+    shutil.rmtree(checkpoint_dir, ignore_errors=True)
+
+    return {
+        "rows": len(unique_ids),
+        "reused": int(sum(reuse)),
+        "encoded": len(todo),
+        "resumed": resumed,
+        "removed": len(set(old_rows) - set(unique_ids)),
+        "seconds": time.perf_counter() - start,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("csv_path")
+    parser.add_argument("base")
+    parser.add_argument("--model", default=EMBEDDING_MODEL)
+    parser.add_argument("--workers", type=int, default=EMBED_WORKERS)
+    parser.add_argument("--batch-size", type=int, default=EMBED_BATCH_SIZE)
+    parser.add_argument("--from-pickle", default=None,
+                        help="Vanad vektorid pickle-failist, kui hoidlat veel pole")
+    parser.add_argument("--trust-existing", action="store_true",
+                        help="Kasuta räsideta vektoreid uuesti (eeldab, et need vastavad praegusele CSV-le)")
+    args = parser.parse_args()
+
+    try:
+        summary = build(args.csv_path, args.base, args.model, args.workers, args.batch_size,
+                        args.trust_existing, args.from_pickle)
+    except ValueError as e:
+        raise SystemExit(f"Viga: {e}") from e
+    print(f"Valmis {summary['seconds']:.1f} s: {summary['rows']:,} rida, uuesti kasutatud {summary['reused']:,}, "
+          f"kodeeritud {summary['encoded']:,}, kontrollpunktist {summary['resumed']:,}, "
+          f"eemaldatud {summary['removed']:,} → {args.base}")
+    derived = [index_path(args.base)] + [args.base + suffix for suffix in QUANTIZED_SUFFIXES.values()]
+    if any(os.path.exists(path) for path in derived):
+        print("IVF indeks ja/või kvantiseeritud koopia on nüüd aegunud – ehita need uuesti.")
+
+
+if __name__ == "__main__":
+    main()
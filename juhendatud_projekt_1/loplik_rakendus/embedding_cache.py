@@ -0,0 +1,110 @@
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from config import CACHE_PRUNE_SLACK, QUERY_CACHE_DB_MAX_ROWS, QUERY_CACHE_SIZE
+
+
+def normalize_query(text: str) -> str:
+    """Collapses whitespace and case so trivially different spellings share a cache entry."""
+    return " ".join(str(text).split()).casefold()
+
+
+class QueryEmbeddingCache:
+    """Caches query vectors in front of a SentenceTransformer-like embedder.
+
+    Lookups go to a bounded in-memory LRU first, then to an optional SQLite
+    file that survives restarts. Entries are keyed by model name, so switching
+    the model never returns stale vectors. Exposes the same encode(texts) call
+    as the embedder, so it can be passed wherever the embedder was.
+    """
+
+    def __init__(self, embedder, model_name: str, db_path: str | None = None,
+                 maxsize: int = QUERY_CACHE_SIZE):
+        self.embedder = embedder
+        self.model_name = model_name
+        self.maxsize = maxsize
+        self.stats = {"hits": 0, "disk_hits": 0, "misses": 0}
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._db_rows = 0
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS query_embeddings ("
+                " model TEXT NOT NULL, query TEXT NOT NULL, vector BLOB NOT NULL,"
+                " created REAL NOT NULL, PRIMARY KEY (model, query))"
+            )
+            # Vectors of any other model can never be hit again.
+            self._db.execute("DELETE FROM query_embeddings WHERE model != ?", (model_name,))
+            self._db.commit()
+            self._db_rows = self._db.execute("SELECT COUNT(*) FROM query_embeddings").fetchone()[0]
+
+    def _remember(self, key: str, vec: np.ndarray):
+        self._lru[key] = vec
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.maxsize:
+            self._lru.popitem(last=False)
+
+    def _lookup(self, key: str):
+        vec = self._lru.get(key)
+        if vec is not None:
+            self._lru.move_to_end(key)
+            self.stats["hits"] += 1
+            return vec
+        if self._db is not None:
+            row = self._db.execute(
+                "SELECT vector FROM query_embeddings WHERE model = ? AND query = ?",
+                (self.model_name, key),
+            ).fetchone()
+            if row is not None:
+                vec = np.frombuffer(row[0], dtype=np.float32)
+                self._remember(key, vec)
+                self.stats["disk_hits"] += 1
+                return vec
+        return None
+
+    def _store(self, keys: list[str], vectors: np.ndarray):
+        for key, vec in zip(keys, vectors):
+            self._remember(key, vec)
+        if self._db is not None:
+            now = time.time()
+            self._db.executemany(
+                "INSERT OR REPLACE INTO query_embeddings VALUES (?, ?, ?, ?)",
+                [(self.model_name, key, vec.tobytes(), now) for key, vec in zip(keys, vectors)],
+            )
+            # An upper bound (a replaced key counts again); the exact count is taken when pruning.
+            self._db_rows += len(keys)
+            if self._db_rows > QUERY_CACHE_DB_MAX_ROWS * (1 + CACHE_PRUNE_SLACK):
+                # Sorting the whole table is only worth it once in a while, not on every insert.
+                self._db.execute(
+                    "DELETE FROM query_embeddings WHERE rowid NOT IN ("
+                    " SELECT rowid FROM query_embeddings ORDER BY created DESC LIMIT ?)",
+                    (QUERY_CACHE_DB_MAX_ROWS,),
+                )
+                self._db_rows = self._db.execute("SELECT COUNT(*) FROM query_embeddings").fetchone()[0]
+            self._db.commit()
+
+    def encode(self, texts, **kwargs) -> np.ndarray:
+        """Returns one float32 vector per text, encoding only the texts not cached yet."""
+        keys = [normalize_query(t) for t in texts]
+        with self._lock:
+            found = {key: self._lookup(key) for key in dict.fromkeys(keys)}
+            missing = [key for key, vec in found.items() if vec is None]
+            self.stats["misses"] += len(missing)
+        if missing:
+            # Unlocked, so other sessions' lookups don't wait for the model; a query encoded
+            # by two sessions at once is simply stored twice.
+            vectors = np.asarray(self.embedder.encode(missing, **kwargs), dtype=np.float32)
+            with self._lock:
+                self._store(missing, vectors)
+            found.update(zip(missing, vectors))
+        return np.stack([found[key] for key in keys])
+
+    def stats_snapshot(self) -> dict:
+        with self._lock:
+            return {**self.stats, "size": len(self._lru)}
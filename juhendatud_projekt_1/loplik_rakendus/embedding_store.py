@@ -0,0 +1,243 @@
+"""On-disk embedding store opened with np.memmap.
+
+A store with base name ``puhtad_andmed_embeddings`` consists of three files:
+
+    puhtad_andmed_embeddings.f32      raw row-major matrix, L2-normalised
+    puhtad_andmed_embeddings.ids.npy  unique_ID of every matrix row
+    puhtad_andmed_embeddings.json     header: format, dim, dtype, rows, checksums
+
+Stores written by embedding_build.py also keep the content hash of every
+row's source text in ``.hashes.npy`` and the model name in the header.
+
+The matrix is mapped read-only, so every app process on the host shares the
+same page-cache pages instead of unpickling a private copy.
+
+Optionally a quantized copy is kept next to it for the first-pass scan
+(``.i8`` with per-dimension scale/offset in ``.i8.npz``, or ``.f16``); the
+full-precision file is then only read for rescoring the best candidates.
+
+Convert the existing pickle and (optionally) quantize with:
+
+    python embedding_store.py convert puhtad_andmed_embeddings.pkl puhtad_andmed_embeddings
+    python embedding_store.py quantize puhtad_andmed_embeddings --kind int8
+"""
+import argparse
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+STORE_FORMAT = 1
+MATRIX_SUFFIX = ".f32"
+IDS_SUFFIX = ".ids.npy"
+HASHES_SUFFIX = ".hashes.npy"
+HEADER_SUFFIX = ".json"
+QUANTIZED_SUFFIXES = {"int8": ".i8", "float16": ".f16"}
+QUANTIZED_DTYPES = {"int8": np.int8, "float16": np.float16}
+
+
+def build_embedding_matrix(embeddings_df: pd.DataFrame):
+    """Stacks the embedding column into one contiguous, L2-normalised float32 matrix.
+    Returns (matrix, unique_ids) where row i of the matrix belongs to unique_ids[i]."""
+    matrix = np.ascontiguousarray(np.stack(embeddings_df["embedding"].values), dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    matrix /= np.where(norms == 0, 1, norms)
+    return matrix, embeddings_df["unique_ID"].to_numpy()
+
+
+def sha256_file(path: str, block: int = 1 << 22) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(block):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def store_exists(base: str) -> bool:
+    # The header is written last, so its presence means the store is complete.
+    return os.path.exists(base + HEADER_SUFFIX)
+
+
+def read_header(base: str) -> dict:
+    with open(base + HEADER_SUFFIX, encoding="utf-8") as f:
+        header = json.load(f)
+    if header.get("format") != STORE_FORMAT:
+        raise ValueError(f"Tundmatu embedding-hoidla formaat: {header.get('format')}")
+    return header
+
+
+def write_store(base: str, matrix: np.ndarray, unique_ids, content_hashes=None, model: str | None = None) -> dict:
+    """Writes matrix + ids (+ content hashes) + header atomically (temp files, then rename).
+    Returns the header."""
+    matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+    ids = np.asarray(unique_ids).astype(str)
+    if matrix.ndim != 2 or len(ids) != matrix.shape[0]:
+        raise ValueError("Maatriksi ridade arv ja unique_ID-de arv ei klapi.")
+
+    matrix_tmp, ids_tmp = base + MATRIX_SUFFIX + ".tmp", base + ".ids.tmp.npy"
+    matrix.tofile(matrix_tmp)
+    np.save(ids_tmp, ids, allow_pickle=False)
+    header = {
+        "format": STORE_FORMAT,
+        "dim": int(matrix.shape[1]),
+        "dtype": "float32",
+        "rows": int(matrix.shape[0]),
+        "sha256": sha256_file(matrix_tmp),
+        "ids_sha256": sha256_file(ids_tmp),
+    }
+    if model is not None:
+        header["model"] = model
+    os.replace(matrix_tmp, base + MATRIX_SUFFIX)
+    os.replace(ids_tmp, base + IDS_SUFFIX)
+    if content_hashes is not None:
+        hashes_tmp = base + ".hashes.tmp.npy"
+        np.save(hashes_tmp, np.asarray(content_hashes).astype(str), allow_pickle=False)
+        os.replace(hashes_tmp, base + HASHES_SUFFIX)
+    elif os.path.exists(base + HASHES_SUFFIX):
+        os.remove(base + HASHES_SUFFIX)  # would describe the previous rows
+    header_tmp = base + HEADER_SUFFIX + ".tmp"
+    with open(header_tmp, "w", encoding="utf-8") as f:
+        json.dump(header, f, indent=2)
+    os.replace(header_tmp, base + HEADER_SUFFIX)
+    return header
+
+
+def load_store(base: str):
+    """Opens the store read-only. Returns (matrix memmap, unique_ids, header)."""
+    header = read_header(base)
+    matrix = np.memmap(base + MATRIX_SUFFIX, dtype=header["dtype"], mode="r",
+                       shape=(header["rows"], header["dim"]))
+    unique_ids = np.load(base + IDS_SUFFIX, allow_pickle=False)
+    if len(unique_ids) != header["rows"]:
+        raise ValueError("Embedding-hoidla päis ja unique_ID fail ei klapi.")
+    return matrix, unique_ids, header
+
+
+def load_content_hashes(base: str) -> dict:
+    """unique_ID -> content hash of the text each row was encoded from; empty for stores
+    written without hashes (e.g. converted from the pickle)."""
+    if not os.path.exists(base + HASHES_SUFFIX):
+        return {}
+    unique_ids = np.load(base + IDS_SUFFIX, allow_pickle=False)
+    hashes = np.load(base + HASHES_SUFFIX, allow_pickle=False)
+    if len(hashes) != len(unique_ids):
+        return {}
+    return dict(zip(unique_ids.tolist(), hashes.tolist()))
+
+
+def verify_store(base: str) -> bool:
+    """Recomputes both checksums and compares them with the header."""
+    header = read_header(base)
+    return (
+        sha256_file(base + MATRIX_SUFFIX) == header["sha256"]
+        and sha256_file(base + IDS_SUFFIX) == header["ids_sha256"]
+    )
+
+
+class QuantizedMatrix:
+    """Int8 (per-dimension scale and offset) or float16 copy of the store for approximate scoring."""
+
+    def __init__(self, kind: str, codes: np.ndarray, scale: np.ndarray | None = None,
+                 offset: np.ndarray | None = None):
+        self.kind = kind
+        self.codes = codes
+        self.scale = scale
+        self.offset = offset
+
+    def __len__(self):
+        return len(self.codes)
+
+    @classmethod
+    def from_matrix(cls, kind: str, matrix: np.ndarray, block: int = 65536) -> "QuantizedMatrix":
+        if kind == "float16":
+            return cls(kind, np.asarray(matrix, dtype=np.float16))
+        low, high = matrix.min(axis=0), matrix.max(axis=0)
+        offset = ((high + low) / 2).astype(np.float32)
+        scale = np.maximum((high - low) / 254, 1e-12).astype(np.float32)
+        codes = np.empty(matrix.shape, dtype=np.int8)
+        for start in range(0, len(matrix), block):
+            chunk = (np.asarray(matrix[start:start + block]) - offset) / scale
+            codes[start:start + block] = np.clip(np.rint(chunk), -127, 127)
+        return cls(kind, codes, scale, offset)
+
+    def scores(self, query_vec: np.ndarray, ids: np.ndarray | None = None, block: int = 256) -> np.ndarray:
+        """Approximate dot products for all rows (ids=None) or the given rows.
+        Works in small blocks so the float32 upcast stays in cache."""
+        n = len(self.codes) if ids is None else len(ids)
+        if self.kind == "int8":
+            weights, bias = query_vec * self.scale, float(query_vec @ self.offset)
+        else:
+            weights, bias = query_vec, 0.0
+        out = np.empty(n, dtype=np.float32)
+        for start in range(0, n, block):
+            part = self.codes[start:start + block] if ids is None else self.codes[ids[start:start + block]]
+            out[start:start + block] = part.astype(np.float32) @ weights + bias
+        return out
+
+
+def write_quantized(base: str, kind: str) -> QuantizedMatrix:
+    """Quantizes the store's matrix into <base>.i8 / <base>.f16 (+ .npz with scale, offset, checksum)."""
+    matrix, _, header = load_store(base)
+    quantized = QuantizedMatrix.from_matrix(kind, matrix)
+    path = base + QUANTIZED_SUFFIXES[kind]
+    quantized.codes.tofile(path + ".tmp")
+    os.replace(path + ".tmp", path)
+    np.savez(path + ".tmp.npz", store_sha256=np.array(header["sha256"]),
+             scale=quantized.scale if quantized.scale is not None else np.empty(0, np.float32),
+             offset=quantized.offset if quantized.offset is not None else np.empty(0, np.float32))
+    os.replace(path + ".tmp.npz", path + ".npz")
+    return quantized
+
+
+def load_quantized(base: str, kind: str) -> QuantizedMatrix | None:
+    """Memory-maps the quantized copy; None if it is missing or was built from other data."""
+    path = base + QUANTIZED_SUFFIXES[kind]
+    if not (os.path.exists(path) and os.path.exists(path + ".npz")):
+        return None
+    header = read_header(base)
+    with np.load(path + ".npz", allow_pickle=False) as meta:
+        if str(meta["store_sha256"]) != header["sha256"]:
+            print(f"Hoiatus: {path} on ehitatud teiste embeddingute pealt, kasutan float32 maatriksit.")
+            return None
+        scale = meta["scale"] if meta["scale"].size else None
+        offset = meta["offset"] if meta["offset"].size else None
+    codes = np.memmap(path, dtype=QUANTIZED_DTYPES[kind], mode="r", shape=(header["rows"], header["dim"]))
+    return QuantizedMatrix(kind, codes, scale, offset)
+
+
+def convert_pickle(pickle_path: str, base: str) -> dict:
+    """Converts the legacy DataFrame pickle (unique_ID, embedding) into a store."""
+    matrix, unique_ids = build_embedding_matrix(pd.read_pickle(pickle_path))
+    return write_store(base, matrix, unique_ids)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_convert = sub.add_parser("convert", help="Teisenda pickle embedding-hoidlaks")
+    p_convert.add_argument("pickle_path")
+    p_convert.add_argument("base")
+    p_verify = sub.add_parser("verify", help="Kontrolli hoidla kontrollsummasid")
+    p_verify.add_argument("base")
+    p_quantize = sub.add_parser("quantize", help="Loo kvantiseeritud koopia esimese otsingukäigu jaoks")
+    p_quantize.add_argument("base")
+    p_quantize.add_argument("--kind", choices=sorted(QUANTIZED_SUFFIXES), default="int8")
+    args = parser.parse_args()
+
+    if args.command == "convert":
+        header = convert_pickle(args.pickle_path, args.base)
+        print(f"Salvestatud {header['rows']:,} × {header['dim']} ({header['dtype']}) → {args.base}{MATRIX_SUFFIX}")
+    elif args.command == "verify":
+        ok = verify_store(args.base)
+        print("Kontrollsummad klapivad." if ok else "Kontrollsummad EI klapi!")
+        raise SystemExit(0 if ok else 1)
+    elif args.command == "quantize":
+        quantized = write_quantized(args.base, args.kind)
+        print(f"Salvestatud {args.kind} koopia ({quantized.codes.nbytes / 2**20:.1f} MiB) → "
+              f"{args.base}{QUANTIZED_SUFFIXES[args.kind]}")
+
+
+if __name__ == "__main__":
+    main()
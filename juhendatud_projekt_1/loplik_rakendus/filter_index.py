@@ -0,0 +1,68 @@
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from config import EAP_DEFAULT, FILTER_CACHE_SIZE, FILTER_NONE
+
+EQUALITY_COLUMNS = ("semester",)
+SUBSTRING_COLUMNS = ("keel", "oppeaste", "veebiope", "linn")
+
+
+class FilterIndex:
+    """Inverted index over the sidebar filter columns, built once at load time.
+
+    Every distinct value of a filter column gets a packed bitmap of the rows
+    holding it. A filter value resolves to the OR of the bitmaps of all distinct
+    values that contain it, which is exactly the substring test build_filter_mask
+    does per row, so results stay identical. EAP ranges use searchsorted on a
+    sorted copy of the column. Resolved filter tuples are kept in a small LRU.
+    """
+
+    def __init__(self, meta: pd.DataFrame, cache_size: int = FILTER_CACHE_SIZE):
+        self.n_rows = len(meta)
+        self._all = np.packbits(np.ones(self.n_rows, dtype=bool))
+        self._bitmaps = {}
+        for col in EQUALITY_COLUMNS + SUBSTRING_COLUMNS:
+            codes, uniques = pd.factorize(meta[col])
+            self._bitmaps[col] = [(str(value), np.packbits(codes == i)) for i, value in enumerate(uniques)]
+
+        eap = pd.to_numeric(meta["eap"], errors="coerce").to_numpy(dtype=float)
+        self._eap_order = np.argsort(eap, kind="stable")  # NaN sorts last and never matches
+        self._eap_sorted = eap[self._eap_order]
+        self.rows_for = lru_cache(maxsize=cache_size)(self._rows_for)
+
+    def _value_bits(self, col: str, val: str) -> np.ndarray:
+        if col in EQUALITY_COLUMNS:
+            matches = [bits for value, bits in self._bitmaps[col] if value == val]
+        else:
+            matches = [bits for value, bits in self._bitmaps[col] if val in value]
+        if not matches:
+            return np.zeros_like(self._all)
+        return np.bitwise_or.reduce(matches) if len(matches) > 1 else matches[0]
+
+    def _eap_bits(self, low, high) -> np.ndarray:
+        start = np.searchsorted(self._eap_sorted, low, side="left")
+        stop = np.searchsorted(self._eap_sorted, high, side="right")
+        selected = np.zeros(self.n_rows, dtype=bool)
+        selected[self._eap_order[start:stop]] = True
+        return np.packbits(selected)
+
+    def _rows_for(self, filters: tuple) -> np.ndarray:
+        filter_semester, filter_keel, filter_oppeaste, filter_veebiope, filter_linn, filter_eap = filters
+        bits = self._all
+        for col, val in (
+            ("semester", filter_semester),
+            ("keel", filter_keel),
+            ("oppeaste", filter_oppeaste),
+            ("veebiope", filter_veebiope),
+            ("linn", filter_linn),
+        ):
+            if val != FILTER_NONE:
+                bits = bits & self._value_bits(col, val)
+        if tuple(filter_eap) != EAP_DEFAULT:
+            bits = bits & self._eap_bits(*filter_eap)
+
+        rows = np.flatnonzero(np.unpackbits(bits, count=self.n_rows))
+        rows.flags.writeable = False  # shared through the LRU
+        return rows
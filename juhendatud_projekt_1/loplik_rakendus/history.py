@@ -0,0 +1,70 @@
+import re
+
+from config import CHAT_TOKEN_BUDGET, HISTORY_KEEP_TURNS
+from tokens import count_tokens
+
+BOLD_RE = re.compile(r"\*\*(.+?)\*\*")
+SUMMARY_QUESTION_CHARS = 200
+
+
+def split_turns(messages: list[dict]) -> list[list[dict]]:
+    """Groups chat messages into turns, each starting at a user message."""
+    turns = []
+    for m in messages:
+        if m["role"] == "user" or not turns:
+            turns.append([])
+        turns[-1].append({"role": m["role"], "content": m["content"]})
+    return turns
+
+
+def summarize_turn(turn: list[dict]) -> str:
+    """One line for an old turn: the question, shortened, and the courses the answer named
+    (answers list each course as **name**). Extractive, so it costs no LLM call."""
+    question = " ".join(m["content"] for m in turn if m["role"] == "user")
+    question = " ".join(question.split())[:SUMMARY_QUESTION_CHARS]
+    named = dict.fromkeys(name for m in turn if m["role"] == "assistant" for name in BOLD_RE.findall(m["content"]))
+    return f"- Küsimus: {question}" + (f" → soovitati: {', '.join(named)}" if named else "")
+
+
+def fit_history(system_prompt: dict, messages: list[dict], budget: int = CHAT_TOKEN_BUDGET,
+                keep_turns: int = HISTORY_KEEP_TURNS):
+    """Messages to send for the chat so far, kept under *budget* tokens (counted locally).
+
+    The last *keep_turns* turns go verbatim; older ones become one summary line each,
+    appended to the system prompt. If that is still over budget, summary lines and
+    then the oldest verbatim turns are dropped; the current question is always sent.
+    Returns (messages_to_send, info) with token counts for the usage caption.
+    """
+    turns = split_turns(messages)
+    full_tokens = count_tokens(system_prompt["content"]) + sum(
+        count_tokens(m["content"]) for turn in turns for m in turn
+    )
+    keep = max(1, keep_turns)
+    recent, older = turns[-keep:], turns[:-keep]
+    summary = [summarize_turn(turn) for turn in older]
+
+    def system_content():
+        if not summary:
+            return system_prompt["content"]
+        return system_prompt["content"] + "\n\nVARASEM VESTLUS (kokkuvõte):\n" + "\n".join(summary)
+
+    def total():
+        return count_tokens(system_content()) + sum(count_tokens(m["content"]) for turn in recent for m in turn)
+
+    dropped = 0
+    while total() > budget and summary:
+        summary.pop(0)
+        dropped += 1
+    while total() > budget and len(recent) > 1:
+        recent.pop(0)
+        dropped += 1
+
+    sent = [{**system_prompt, "content": system_content()}] + [m for turn in recent for m in turn]
+    sent_tokens = total()
+    return sent, {
+        "full_tokens": full_tokens,
+        "sent_tokens": sent_tokens,
+        "saved_tokens": max(0, full_tokens - sent_tokens),
+        "turns_summarised": len(summary),
+        "turns_dropped": dropped,
+    }
@@ -0,0 +1,94 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+from config import LEXICAL_FIELDS, RRF_K
+
+TOKEN_RE = re.compile(r"\w+")
+COURSE_CODE_RE = re.compile(r"[A-ZÕÄÖÜ]{2,8}\.\d{2}\.\d{3}", re.IGNORECASE)
+QUERY_PUNCTUATION = "?!.,;:\"'«»“”„"
+
+
+def tokenize(text) -> list[str]:
+    return TOKEN_RE.findall(str(text).casefold())
+
+
+def _exact_key(text) -> str:
+    return " ".join(str(text).split()).strip(QUERY_PUNCTUATION).strip().casefold()
+
+
+class LexicalIndex:
+    """BM25 over the code, name and description fields, plus an exact code/name hash map.
+
+    Postings are stored in CSR layout (term -> slice of row ids and precomputed
+    BM25 weights), so scoring a query is one vectorised add per query term.
+    """
+
+    def __init__(self, meta: pd.DataFrame, fields=LEXICAL_FIELDS, k1: float = 1.2, b: float = 0.75):
+        self.n_rows = len(meta)
+        fields = [f for f in fields if f in meta.columns]
+        texts = meta[fields].fillna("").astype(str).agg(" ".join, axis=1) if fields else pd.Series("", index=meta.index)
+
+        vocab, term_ids, doc_ids, tfs, doc_len = {}, [], [], [], np.zeros(self.n_rows, dtype=np.float32)
+        for row, text in enumerate(texts):
+            tokens = tokenize(text)
+            doc_len[row] = len(tokens)
+            ids = np.array([vocab.setdefault(t, len(vocab)) for t in tokens], dtype=np.int64)
+            uniq, counts = np.unique(ids, return_counts=True)
+            term_ids.append(uniq)
+            doc_ids.append(np.full(len(uniq), row, dtype=np.int32))
+            tfs.append(counts)
+        term_ids = np.concatenate(term_ids) if term_ids else np.empty(0, dtype=np.int64)
+        doc_ids = np.concatenate(doc_ids) if doc_ids else np.empty(0, dtype=np.int32)
+        tfs = np.concatenate(tfs).astype(np.float32) if tfs else np.empty(0, dtype=np.float32)
+
+        order = np.argsort(term_ids, kind="stable")
+        self.vocab = vocab
+        self.postings_rows = doc_ids[order]
+        self.indptr = np.concatenate([[0], np.cumsum(np.bincount(term_ids, minlength=len(vocab)))])
+        df = np.diff(self.indptr).astype(np.float32)
+        idf = np.log1p((self.n_rows - df + 0.5) / (df + 0.5))
+        avg_len = doc_len.mean() if self.n_rows else 1.0
+        tf = tfs[order]
+        norm = k1 * (1 - b + b * doc_len[self.postings_rows] / max(avg_len, 1e-9))
+        self.postings_weights = (np.repeat(idf, np.diff(self.indptr)) * tf * (k1 + 1) / (tf + norm)).astype(np.float32)
+
+        self.exact = {}
+        for col in ("aine_kood", "unique_ID", "nimi_et", "nimi_en"):
+            if col in meta.columns:
+                for row, value in enumerate(meta[col]):
+                    if pd.notna(value):
+                        self.exact.setdefault(_exact_key(value), {})[row] = None
+        self.exact = {key: np.fromiter(rows, dtype=np.int64) for key, rows in self.exact.items()}
+
+    def exact_match(self, query: str) -> np.ndarray | None:
+        """Rows whose course code, unique_ID or full name is the whole query."""
+        return self.exact.get(_exact_key(query))
+
+    def mentioned(self, query: str) -> np.ndarray:
+        """Rows of the course codes that appear inside a longer query, in order of mention."""
+        hits = [self.exact.get(_exact_key(code)) for code in COURSE_CODE_RE.findall(query)]
+        hits = [hit for hit in hits if hit is not None]
+        return pd.unique(np.concatenate(hits)) if hits else np.empty(0, dtype=np.int64)
+
+    def scores(self, query: str) -> np.ndarray:
+        """BM25 score of every row for *query*."""
+        scores = np.zeros(self.n_rows, dtype=np.float32)
+        for term in set(tokenize(query)):
+            term_id = self.vocab.get(term)
+            if term_id is not None:
+                start, stop = self.indptr[term_id], self.indptr[term_id + 1]
+                scores[self.postings_rows[start:stop]] += self.postings_weights[start:stop]
+        return scores
+
+
+def reciprocal_rank_fusion(rankings: list[np.ndarray], k: int, rrf_k: int = RRF_K):
+    """Fuses best-first row rankings. Returns (rows, fused_scores) for the top k, best first."""
+    candidates = np.unique(np.concatenate(rankings)) if rankings else np.empty(0, dtype=np.int64)
+    fused = np.zeros(len(candidates), dtype=np.float64)
+    for ranking in rankings:
+        positions = np.searchsorted(candidates, ranking)
+        fused[positions] += 1.0 / (rrf_k + 1 + np.arange(len(ranking)))
+    top = np.argsort(-fused, kind="stable")[:k]
+    return candidates[top], fused[top]
@@ -1,13 +1,27 @@
+import re
+import time
+
 import streamlit as st
 
-from config import MODEL_NAME
+from compact_answer import CardStream, json_mode_requests
+from config import CONTEXT_ENCODER, STREAM_FLUSH_S
+from llm_dispatch import HedgedCompletion
+from tokens import count_tokens
 
 
 def build_system_prompt(context_text: str, course_names: list[str],
                         active_filters: str, total_count: int = 0,
-                        filtered_count: int = 0) -> dict:
-    """Builds the system-role message with RAG context."""
-    allowlist = "\n".join(f"- {name}" for name in course_names)
+                        filtered_count: int = 0, course_ids: list[str] | None = None,
+                        encoded_context: bool = CONTEXT_ENCODER) -> dict:
+    """Builds the system-role message with RAG context. With *course_ids* (unique_IDs in
+    context order) the model is asked for the compact JSON answer of compact_answer.py.
+    An *encoded_context* (context_encoder.py) names every course itself, so no separate list."""
+    if course_ids is not None:
+        return _compact_system_prompt(context_text, course_names, course_ids, encoded_context)
+    if encoded_context:
+        allowlist = f"(nummerdatud [1] kuni [{len(course_names)}] allolevates andmetes)"
+    else:
+        allowlist = "\n".join(f"- {name}" for name in course_names)
 
     if active_filters == "filtrid puuduvad":
         filter_info = "Kasutaja ei rakendanud ühtegi metaandmete filtrit."
@@ -44,20 +58,116 @@ def build_system_prompt(context_text: str, course_names: list[str],
     }
 
 
-def call_llm_stream(client, messages_to_send):
-    """Streams LLM response into a Streamlit placeholder. Returns (text, usage)."""
-    stream = client.chat.completions.create(
-        model=MODEL_NAME,
-        messages=messages_to_send,
-        stream=True,
-        stream_options={"include_usage": True},
-    )
-    placeholder = st.empty()
-    full_text, usage_data = "", None
-    for chunk in stream:
-        if chunk.choices and chunk.choices[0].delta.content:
-            full_text += chunk.choices[0].delta.content
-            placeholder.markdown(full_text)
-        if hasattr(chunk, "usage") and chunk.usage:
-            usage_data = chunk.usage
-    return full_text, usage_data
+def _compact_system_prompt(context_text: str, course_names: list[str], course_ids: list[str],
+                           encoded_context: bool) -> dict:
+    # Filters are left out: they only shape the wording of a free-text answer.
+    if encoded_context:
+        id_list = ""  # each encoded course starts with "[n] <ID>"
+    else:
+        allowlist = "\n".join(f"{i}. {uid} – {name}" for i, (uid, name) in enumerate(zip(course_ids, course_names), 1))
+        id_list = f"KURSUSTE ID-D (samas järjekorras nagu andmed):\n{allowlist}\n\n"
+    return {
+        "role": "system",
+        "content": (
+            "Oled Tartu Ülikooli kursuste nõustaja. Vali kursused, mis sobivad kliendi sooviga.\n\n"
+            f"{id_list}"
+            f"ANDMED:\n{context_text}\n\n"
+            "REEGLID:\n"
+            "1. Otsusta andmete põhjal rangelt, millised kursused PÄRISELT sobivad kliendi sooviga.\n"
+            '2. Vasta AINULT JSON-objektiga: {"kursused": [{"id": "<ID>", "sobivus": "<üks lause, miks see aine '
+            'päringuga sobib>"}]}\n'
+            "3. id peab olema täpselt ühe ülaltoodud kursuse ID; sobivamad eespool.\n"
+            '4. Kui ükski ei sobi, vasta {"kursused": []}.\n'
+            "5. Ära lisa JSON-i kõrvale muud teksti."
+        ),
+    }
+
+
+class StreamRenderer:
+    """Coalesces streamed text pieces into few placeholder updates.
+
+    Re-rendering the whole growing answer on every token makes streaming
+    quadratic in the answer length. Pieces are buffered in a list and flushed
+    every *flush_s* seconds or at a paragraph boundary, so a long answer costs
+    tens of renders instead of one per token.
+    """
+
+    def __init__(self, placeholder=None, flush_s: float = STREAM_FLUSH_S):
+        self.placeholder = placeholder if placeholder is not None else st.empty()
+        self.flush_s = flush_s
+        self.flushes = 0
+        self.first_piece_at = None
+        self._text = ""
+        self._pending = []
+        self._tail = ""  # last character added, so a "\n\n" split across two pieces is seen
+        self._last_flush = time.perf_counter()
+
+    def add(self, piece: str):
+        now = time.perf_counter()
+        if self.first_piece_at is None:
+            self.first_piece_at = now
+        self._pending.append(piece)
+        paragraph_end = "\n\n" in self._tail + piece
+        self._tail = (self._tail + piece)[-1:]
+        if now - self._last_flush >= self.flush_s or paragraph_end:
+            self.flush(now)
+
+    def flush(self, now: float | None = None):
+        if self._pending:
+            self._text += "".join(self._pending)
+            self._pending.clear()
+            self.placeholder.markdown(self._text)
+            self.flushes += 1
+        self._last_flush = now if now is not None else time.perf_counter()
+
+    def finish(self) -> str:
+        self.flush()
+        return self._text
+
+
+def render_stream(deltas, placeholder=None, start: float | None = None):
+    """Renders text pieces as they arrive. Returns (full_text, stream_stats): time to first
+    token and total stream time since *start* (default: now), and the local token rate."""
+    start = time.perf_counter() if start is None else start
+    renderer = StreamRenderer(placeholder)
+    for delta in deltas:
+        renderer.add(delta)
+    full_text = renderer.finish()
+    end = time.perf_counter()
+    stats = {"stream_s": round(end - start, 3), "flushes": renderer.flushes}
+    if renderer.first_piece_at is not None:
+        stats["ttft_s"] = round(renderer.first_piece_at - start, 3)
+        stats["generating_s"] = end - renderer.first_piece_at
+        stats["tokens_per_s"] = _rate(count_tokens(full_text), stats["generating_s"])
+    return full_text, stats
+
+
+def _rate(tokens: int, seconds: float):
+    return round(tokens / seconds, 1) if seconds > 0 else None
+
+
+def call_llm_stream(client, messages_to_send, cards: CardStream | None = None):
+    """Streams LLM response into a Streamlit placeholder. Returns (text, usage, stream_stats);
+    the request goes through the hedged dispatch over LLM_MODELS. With *cards* the model is
+    asked for JSON and the course cards built from it are streamed instead of its text."""
+    start = time.perf_counter()
+    if cards is None:
+        completion = HedgedCompletion(client, messages_to_send)
+        deltas = completion.deltas()
+    else:
+        completion = HedgedCompletion(client, messages_to_send, model_request=json_mode_requests())
+        deltas = cards(completion.deltas())
+
+    # Timed from before the request, so connecting and prompt processing count towards TTFT.
+    full_text, stats = render_stream(deltas, start=start)
+    generating_s = stats.pop("generating_s", 0)
+    usage_data = completion.usage
+    if getattr(usage_data, "completion_tokens", None):
+        stats["tokens_per_s"] = _rate(usage_data.completion_tokens, generating_s)
+    stats.update(completion.info())
+    return full_text, usage_data, stats
+
+
+def replay_cached(text: str) -> str:
+    """Shows a cached answer through the same renderer a live stream uses."""
+    return render_stream(re.findall(r"\S+\s*|\s+", text))[0]
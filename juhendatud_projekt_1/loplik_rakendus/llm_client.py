@@ -0,0 +1,176 @@
+"""Process-wide OpenAI-compatible clients, one per API key and base URL.
+
+Streamlit reruns the script on every interaction; building a new OpenAI
+client each time also built a new connection pool, so every request paid TCP
+and TLS setup again. get_client returns the same client for the same key, so
+its keep-alive pool is reused across reruns and sessions.
+
+Retries are the SDK's own: 408/409/429/5xx and connection errors are retried
+LLM_MAX_RETRIES times with jittered exponential backoff, honouring
+Retry-After. A process-wide semaphore bounds the requests in flight, so a
+burst of users (or a test run) queues here instead of tripping rate limits;
+a request that finds no free slot within LLM_QUEUE_TIMEOUT_S fails instead
+of hanging the script thread.
+"""
+import hashlib
+import socket
+import threading
+import types
+
+from config import (
+    LLM_BASE_URL,
+    LLM_KEEPALIVE_S,
+    LLM_MAX_CONCURRENCY,
+    LLM_MAX_RETRIES,
+    LLM_QUEUE_TIMEOUT_S,
+    LLM_TIMEOUT_S,
+)
+
+_clients = {}
+_clients_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(LLM_MAX_CONCURRENCY)
+_stats = {"requests": 0, "queued": 0, "in_flight": 0, "unwoken_aborts": 0}
+_stats_lock = threading.Lock()
+
+
+def _http_client():
+    """Keep-alive pool sized to the concurrency limit; None = the SDK's default pool."""
+    try:
+        import httpx
+        from openai import DefaultHttpxClient
+    except ImportError:
+        return None
+    return DefaultHttpxClient(limits=httpx.Limits(
+        max_connections=LLM_MAX_CONCURRENCY,
+        max_keepalive_connections=LLM_MAX_CONCURRENCY,
+        keepalive_expiry=LLM_KEEPALIVE_S,
+    ))
+
+
+class PooledClient:
+    """Wraps an OpenAI client; chat.completions.create takes a concurrency slot first.
+    A streamed response keeps its slot until the stream is consumed or closed."""
+
+    def __init__(self, client):
+        self.client = client
+        self.chat = types.SimpleNamespace(completions=types.SimpleNamespace(create=self._create))
+
+    def _create(self, **kwargs):
+        if not _slots.acquire(blocking=False):
+            _count("queued")
+            if not _slots.acquire(timeout=LLM_QUEUE_TIMEOUT_S):
+                raise TimeoutError(f"Kõik {LLM_MAX_CONCURRENCY} LLM-i päringukohta on olnud "
+                                   f"{LLM_QUEUE_TIMEOUT_S:.0f} s hõivatud, proovi hiljem uuesti.")
+        _count("requests")
+        _count("in_flight")
+        try:
+            response = self.client.chat.completions.create(**kwargs)
+        except BaseException:
+            _release()
+            raise
+        if not kwargs.get("stream"):
+            _release()
+            return response
+        return PooledStream(response)
+
+
+def _count(key: str, step: int = 1):
+    with _stats_lock:
+        _stats[key] += step
+
+
+def _release():
+    _count("in_flight", -1)
+    _slots.release()
+
+
+def _shutdown_socket(stream) -> bool:
+    """Wakes a reader blocked in recv() on *stream*'s connection, which close() alone does
+    not do. Needs the socket from httpx's "network_stream" response extension; returns
+    False when the transport does not expose it."""
+    extensions = getattr(getattr(stream, "response", None), "extensions", None)
+    network = extensions.get("network_stream") if isinstance(extensions, dict) else None
+    get_extra_info = getattr(network, "get_extra_info", None)
+    sock = get_extra_info("socket") if callable(get_extra_info) else None
+    if not isinstance(sock, socket.socket):
+        return False
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass  # already closed
+    return True
+
+
+def abort_stream(stream):
+    """Closes a streamed response from any thread, also while another thread waits for its
+    next chunk. The SDK's public close() releases the response; without a socket to shut
+    down, a reader blocked on it only returns with the next chunk or LLM_TIMEOUT_S, and
+    HedgedCompletion's deadline keeps the answer from waiting for it."""
+    if not _shutdown_socket(stream):
+        _count("unwoken_aborts")
+    if hasattr(stream, "close"):
+        stream.close()
+    elif hasattr(getattr(stream, "response", None), "close"):
+        stream.response.close()
+
+
+class PooledStream:
+    """A streamed response holding a concurrency slot. The slot is released exactly once:
+    when the stream ends, on close() or when the object is garbage-collected, whether
+    or not iteration ever started."""
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._finished = False
+        self._released = False
+        self._lock = threading.Lock()
+
+    @property
+    def response(self):
+        return getattr(self._stream, "response", None)
+
+    def __iter__(self):
+        try:
+            yield from self._stream
+            self._finished = True
+        finally:
+            self.close()
+
+    def close(self):
+        with self._lock:
+            if self._released:
+                return
+            self._released = True
+        try:
+            if self._finished:
+                if hasattr(self._stream, "close"):
+                    self._stream.close()
+            else:
+                # Stopped early, possibly from another thread: don't wait for the next chunk.
+                abort_stream(self._stream)
+        finally:
+            _release()
+
+    def __del__(self):
+        self.close()
+
+
+def get_client(api_key: str, base_url: str = LLM_BASE_URL) -> PooledClient:
+    from openai import OpenAI  # imported only once there is a key to use it with
+
+    key = (hashlib.sha256(api_key.encode("utf-8")).hexdigest(), base_url)
+    with _clients_lock:
+        if key not in _clients:
+            _clients[key] = PooledClient(OpenAI(
+                base_url=base_url,
+                api_key=api_key,
+                max_retries=LLM_MAX_RETRIES,
+                timeout=LLM_TIMEOUT_S,
+                http_client=_http_client(),
+            ))
+        return _clients[key]
+
+
+def stats_snapshot() -> dict:
+    with _stats_lock:
+        return dict(_stats)
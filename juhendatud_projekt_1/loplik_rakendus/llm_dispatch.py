@@ -0,0 +1,255 @@
+"""Hedged, model-ordered dispatch of streamed chat completions.
+
+A request goes to the first model of LLM_MODELS. If no token has arrived
+when that model's deadline passes, the same request is also sent to the next
+model; whichever streams first is kept and the others are cancelled. A model
+that fails before its first token hands over to the next one at once.
+
+The deadline of a model is the 95th percentile of its recent times to first
+token (HEDGE_DEADLINE_S until HEDGE_MIN_SAMPLES are recorded), so only the
+slowest ~5% of requests pay for a second call. An attempt cancelled after
+its deadline still counts, with its time so far as a lower bound; without
+those samples a stalling model would only ever record its fast requests.
+
+The whole request, hedges included, has one deadline (LLM_DEADLINE_S): past
+it every attempt is cancelled and TimeoutError is raised, also when the last
+model is still waiting for its first token.
+"""
+import queue
+import threading
+import time
+from collections import deque
+
+from config import (
+    HEDGE_DEADLINE_MAX_S,
+    HEDGE_DEADLINE_MIN_S,
+    HEDGE_DEADLINE_S,
+    HEDGE_MIN_SAMPLES,
+    HEDGE_WINDOW,
+    LLM_DEADLINE_S,
+    LLM_MODELS,
+)
+
+class ModelLatency:
+    """Per-model TTFT samples and counters; process-wide, shared by every session."""
+
+    def __init__(self, window: int = HEDGE_WINDOW, min_samples: int = HEDGE_MIN_SAMPLES,
+                 default_s: float = HEDGE_DEADLINE_S, min_s: float = HEDGE_DEADLINE_MIN_S,
+                 max_s: float = HEDGE_DEADLINE_MAX_S):
+        self.window = window
+        self.min_samples = min_samples
+        self.default_s = default_s
+        self.min_s = min_s
+        self.max_s = max_s
+        self._samples = {}
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def record(self, model: str, ttft_s: float):
+        with self._lock:
+            self._samples.setdefault(model, deque(maxlen=self.window)).append(ttft_s)
+
+    def count(self, model: str, key: str):
+        with self._lock:
+            counts = self._counts.setdefault(
+                model, {"requests": 0, "wins": 0, "hedged": 0, "cancelled": 0, "errors": 0})
+            counts[key] += 1
+
+    def p95(self, model: str) -> float | None:
+        with self._lock:
+            samples = sorted(self._samples.get(model, ()))
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(0.95 * len(samples)))]
+
+    def deadline(self, model: str) -> float:
+        """Seconds to wait for *model*'s first token before hedging."""
+        with self._lock:
+            n = len(self._samples.get(model, ()))
+        if n < self.min_samples:
+            return self.default_s
+        return min(self.max_s, max(self.min_s, self.p95(model)))
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            models = list(dict.fromkeys([*self._counts, *self._samples]))
+            counts = {m: dict(self._counts.get(m, {})) for m in models}
+            samples = {m: len(self._samples.get(m, ())) for m in models}
+        return {m: {**counts[m], "samples": samples[m], "p95_s": self.p95(m), "deadline_s": self.deadline(m)}
+                for m in models}
+
+
+model_latency = ModelLatency()
+
+
+class _Attempt:
+    """One streamed request on a worker thread, reporting (attempt, kind, value) events.
+    cancel() closes the stream from the calling thread (llm_client.PooledStream.close
+    aborts an unfinished one), so an attempt stalled before its first token gives back
+    its connection and concurrency slot at once; one cancelled while create() still
+    waits for response headers is closed as soon as they arrive."""
+
+    def __init__(self, client, model: str, messages: list[dict], events: queue.Queue, request: dict):
+        self.model = model
+        self.started = time.perf_counter()
+        self._cancelled = threading.Event()
+        self._events = events
+        self._stream = None
+        threading.Thread(target=self._run, args=(client, messages, request), daemon=True).start()
+
+    def cancel(self):
+        self._cancelled.set()
+        self._abort(self._stream)
+
+    @staticmethod
+    def _abort(stream):
+        if stream is None:
+            return
+        try:
+            stream.close()
+        except Exception:
+            pass  # best effort; the worker still stops at its next chunk
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def _run(self, client, messages, request):
+        stream = None
+        try:
+            stream = client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                stream=True,
+                stream_options={"include_usage": True},
+                **request,
+            )
+            self._stream = stream
+            if self.cancelled:
+                # cancel() ran before the stream existed.
+                self._abort(stream)
+                return
+            for chunk in stream:
+                if self.cancelled:
+                    break
+                if chunk.choices and chunk.choices[0].delta.content:
+                    self._events.put((self, "delta", chunk.choices[0].delta.content))
+                if getattr(chunk, "usage", None):
+                    self._events.put((self, "usage", chunk.usage))
+            self._events.put((self, "done", None))
+        except Exception as e:
+            self._events.put((self, "error", e))
+        finally:
+            if stream is not None and hasattr(stream, "close"):
+                stream.close()
+
+
+class HedgedCompletion:
+    """Iterate deltas() for the answer's text pieces; afterwards .usage, .model and
+    info() describe the request that won. Extra keyword arguments go into every request,
+    *model_request* ({model: options}) only into the requests to that model. deltas()
+    raises TimeoutError once *deadline_s* has passed since the first request."""
+
+    def __init__(self, client, messages: list[dict], models: list[str] | None = None,
+                 latency: ModelLatency = model_latency, model_request: dict | None = None,
+                 deadline_s: float = LLM_DEADLINE_S, **request):
+        self.client = client
+        self.deadline_s = deadline_s
+        self.messages = messages
+        self.request = request
+        self.model_request = model_request or {}
+        self.models = list(models or LLM_MODELS)
+        self.latency = latency
+        self.usage = None
+        self.model = None
+        self.attempts = []
+        self.hedges = 0
+
+    def deltas(self):
+        events = queue.Queue()
+        pending = list(self.models)
+        failed = set()
+        last_error = None
+        winner = None
+
+        def launch():
+            model = pending.pop(0)
+            self.latency.count(model, "requests")
+            request = {**self.request, **self.model_request.get(model, {})}
+            self.attempts.append(_Attempt(self.client, model, self.messages, events, request))
+
+        end_by = time.perf_counter() + self.deadline_s
+        launch()
+        try:
+            while True:
+                now = time.perf_counter()
+                if now >= end_by:
+                    if winner is None:
+                        self._cancel_losers(None, failed, now)
+                    raise TimeoutError(f"Keelemudel ei vastanud {self.deadline_s:.0f} s jooksul, proovi uuesti.")
+                timeout = end_by - now
+                if winner is None and pending:
+                    newest = self.attempts[-1]
+                    timeout = min(timeout, max(0.0, newest.started + self.latency.deadline(newest.model) - now))
+                try:
+                    attempt, kind, value = events.get(timeout=timeout)
+                except queue.Empty:
+                    if winner is None and pending and time.perf_counter() < end_by:
+                        self.hedges += 1
+                        self.latency.count(self.attempts[-1].model, "hedged")
+                        launch()
+                    continue
+                if attempt.cancelled:
+                    continue
+
+                if kind == "error":
+                    if attempt is winner:
+                        raise value
+                    self.latency.count(attempt.model, "errors")
+                    failed.add(attempt)
+                    last_error = value
+                    if all(a in failed for a in self.attempts):
+                        if not pending:
+                            raise last_error
+                        launch()
+                    continue
+
+                if winner is None:
+                    winner = attempt
+                    self.model = attempt.model
+                    self.latency.count(attempt.model, "wins")
+                    if kind == "delta":
+                        self.latency.record(attempt.model, time.perf_counter() - attempt.started)
+                    self._cancel_losers(attempt, failed, time.perf_counter())
+                if kind == "delta":
+                    yield value
+                elif kind == "usage":
+                    self.usage = value
+                elif kind == "done":
+                    return
+        finally:
+            # Also when the reader stops early.
+            for attempt in self.attempts:
+                attempt.cancel()
+
+    def _cancel_losers(self, winner, failed: set, now: float):
+        """Cancels every live attempt but *winner*; one that waited past its deadline leaves
+        that wait as a (censored) TTFT sample."""
+        for other in self.attempts:
+            if other is not winner and other not in failed:
+                other.cancel()
+                self.latency.count(other.model, "cancelled")
+                waited = now - other.started
+                if waited >= self.latency.deadline(other.model):
+                    self.latency.record(other.model, waited)
+
+    def info(self) -> dict:
+        return {"model": self.model, "attempts": len(self.attempts), "hedged": self.hedges}
+
+
+def complete(client, messages: list[dict], models: list[str] | None = None,
+             model_request: dict | None = None, **request):
+    """Whole answer through the hedged dispatch. Returns (text, usage, info)."""
+    completion = HedgedCompletion(client, messages, models, model_request=model_request, **request)
+    text = "".join(completion.deltas())
+    return text, completion.usage, completion.info()
@@ -0,0 +1,226 @@
+"""Local OpenAI-compatible chat completions endpoint for offline runs and benchmarks.
+
+    python mock_llm_server.py [--port 8766] [--ttft-ms 400] [--tokens-per-s 60] [--fail-rate 0.05]
+                              [--stall-rate 0.1] [--stall-ms 8000] [--stall-model google/gemma-3-27b-it]
+
+then start the app with LLM_BASE_URL=http://127.0.0.1:8766/v1 and any API key.
+The answer recommends the first courses of the system prompt's context in the
+format build_system_prompt asks for (JSON picks when the request sets
+response_format or the prompt asks for JSON), so the chat and the test suite
+run end to end. --ttft-ms delays the first token, --tokens-per-s paces the
+rest, and with --fail-rate a share of requests gets 429 or 503, which
+exercises the client's retries. --stall-rate makes a share of requests (only
+for --stall-model, if given) wait --stall-ms longer for the first token,
+which exercises hedging.
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from tokens import count_tokens
+
+CONTEXT_COURSE_RE = re.compile(
+    r"^\d+\. (.+?) \(.*?\)\n\s+Kood: (\S+)\n"
+    r"\s+EAP: (.*?) \| Semester: (.*?) \| Keel: (.*?) \| Õppeviis: (.*?)\n"
+    r".*\n\s+Kirjeldus: ([^.\n]*\.?)",
+    re.MULTILINE,
+)
+COMPACT_ID_RE = re.compile(r"^\d+\. (\S+) – ", re.MULTILINE)
+ENCODED_HEADER_RE = re.compile(r"^\[\d+\] (\S+) (.+?)(?: \([^()]*\))?$")
+ENCODED_KEYS = {"K": "code", "E": "eap", "S": "semester", "L": "keel", "V": "mode"}
+MOCK_REASON = "Kursuse sisu vastab päringu teemale."
+
+
+def encoded_courses(system: str) -> list[dict]:
+    """Courses of a context_encoder.py context: "[n] ID name" blocks, a " · "-separated
+    field line and "- " sentence lines, plus the fields shared by all of them."""
+    shared, courses = {}, []
+
+    def fields(line: str) -> dict:
+        pairs = (part.split(" ", 1) for part in line.split(" · ") if " " in part)
+        return {ENCODED_KEYS[key]: value for key, value in pairs if key in ENCODED_KEYS}
+
+    for line in system.splitlines():
+        header = ENCODED_HEADER_RE.match(line)
+        if line.startswith("Kõigil kursustel: "):
+            shared = fields(line.removeprefix("Kõigil kursustel: "))
+        elif header:
+            courses.append({"id": header.group(1), "code": header.group(1), "name": header.group(2), "summary": ""})
+        elif courses and line.startswith("- "):
+            courses[-1]["summary"] = courses[-1]["summary"] or line[2:]
+        elif courses and line:
+            courses[-1].update(fields(line))
+    return [{"eap": "?", "semester": "?", "keel": "?", "mode": "?", **shared, **c} for c in courses]
+
+
+def mock_answer(messages: list[dict], json_mode: bool = False, max_courses: int = 3) -> str:
+    system = next((m["content"] for m in messages if m["role"] == "system"), "")
+    encoded = encoded_courses(system)
+    if json_mode:
+        ids = [c["id"] for c in encoded] or COMPACT_ID_RE.findall(system)
+        return json.dumps({"kursused": [{"id": uid, "sobivus": MOCK_REASON} for uid in ids[:max_courses]]},
+                          ensure_ascii=False)
+    courses = [(c["name"], c["code"], c["eap"], c["semester"], c["keel"], c["mode"], c["summary"]) for c in encoded]
+    courses = (courses or CONTEXT_COURSE_RE.findall(system))[:max_courses]
+    if not courses:
+        return "Sobivaid kursuseid ei leidu."
+    return "\n\n".join(
+        f"- **{name}**\n"
+        f"  - Aine kood: {code}\n"
+        f"  - ÕIS link: https://ois2.ut.ee/#/courses/{code}\n"
+        f"  - EAP: {eap} | Keel: {keel} | Õppeviis: {mode} | Semester: {semester}\n"
+        f"  - {summary.strip()}\n"
+        f"  - Sobivus: {MOCK_REASON}"
+        for name, code, eap, semester, keel, mode, summary in courses
+    )
+
+
+def split_tokens(text: str) -> list[str]:
+    return re.findall(r"\S+\s*|\s+", text)
+
+
+def make_handler(ttft_s: float, tokens_per_s: float, fail_rate: float, stats: dict,
+                 stall_rate: float = 0.0, stall_s: float = 0.0, stall_models: tuple = ()):
+    class CompletionsHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, so client connection pooling is visible
+
+        def setup(self):
+            super().setup()
+            stats["connections"] += 1
+
+        def handle(self):
+            try:
+                super().handle()
+            except ConnectionResetError:
+                pass  # the client dropped an idle keep-alive connection
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            request = json.loads(self.rfile.read(length) or b"{}")
+            stats["requests"] += 1
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self._send_json(404, {"error": {"message": "not found"}})
+                return
+            if fail_rate and random.random() < fail_rate:
+                stats["failures"] += 1
+                status = random.choice((429, 503))
+                self._send_json(status, {"error": {"message": "mock failure"}}, {"Retry-After": "0"})
+                return
+
+            messages = request.get("messages", [])
+            # Like a real model, also answers in JSON when only the prompt asks for it.
+            json_mode = (request.get("response_format") or {}).get("type") in ("json_object", "json_schema") \
+                or any("Vasta AINULT JSON-objektiga" in m.get("content", "") for m in messages[:1])
+            answer = mock_answer(messages, json_mode)
+            usage = {
+                "prompt_tokens": sum(count_tokens(m.get("content", "")) for m in messages),
+                "completion_tokens": count_tokens(answer),
+            }
+            usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+            first_token_s = ttft_s
+            if stall_rate and (not stall_models or request.get("model") in stall_models) \
+                    and random.random() < stall_rate:
+                stats["stalls"] += 1
+                first_token_s += stall_s
+            if request.get("stream"):
+                try:
+                    self._stream(request, answer, usage, first_token_s)
+                except (BrokenPipeError, ConnectionResetError):
+                    stats["cancelled"] += 1  # the client closed the stream, e.g. a hedge it dropped
+                    self.close_connection = True
+            else:
+                time.sleep(first_token_s + len(split_tokens(answer)) / tokens_per_s)
+                self._send_json(200, {
+                    "id": f"chatcmpl-{uuid.uuid4().hex}", "object": "chat.completion", "created": int(time.time()),
+                    "model": request.get("model", "mock"),
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": answer}}],
+                    "usage": usage,
+                })
+
+        def _stream(self, request: dict, answer: str, usage: dict, first_token_s: float):
+            # Headers first, like a real provider: a slow model stalls the body, not the request.
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            self.wfile.flush()
+            time.sleep(first_token_s)
+            base = {"id": f"chatcmpl-{uuid.uuid4().hex}", "object": "chat.completion.chunk",
+                    "created": int(time.time()), "model": request.get("model", "mock")}
+            for i, piece in enumerate(split_tokens(answer)):
+                if i:
+                    time.sleep(1 / tokens_per_s)
+                self._event({**base, "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]})
+            self._event({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+            if (request.get("stream_options") or {}).get("include_usage"):
+                self._event({**base, "choices": [], "usage": usage})
+            self._chunk(b"data: [DONE]\n\n")
+            self._chunk(b"")
+
+        def _event(self, payload: dict):
+            self._chunk(f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode("utf-8"))
+
+        def _chunk(self, data: bytes):
+            self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+
+        def _send_json(self, status: int, payload: dict, headers: dict | None = None):
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return CompletionsHandler
+
+
+def serve(port: int = 0, ttft_s: float = 0.0, tokens_per_s: float = 1000.0, fail_rate: float = 0.0,
+          stall_rate: float = 0.0, stall_s: float = 0.0, stall_models: tuple = ()) -> ThreadingHTTPServer:
+    """Starts the mock on a daemon thread (port 0 = any free port) and returns the server;
+    server.stats counts connections, requests, injected failures, stalls and streams the
+    client cancelled."""
+    stats = {"connections": 0, "requests": 0, "failures": 0, "stalls": 0, "cancelled": 0}
+    handler = make_handler(ttft_s, tokens_per_s, fail_rate, stats, stall_rate, stall_s, tuple(stall_models))
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    server.stats = stats
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--ttft-ms", type=float, default=400)
+    parser.add_argument("--tokens-per-s", type=float, default=60)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    parser.add_argument("--stall-rate", type=float, default=0.0)
+    parser.add_argument("--stall-ms", type=float, default=8000)
+    parser.add_argument("--stall-model", action="append", default=[])
+    args = parser.parse_args()
+
+    server = serve(args.port, args.ttft_ms / 1000, args.tokens_per_s, args.fail_rate,
+                   args.stall_rate, args.stall_ms / 1000, args.stall_model)
+    print(f"LLM mock: http://127.0.0.1:{server.server_address[1]}/v1 "
+          f"(TTFT {args.ttft_ms:.0f} ms, {args.tokens_per_s:.0f} tokenit/s)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,331 @@
+"""Concurrent, resumable harvester for the ÕIS2 public course API.
+
+Module version of ois2_api_andmed.ipynb. Course details and versions are
+fetched by a thread pool over one pooled HTTP session, throttled by a token
+bucket and retried with exponential backoff. Every finished course is written
+to a SQLite journal right away, so an interrupted run resumes where it stopped,
+and a course whose latest version uuid is unchanged since the last run is not
+fetched at all:
+
+    python ois2_harvester.py --out toorandmed.csv [--workers 8] [--rate 10]
+
+With --record DIR every response is also saved as a JSON file; ois2_stub_server.py
+serves such a directory back, so the harvester can be run without the real API.
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse
+
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import HARVEST_JOURNAL, HARVEST_RATE, HARVEST_WORKERS, OIS2_API_URL
+
+LIST_CHUNK_SIZE = 200
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+PRIORITY_COLUMNS = [
+    "course_uuid", "code",
+    "title__en", "version__title__en",
+    "credits",
+    "overview__description__en", "version__overview__description__en",
+    "overview__learning_outcomes_text_en",
+]
+
+
+def recording_name(method: str, path: str, body: bytes | None = None) -> str:
+    """File name under which a response is recorded and replayed."""
+    name = f"{method.upper()}_{path.strip('/').replace('/', '_')}"
+    if body:
+        name += "_" + hashlib.sha1(body).hexdigest()[:12]
+    return name + ".json"
+
+
+class TokenBucket:
+    """Allows *rate* requests per second on average, with bursts of up to *burst*."""
+
+    def __init__(self, rate: float, burst: int | None = None):
+        self.rate = rate
+        self.capacity = burst or max(1, int(rate))
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class OIS2Client:
+    """Thread-safe ÕIS2 client: one pooled session, rate limit, retries with backoff."""
+
+    def __init__(self, base_url: str = OIS2_API_URL, rate: float = HARVEST_RATE, pool_size: int = HARVEST_WORKERS,
+                 retries: int = 4, backoff: float = 0.5, timeout: float = 30, record_dir: str | None = None):
+        self.base_url = base_url.rstrip("/")
+        self.bucket = TokenBucket(rate)
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.record_dir = record_dir
+        self.stats = {"requests": 0, "retries": 0}
+        self._stats_lock = threading.Lock()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _request(self, method: str, url: str, body: dict | None = None):
+        data = json.dumps(body, sort_keys=True).encode("utf-8") if body is not None else None
+        headers = {"Accept": "application/json"}
+        if data is not None:
+            headers["Content-Type"] = "application/json"
+        for attempt in range(self.retries + 1):
+            self.bucket.acquire()
+            self._count("requests")
+            try:
+                r = self.session.request(method, url, data=data, headers=headers, timeout=self.timeout)
+                if r.status_code not in RETRY_STATUSES:
+                    r.raise_for_status()
+                    payload = r.json()
+                    if self.record_dir:
+                        self._record(method, url, data, payload)
+                    return payload
+                retry_after = r.headers.get("Retry-After")
+                error = requests.HTTPError(f"{r.status_code} {url}", response=r)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                retry_after, error = None, e
+            if attempt == self.retries:
+                raise error
+            self._count("retries")
+            delay = float(retry_after) if retry_after and retry_after.isdigit() else self.backoff * 2 ** attempt
+            time.sleep(delay * random.uniform(0.8, 1.2))
+
+    def _count(self, key: str):
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def _record(self, method: str, url: str, data: bytes | None, payload):
+        path = os.path.join(self.record_dir, recording_name(method, urlparse(url).path, data))
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False)
+
+    def list_courses(self, chunk_size: int = LIST_CHUNK_SIZE) -> list[dict]:
+        """All courses as {course_uuid, course_code, latest_version_uuid}. The first page
+        must be a GET (the API rejects a POST with offset 0), the rest are POSTs."""
+        courses, seen = [], set()
+        chunk = self._request("GET", self.base_url)
+        offset = 0
+        while chunk:
+            for c in chunk:
+                if c["uuid"] not in seen:
+                    seen.add(c["uuid"])
+                    courses.append({
+                        "course_uuid": c["uuid"],
+                        "course_code": c.get("code"),
+                        "latest_version_uuid": c.get("latest_version_uuid"),
+                    })
+            offset += len(chunk)
+            chunk = self._request("POST", self.base_url, {"start": offset, "take": chunk_size})
+        return courses
+
+    def fetch_course_details(self, uuid: str) -> dict:
+        return self._request("GET", f"{self.base_url}/{uuid}")
+
+    def fetch_versions(self, course_uuid: str) -> list[dict]:
+        return self._request("GET", f"{self.base_url}/{course_uuid}/versions")
+
+
+def is_scalar(x):
+    return isinstance(x, (str, int, float, bool)) or x is None
+
+
+def flatten_json(obj, parent_key: str = "", sep: str = "__") -> dict:
+    """Flattens nested dicts into key1__key2 columns; lists of objects stay JSON strings."""
+    flat = {}
+    if isinstance(obj, dict):
+        for k, v in obj.items():
+            flat.update(flatten_json(v, f"{parent_key}{sep}{k}" if parent_key else k, sep))
+    elif isinstance(obj, list):
+        if all(is_scalar(el) for el in obj):
+            flat[parent_key] = " | ".join("" if el is None else str(el) for el in obj)
+        else:
+            flat[parent_key] = json.dumps(obj, ensure_ascii=False, sort_keys=True)
+    else:
+        flat[parent_key] = obj
+    return flat
+
+
+def bulletify(items, lang: str) -> str | None:
+    texts = [(it or {}).get(lang) for it in (items or [])]
+    texts = [t.strip() for t in texts if t]
+    return "\n".join(f"- {t}" for t in texts) if texts else None
+
+
+def pick_latest_version(versions: list[dict], latest_uuid: str | None = None) -> dict | None:
+    """The listed latest version, else the one flagged isLatest, else the newest by date."""
+    if not versions:
+        return None
+    if latest_uuid:
+        for v in versions:
+            if v.get("uuid") == latest_uuid:
+                return v
+    for v in versions:
+        if v.get("isLatest") is True:
+            return v
+    return sorted(versions, key=lambda v: v.get("approvalDate") or v.get("validFrom") or "", reverse=True)[0]
+
+
+def build_row(raw_course: dict, versions: list[dict], course_uuid: str, latest_uuid: str | None) -> dict:
+    """One flat CSV row per course, exactly as the notebook built it."""
+    flat = flatten_json(raw_course)
+    overview = raw_course.get("overview") or {}
+    flat["overview__objectives_text_en"] = bulletify(overview.get("objectives"), "en")
+    flat["overview__learning_outcomes_text_en"] = bulletify(overview.get("learning_outcomes"), "en")
+
+    target = pick_latest_version(versions, latest_uuid)
+    if target:
+        flat.update(flatten_json(target, parent_key="version"))
+        v_overview = target.get("overview") or {}
+        flat["version__overview__objectives_text_en"] = bulletify(v_overview.get("objectives"), "en")
+        flat["version__overview__learning_outcomes_text_en"] = bulletify(v_overview.get("learning_outcomes"), "en")
+
+    flat["course_uuid"] = course_uuid
+    flat["latest_version_uuid"] = latest_uuid or (target.get("uuid") if target else None)
+    return flat
+
+
+class HarvestJournal:
+    """SQLite journal with one row per course: the version it was fetched at and the flat row.
+    Only the thread running harvest() writes to it."""
+
+    def __init__(self, path: str = HARVEST_JOURNAL):
+        self._db = sqlite3.connect(path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS courses ("
+            " course_uuid TEXT PRIMARY KEY, version_uuid TEXT, fetched REAL NOT NULL,"
+            " row_json TEXT, error TEXT)"
+        )
+        self._db.commit()
+
+    def fetched_versions(self) -> dict:
+        """course_uuid -> version_uuid of every course whose last fetch succeeded."""
+        return dict(self._db.execute("SELECT course_uuid, version_uuid FROM courses WHERE error IS NULL"))
+
+    def record(self, course_uuid: str, version_uuid: str | None, row: dict | None = None, error: str | None = None):
+        """Stores a fetched row, or notes *error* for the course. A failed refetch keeps the
+        last good row (and its version), so the export does not lose the course and the
+        next run tries it again."""
+        if error is None:
+            self._db.execute(
+                "INSERT OR REPLACE INTO courses VALUES (?, ?, ?, ?, NULL)",
+                (course_uuid, version_uuid, time.time(), json.dumps(row, ensure_ascii=False, default=str)),
+            )
+        else:
+            self._db.execute(
+                "INSERT INTO courses VALUES (?, ?, ?, NULL, ?)"
+                " ON CONFLICT (course_uuid) DO UPDATE SET fetched = excluded.fetched, error = excluded.error",
+                (course_uuid, version_uuid, time.time(), error),
+            )
+        self._db.commit()
+
+    def forget_missing(self, course_uuids) -> int:
+        """Drops courses that are no longer listed. Returns how many were dropped."""
+        keep = set(course_uuids)
+        gone = [uuid for (uuid,) in self._db.execute("SELECT course_uuid FROM courses") if uuid not in keep]
+        self._db.executemany("DELETE FROM courses WHERE course_uuid = ?", [(uuid,) for uuid in gone])
+        self._db.commit()
+        return len(gone)
+
+    def rows(self) -> list[dict]:
+        return [json.loads(r) for (r,) in self._db.execute(
+            "SELECT row_json FROM courses WHERE row_json IS NOT NULL ORDER BY rowid")]
+
+    def close(self):
+        self._db.close()
+
+
+def _fetch_course(client: OIS2Client, course: dict) -> dict:
+    raw_course = client.fetch_course_details(course["course_uuid"])
+    versions = client.fetch_versions(course["course_uuid"])
+    return build_row(raw_course, versions, course["course_uuid"], course.get("latest_version_uuid"))
+
+
+def harvest(client: OIS2Client, journal: HarvestJournal, courses: list[dict],
+            workers: int = HARVEST_WORKERS) -> dict:
+    """Fetches every listed course whose latest version is not in the journal yet."""
+    known = journal.fetched_versions()
+    todo = [c for c in courses
+            if c.get("latest_version_uuid") is None or known.get(c["course_uuid"]) != c["latest_version_uuid"]]
+    stats = {"listed": len(courses), "skipped": len(courses) - len(todo), "fetched": 0, "failed": 0,
+             "removed": journal.forget_missing(c["course_uuid"] for c in courses)}
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ois2") as pool:
+        futures = {pool.submit(_fetch_course, client, c): c for c in todo}
+        for done, future in enumerate(as_completed(futures), 1):
+            course = futures[future]
+            try:
+                row = future.result()
+                journal.record(course["course_uuid"], row["latest_version_uuid"], row)
+                stats["fetched"] += 1
+            except Exception as e:
+                # One odd course (HTTP error, bad JSON, a shape build_row does not expect)
+                # must not abort the run, as in the notebook.
+                journal.record(course["course_uuid"], course.get("latest_version_uuid"), error=str(e))
+                stats["failed"] += 1
+                print(f"[Viga] Aine {course['course_uuid']}: {e}")
+            if done % 200 == 0:
+                print(f"  {done}/{len(todo)} ainet töödeldud")
+    return stats
+
+
+def export_csv(journal: HarvestJournal, path: str) -> int:
+    """Writes the journal's rows as the raw CSV the cleaning step reads. Returns the row count."""
+    df = pd.DataFrame(journal.rows())
+    columns = [c for c in PRIORITY_COLUMNS if c in df.columns] + [c for c in df.columns if c not in PRIORITY_COLUMNS]
+    df[columns].to_csv(path + ".tmp", index=False)
+    os.replace(path + ".tmp", path)
+    return len(df)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default=OIS2_API_URL)
+    parser.add_argument("--journal", default=HARVEST_JOURNAL)
+    parser.add_argument("--out", default="toorandmed.csv")
+    parser.add_argument("--workers", type=int, default=HARVEST_WORKERS)
+    parser.add_argument("--rate", type=float, default=HARVEST_RATE, help="Päringuid sekundis")
+    parser.add_argument("--record", default=None, help="Salvesta vastused sellesse kausta")
+    args = parser.parse_args()
+
+    if args.record:
+        os.makedirs(args.record, exist_ok=True)
+    client = OIS2Client(args.base_url, args.rate, args.workers, record_dir=args.record)
+    journal = HarvestJournal(args.journal)
+    start = time.perf_counter()
+    courses = client.list_courses()
+    print(f"Nimekirjas {len(courses):,} ainet.")
+    stats = harvest(client, journal, courses, args.workers)
+    rows = export_csv(journal, args.out)
+    journal.close()
+    print(f"Valmis {time.perf_counter() - start:.1f} s: pärisin {stats['fetched']:,}, muutumata {stats['skipped']:,}, "
+          f"vigu {stats['failed']:,}, eemaldatud {stats['removed']:,}; {client.stats['requests']:,} päringut "
+          f"({client.stats['retries']:,} kordust). {rows:,} rida → {args.out}")
+
+
+if __name__ == "__main__":
+    main()
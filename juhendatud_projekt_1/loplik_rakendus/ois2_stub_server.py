@@ -0,0 +1,82 @@
+"""Local stand-in for the ÕIS2 API that replays responses recorded by ois2_harvester.py --record.
+
+    python ois2_stub_server.py recorded_dir [--port 8765] [--latency-ms 50] [--fail-rate 0.05]
+
+then point the harvester at it with --base-url http://127.0.0.1:8765/api/courses.
+Unknown requests get 404; with --fail-rate a share of requests gets 503, which
+exercises the harvester's retry path.
+"""
+import argparse
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from ois2_harvester import recording_name
+
+
+def make_handler(directory: str, latency_s: float = 0.0, fail_rate: float = 0.0):
+    class ReplayHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, so the client's connection pool is exercised
+
+        def _replay(self, body: bytes | None):
+            time.sleep(latency_s)
+            if fail_rate and random.random() < fail_rate:
+                self._send(503, b'{"error": "stub failure"}')
+                return
+            path = os.path.join(directory, recording_name(self.command, self.path.split("?")[0], body))
+            if not os.path.exists(path):
+                self._send(404, b'{"error": "not recorded"}')
+                return
+            with open(path, "rb") as f:
+                self._send(200, f.read())
+
+        def _send(self, status: int, payload: bytes):
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            self._replay(None)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            self._replay(self.rfile.read(length) if length else None)
+
+        def log_message(self, format, *args):
+            pass
+
+    return ReplayHandler
+
+
+def serve(directory: str, port: int = 0, latency_s: float = 0.0, fail_rate: float = 0.0) -> ThreadingHTTPServer:
+    """Starts the stub on a daemon thread (port 0 = any free port) and returns the server;
+    its address is server.server_address, stop it with server.shutdown()."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(directory, latency_s, fail_rate))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = serve(args.directory, args.port, args.latency_ms / 1000, args.fail_rate)
+    print(f"ÕIS2 stub: http://127.0.0.1:{server.server_address[1]}/api/courses ← {args.directory}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
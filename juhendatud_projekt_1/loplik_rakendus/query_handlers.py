@@ -1,22 +1,27 @@
-import pandas as pd
 import streamlit as st
 
-from config import EAP_DEFAULT, FILTER_NONE
-from filters import build_filter_mask, get_active_filters
-from llm import build_system_prompt, call_llm_stream
-from rag import do_rag
-from session_state import update_tokens, usage_to_dict
+from compact_answer import CardStream
+from config import COMPACT_ANSWERS, MODEL_NAME
+from data_loader import get_models, get_response_cache, retrieval_cache
+from filters import get_active_filters
+from history import fit_history
+from llm import build_system_prompt, call_llm_stream, replay_cached
+from llm_dispatch import model_latency
+from rag import build_context, cached_rank_for_context, query_vector_of
+from response_cache import response_key
+from session_state import update_tokens, usage_to_dict, with_history_savings
 
 
-def handle_first_query(prompt: str, client, embedder, df, embeddings_df, filters: tuple):
+def handle_first_query(prompt: str, client, filters: tuple):
     """Filters data, runs RAG, calls LLM, and persists context for follow-ups."""
     active, active_str = get_active_filters(*filters)
+    embedder, store = get_models()
 
     with st.spinner("Otsin sobivaid kursusi..."):
-        merged = pd.merge(df, embeddings_df, on="unique_ID")
-        mask = build_filter_mask(merged, *filters)
-        filtered_df = merged[mask].copy()
-        total_count, filtered_count = len(merged), len(filtered_df)
+        filtered_count, top_rows, scores, search_info = cached_rank_for_context(
+            prompt, store, filters, embedder, retrieval_cache
+        )
+        total_count = len(store)
 
     filter_msg = (
         f"Rakendatud filtrid jätsid andmestikku **{filtered_count}** kursust {total_count}-st."
@@ -31,7 +36,10 @@ def handle_first_query(prompt: str, client, embedder, df, embeddings_df, filters
         return
 
     st.caption(filter_msg)
-    context_text, course_names, results_display = do_rag(prompt, filtered_df, embedder, n=5)
+    query_vector = query_vector_of(prompt, embedder, search_info)
+    context_text, course_names, results_display, context_info = build_context(
+        store, top_rows, scores, query_vector)
+    search_info = {**search_info, **context_info}
 
     if context_text is None:
         msg = "Sobivaid kursuseid ei leitud. Proovi muuta otsingupäringut või filtreid."
@@ -43,16 +51,40 @@ def handle_first_query(prompt: str, client, embedder, df, embeddings_df, filters
     st.session_state.course_names = course_names
     st.session_state.results_display = results_display
     st.session_state.filter_counts = (total_count, filtered_count)
+    st.session_state.dataset_version = store.version
 
-    system_prompt = build_system_prompt(context_text, course_names, active_str, total_count, filtered_count)
-    messages_to_send = [system_prompt] + [
-        {"role": m["role"], "content": m["content"]} for m in st.session_state.messages
-    ]
+    course_ids = results_display["unique_ID"].astype(str).tolist() if COMPACT_ANSWERS else None
+    system_prompt = build_system_prompt(context_text, course_names, active_str, total_count, filtered_count,
+                                        course_ids)
+    messages_to_send, history_info = fit_history(system_prompt, st.session_state.messages)
+
+    response_cache = get_response_cache()
+    cache_key = cached = None
+    # Only an answer to this question alone can be reused; an earlier turn would change it.
+    if response_cache is not None and [m["role"] for m in st.session_state.messages] == ["user"]:
+        answer_model = f"{MODEL_NAME}/compact" if COMPACT_ANSWERS else MODEL_NAME
+        cache_key = response_key(results_display["unique_ID"], active_str, answer_model, store.version)
+        cached = response_cache.lookup(cache_key, prompt, query_vector)
 
     try:
-        full_text, usage = call_llm_stream(client, messages_to_send)
-        update_tokens(usage)
-        usage_dict = usage_to_dict(usage)
+        cache_info = cards = None
+        if cached is not None:
+            entry_id, cached_text, cached_usage, similarity = cached
+            full_text = replay_cached(cached_text)
+            usage_dict = {"prompt": 0, "completion": 0, "total": 0,
+                          "cached_total": (cached_usage or {}).get("total", 0)}
+            cache_info = {"id": entry_id, "hit": True, "similarity": round(similarity, 4)}
+        else:
+            cards = CardStream(results_display) if COMPACT_ANSWERS else None
+            full_text, usage, stream_stats = call_llm_stream(client, messages_to_send, cards)
+            update_tokens(usage)
+            usage_dict = with_history_savings(usage_to_dict(usage, stream_stats), history_info)
+            if cache_key is not None and full_text:
+                entry_id = response_cache.store(cache_key, prompt, query_vector(),
+                                                full_text, usage_dict)
+                cache_info = {"id": entry_id, "hit": False}
+        if cache_info is not None:
+            cache_info.update(response_cache.stats_snapshot())
         st.session_state.messages.append({
             "role": "assistant",
             "filter_msg": filter_msg,
@@ -63,6 +95,12 @@ def handle_first_query(prompt: str, client, embedder, df, embeddings_df, filters
                 "filters": active_str,
                 "filtered_count": filtered_count,
                 "context_df": results_display,
+                "search_info": search_info,
+                "dataset_version": store.version,
+                "memory_report": store.memory_report,
+                "response_cache": cache_info,
+                "llm_models": model_latency.snapshot(),
+                "llm_raw": cards.raw if cards is not None else None,
                 "system_prompt": system_prompt["content"],
             },
         })
@@ -80,14 +118,12 @@ def handle_followup_query(prompt: str, client, filters: tuple):
         st.session_state.course_names,
         active_str, tc, fc,
     )
-    messages_to_send = [system_prompt] + [
-        {"role": m["role"], "content": m["content"]} for m in st.session_state.messages
-    ]
+    messages_to_send, history_info = fit_history(system_prompt, st.session_state.messages)
 
     try:
-        full_text, usage = call_llm_stream(client, messages_to_send)
+        full_text, usage, stream_stats = call_llm_stream(client, messages_to_send)
         update_tokens(usage)
-        usage_dict = usage_to_dict(usage)
+        usage_dict = with_history_savings(usage_to_dict(usage, stream_stats), history_info)
         st.session_state.messages.append({
             "role": "assistant",
             "content": full_text,
@@ -97,6 +133,8 @@ def handle_followup_query(prompt: str, client, filters: tuple):
                 "filters": active_str,
                 "filtered_count": len(st.session_state.results_display),
                 "context_df": st.session_state.results_display,
+                "dataset_version": st.session_state.get("dataset_version"),
+                "llm_models": model_latency.snapshot(),
                 "system_prompt": system_prompt["content"],
             },
         })
@@ -1,41 +1,158 @@
+import time
+
 import numpy as np
-import pandas as pd
-from sklearn.metrics.pairwise import cosine_similarity
-
-
-def do_rag(query: str, filtered_df: pd.DataFrame, embedder, n: int = 3):
-    """Semantic search. Returns (context_text, course_names, results_display_df)."""
-    if filtered_df.empty:
-        return None, [], pd.DataFrame()
-
-    query_vec = embedder.encode([query])[0]
-    emb_matrix = np.stack(filtered_df["embedding"].values)
-    scored = filtered_df.copy()
-    scored["score"] = cosine_similarity([query_vec], emb_matrix)[0]
-    results = scored.sort_values("score", ascending=False).head(n)
-    results_display = results.drop(columns=["embedding"], errors="ignore").copy()
-    results = results.drop(columns=["score", "embedding", "unique_ID"], errors="ignore")
-
-    lines, course_names = [], []
-    for i, (_, row) in enumerate(results.iterrows(), 1):
-        def get(field, default="?"):
-            return row.get(field, default)
-
-        def truncate(field, limit):
-            val = get(field, "")
-            return str(val)[:limit] if pd.notna(val) else ""
-
-        name = get("nimi_et", get("nimi_en"))
-        lines.append(
-            f"{i}. {name} ({get('nimi_en', '')})\n"
-            f"   Kood: {get('aine_kood')}\n"
-            f"   EAP: {get('eap')} | Semester: {get('semester')} | "
-            f"Keel: {get('keel')} | Õppeviis: {get('veebiope')}\n"
-            f"   Õppeaste: {get('oppeaste')} | Linn: {get('linn')}\n"
-            f"   Kirjeldus: {truncate('kirjeldus', 500)}\n"
-            f"   Eesmärgid: {truncate('eesmargid', 300)}\n"
-            f"   Õpiväljundid: {truncate('opivaljundid', 300)}"
-        )
-        course_names.append(name)
-
-    return "\n\n".join(lines), course_names, results_display
+
+from config import CONTEXT_ENCODER, CONTEXT_TOKEN_BUDGET, HYBRID_CANDIDATES, HYBRID_SEARCH, RAG_MAX_RESULTS
+from context_encoder import encode_context
+from lexical_index import reciprocal_rank_fusion
+from result_cache import retrieval_key
+from snippets import fit_to_budget
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Positions of the k highest scores, best first, without sorting the whole array."""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top], kind="stable")]
+
+
+def embed_query(query: str, embedder) -> np.ndarray:
+    """Encodes the query as an L2-normalised float32 vector."""
+    query_vec = np.asarray(embedder.encode([query])[0], dtype=np.float32)
+    norm = np.linalg.norm(query_vec)
+    return query_vec / norm if norm else query_vec
+
+
+def query_vector_of(query: str, embedder, search_info: dict):
+    """Callable returning the normalised query vector: the one retrieve already computed,
+    taken out of *search_info*, else one encode on first call."""
+    query_vec = search_info.pop("query_vector", None)
+
+    def query_vector() -> np.ndarray:
+        nonlocal query_vec
+        if query_vec is None:
+            query_vec = embed_query(query, embedder)
+        return query_vec
+    return query_vector
+
+
+def retrieve(query: str, store, rows: np.ndarray, embedder, n: int):
+    """Ranks *rows* of the CourseStore for the query. Returns (row_ids, scores, search_info).
+
+    A query that is just a course code, unique_ID or name skips the embedder entirely.
+    Otherwise search_info["query_vector"] is the query vector for later steps (see
+    query_vector_of), and the dense ranking is fused (reciprocal rank fusion) with BM25 when
+    HYBRID_SEARCH is on, and with the courses whose codes the query mentions.
+    """
+    start = time.perf_counter()
+    exact = store.lexical.exact_match(query)
+    if exact is not None:
+        keep = store.row_mask(rows)
+        exact = exact if keep is None else exact[keep[exact]]
+        if len(exact):
+            exact = exact[:n]
+            return exact, np.ones(len(exact), dtype=np.float32), {
+                "strategy": "exact_code",
+                "candidates": len(exact),
+                "search_ms": round((time.perf_counter() - start) * 1000, 3),
+            }
+
+    mentioned = store.lexical.mentioned(query)
+    if len(mentioned):
+        keep = store.row_mask(rows)
+        mentioned = mentioned if keep is None else mentioned[keep[mentioned]]
+
+    start = time.perf_counter()
+    query_vec = embed_query(query, embedder)
+    query_vec.flags.writeable = False  # kept in search_info, also by the result cache
+    embed_ms = (time.perf_counter() - start) * 1000
+    if HYBRID_SEARCH or len(mentioned):
+        dense_rows, _, search_info = store.search(query_vec, rows, max(n, HYBRID_CANDIDATES))
+        rankings = [dense_rows]
+        if HYBRID_SEARCH:
+            start = time.perf_counter()
+            lexical_rows = store.lexical_search(query, rows, HYBRID_CANDIDATES)
+            rankings.append(lexical_rows)
+            search_info["lexical_hits"] = len(lexical_rows)
+            search_info["lexical_ms"] = round((time.perf_counter() - start) * 1000, 3)
+        if len(mentioned):
+            rankings.append(mentioned)
+            search_info["mentioned_codes"] = len(mentioned)
+        top_rows, scores = reciprocal_rank_fusion(rankings, n)
+        search_info["fusion"] = "rrf"
+    else:
+        top_rows, scores, search_info = store.search(query_vec, rows, n)
+    search_info["embed_ms"] = round(embed_ms, 3)
+    search_info["query_vector"] = query_vec
+    if hasattr(embedder, "stats_snapshot"):
+        search_info["query_cache"] = embedder.stats_snapshot()
+    return top_rows, scores, search_info
+
+
+def rank_for_context(query: str, store, rows: np.ndarray, embedder, n: int = RAG_MAX_RESULTS,
+                     token_budget: int = CONTEXT_TOKEN_BUDGET, encode: bool = CONTEXT_ENCODER):
+    """Of the top *n* courses among *rows*, as many as fit into *token_budget* as snippets.
+    With *encode* all *n* are returned: build_context fits them in the encoded form.
+    Returns (row_ids, scores, search_info); empty row ids when *rows* selects nothing."""
+    rows = np.asarray(rows)
+    if not (rows.any() if rows.dtype == bool else len(rows)):
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float32), {}
+
+    top_rows, scores, search_info = retrieve(query, store, rows, embedder, n)
+    if encode:
+        return top_rows, scores, search_info
+    token_counts = store.snippet_tokens[top_rows]
+    fit = fit_to_budget(token_counts, token_budget)
+    search_info["context_courses"] = fit
+    search_info["context_tokens"] = int(token_counts[:fit].sum())
+    return top_rows[:fit], scores[:fit], search_info
+
+
+def build_context(store, top_rows: np.ndarray, scores: np.ndarray, query_vector=None,
+                  encode: bool = CONTEXT_ENCODER, token_budget: int = CONTEXT_TOKEN_BUDGET):
+    """Returns (context_text, course_names, results_display_df, context_info); context_text is None
+    without rows. With *encode* the text comes from encode_context (*query_vector* is the
+    callable it takes), which keeps as many of *top_rows* as fit into *token_budget*, and
+    context_info has its counts; else context_info is empty."""
+    if not len(top_rows):
+        return None, [], store.rows_frame(top_rows), {}
+    if encode:
+        context_text, context_info = encode_context(store, top_rows, query_vector, token_budget=token_budget)
+        top_rows, scores = top_rows[:context_info["context_courses"]], scores[:context_info["context_courses"]]
+    else:
+        context_text = "\n\n".join(f"{i}. {snippet}" for i, snippet in enumerate(store.snippets[top_rows], 1))
+        context_info = {}
+    return context_text, store.names[top_rows].tolist(), store.rows_frame(top_rows, scores), context_info
+
+
+def do_rag(query: str, store, rows: np.ndarray, embedder, n: int = RAG_MAX_RESULTS,
+           token_budget: int = CONTEXT_TOKEN_BUDGET, encode: bool = CONTEXT_ENCODER):
+    """Hybrid search over *rows* (row ids or boolean mask) of the CourseStore. Of the top *n*
+    courses, as many go into the context as fit into *token_budget*.
+    Returns (context_text, course_names, results_display_df, search_info)."""
+    top_rows, scores, search_info = rank_for_context(query, store, rows, embedder, n, token_budget, encode)
+    context_text, course_names, results_display, context_info = build_context(
+        store, top_rows, scores, query_vector_of(query, embedder, search_info), encode, token_budget)
+    return context_text, course_names, results_display, {**search_info, **context_info}
+
+
+def cached_rank_for_context(query: str, store, filters: tuple, embedder, cache, n: int = RAG_MAX_RESULTS):
+    """rank_for_context over the rows matching *filters*, through a RetrievalCache.
+    Returns (filtered_count, row_ids, scores, search_info); a hit skips filtering,
+    embedding and ranking altogether."""
+    key = retrieval_key(query, filters, store.version, n)
+    cached = cache.get(key)
+    hit = cached is not None
+    if not hit:
+        start = time.perf_counter()
+        rows = store.filter(filters)
+        top_rows, scores, search_info = rank_for_context(query, store, rows, embedder, n)
+        search_info["retrieval_ms"] = round((time.perf_counter() - start) * 1000, 3)
+        top_rows.flags.writeable = scores.flags.writeable = False  # shared by every later hit
+        cached = (len(rows), top_rows, scores, search_info)
+        cache.put(key, cached)
+    filtered_count, top_rows, scores, search_info = cached
+    search_info = {**search_info, "result_cache": {"hit": hit, **cache.stats_snapshot()}}
+    return filtered_count, top_rows, scores, search_info
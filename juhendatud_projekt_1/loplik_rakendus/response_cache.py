@@ -0,0 +1,104 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from config import CACHE_PRUNE_SLACK, RESPONSE_CACHE_MAX_ROWS, RESPONSE_CACHE_MIN_SIMILARITY
+from embedding_cache import normalize_query
+
+
+def response_key(course_ids, filters: str, model: str, version: str) -> str:
+    """Digest of what an answer depends on besides the question: the retrieved course set
+    (order-insensitive), the active filter string, the model and the dataset version."""
+    parts = [model, version, filters, *sorted(str(uid) for uid in course_ids)]
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Bounded SQLite cache of LLM answers to first queries.
+
+    An answer is only reused for the same response_key. Within a key the
+    normalised query is matched exactly first; failing that, the stored query
+    vector most similar to the new one is used if the cosine similarity reaches
+    *min_similarity*. Once the table is CACHE_PRUNE_SLACK over *max_rows*, the least
+    recently used rows beyond *max_rows* are deleted.
+    """
+
+    def __init__(self, db_path: str, min_similarity: float = RESPONSE_CACHE_MIN_SIMILARITY,
+                 max_rows: int = RESPONSE_CACHE_MAX_ROWS):
+        self.min_similarity = min_similarity
+        self.max_rows = max_rows
+        self.stats = {"exact_hits": 0, "similar_hits": 0, "misses": 0, "evicted": 0}
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " id INTEGER PRIMARY KEY, key TEXT NOT NULL, query TEXT NOT NULL, vector BLOB NOT NULL,"
+            " answer TEXT NOT NULL, usage TEXT, created REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_key ON responses (key, query)")
+        self._db.commit()
+        self._rows = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def lookup(self, key: str, query: str, query_vector):
+        """Returns (entry_id, answer, usage, similarity) or None. *query_vector* is a callable
+        returning the normalised query vector, called only when there is no exact match."""
+        normalized = normalize_query(query)
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id, answer, usage FROM responses WHERE key = ? AND query = ?", (key, normalized)
+            ).fetchone()
+            similarity = 1.0
+            if row is None:
+                candidates = self._db.execute(
+                    "SELECT id, answer, usage, vector FROM responses WHERE key = ?", (key,)
+                ).fetchall()
+                if candidates:
+                    vec = np.asarray(query_vector(), dtype=np.float32)
+                    scores = np.stack([np.frombuffer(c[3], dtype=np.float32) for c in candidates]) @ vec
+                    best = int(np.argmax(scores))
+                    if scores[best] >= self.min_similarity:
+                        row, similarity = candidates[best][:3], float(scores[best])
+            if row is None:
+                self.stats["misses"] += 1
+                return None
+            self.stats["exact_hits" if similarity == 1.0 else "similar_hits"] += 1
+            self._db.execute("UPDATE responses SET last_used = ? WHERE id = ?", (time.time(), row[0]))
+            self._db.commit()
+            return row[0], row[1], json.loads(row[2]) if row[2] else None, similarity
+
+    def store(self, key: str, query: str, query_vector: np.ndarray, answer: str, usage: dict | None) -> int:
+        now = time.time()
+        with self._lock:
+            cursor = self._db.execute(
+                "INSERT INTO responses (key, query, vector, answer, usage, created, last_used)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, normalize_query(query), np.asarray(query_vector, dtype=np.float32).tobytes(),
+                 answer, json.dumps(usage) if usage else None, now, now),
+            )
+            self._rows += 1
+            if self._rows > self.max_rows * (1 + CACHE_PRUNE_SLACK):
+                self._db.execute(
+                    "DELETE FROM responses WHERE id NOT IN ("
+                    " SELECT id FROM responses ORDER BY last_used DESC LIMIT ?)",
+                    (self.max_rows,),
+                )
+                self._rows = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            self._db.commit()
+            return cursor.lastrowid
+
+    def evict(self, entry_id: int):
+        """Drops one answer, e.g. after negative feedback on it."""
+        with self._lock:
+            deleted = self._db.execute("DELETE FROM responses WHERE id = ?", (entry_id,)).rowcount
+            self._db.commit()
+            self._rows -= deleted
+            self.stats["evicted"] += deleted
+
+    def stats_snapshot(self) -> dict:
+        with self._lock:
+            size = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            return {**self.stats, "size": size}
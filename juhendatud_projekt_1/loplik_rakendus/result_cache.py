@@ -0,0 +1,62 @@
+import threading
+import time
+from collections import OrderedDict
+
+from config import RESULT_CACHE_SIZE, RESULT_CACHE_TTL_S
+from embedding_cache import normalize_query
+
+
+def retrieval_key(query: str, filters: tuple, version: str, k: int) -> tuple:
+    """Cache key of one retrieval: the sidebar filter tuple as a hashable tuple, the dataset
+    version so results of an old dataset can never be served for a new one."""
+    return normalize_query(query), (*filters[:5], tuple(filters[5])), version, k
+
+
+class RetrievalCache:
+    """Process-wide LRU of ranked retrieval results with a time-to-live.
+
+    Shared by every session of the process, so a question another student asked
+    a minute ago skips filtering, embedding and ranking. Values are stored as
+    given and must not be modified by callers. invalidate() drops everything;
+    data_loader calls it when a new dataset version goes live.
+    """
+
+    def __init__(self, maxsize: int = RESULT_CACHE_SIZE, ttl_s: float = RESULT_CACHE_TTL_S):
+        self.maxsize = maxsize
+        self.ttl_s = ttl_s
+        self.stats = {"hits": 0, "misses": 0, "expired": 0, "evicted": 0, "invalidated": 0}
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] > self.ttl_s:
+                del self._entries[key]
+                self.stats["expired"] += 1
+                entry = None
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry[1]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.stats["evicted"] += 1
+
+    def invalidate(self):
+        with self._lock:
+            self.stats["invalidated"] += len(self._entries)
+            self._entries.clear()
+
+    def stats_snapshot(self) -> dict:
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {**self.stats, "size": len(self._entries),
+                    "hit_rate": round(self.stats["hits"] / lookups, 3) if lookups else 0.0}
@@ -0,0 +1,218 @@
+"""Precomputed sentence embeddings of the course texts, for the context encoder.
+
+Every sentence of a course's description, goals and learning outcomes is
+encoded once, offline:
+
+    python sentence_store.py puhtad_andmed.csv puhtad_andmed_laused [--batch-size 64]
+
+A store with base name ``puhtad_andmed_laused`` consists of
+
+    puhtad_andmed_laused.<gen>.utf8 / .idx.npz  the sentences (text_store.py format)
+    puhtad_andmed_laused.<gen>.vec.npy          float16 vectors, L2-normalised, memory-mapped
+    puhtad_andmed_laused.courses.npz           per course: unique_ID, sentence range, text
+                                               hash; and the generation <gen> in use
+
+A build writes the files of a new generation next to the live ones and then
+switches over by replacing the courses file, so a crash or a concurrent load
+never pairs one build's offsets with another build's sentences. The
+generation before it is kept for loads already under way; older ones are
+removed. A rebuild re-encodes only the courses whose text changed; at load
+time a course whose text no longer matches its hash gets no sentences, so
+the encoder falls back to the lead sentences of its description instead of
+showing stale ones.
+"""
+import argparse
+import glob
+import hashlib
+import os
+import re
+import time
+
+import numpy as np
+import pandas as pd
+
+from config import EMBEDDING_MODEL
+from text_store import BLOB_SUFFIX, INDEX_SUFFIX, TextStore, write_text_store
+
+SENTENCE_FIELDS = ("kirjeldus", "eesmargid", "opivaljundid")
+VECTORS_SUFFIX = ".vec.npy"
+COURSES_SUFFIX = ".courses.npz"
+SENTENCE_RE = re.compile(r"(?<=[.!?])\s+(?=[A-ZÕÄÖÜŠŽ0-9])|\n+")
+MIN_SENTENCE_CHARS = 20
+
+
+def split_sentences(text) -> list[str]:
+    """Sentences of *text*; fragments shorter than MIN_SENTENCE_CHARS (headings, list bullets)
+    are dropped."""
+    if text is None or (not isinstance(text, str) and pd.isna(text)):
+        return []
+    parts = (" ".join(part.split()) for part in SENTENCE_RE.split(str(text)))
+    return [part for part in parts if len(part) >= MIN_SENTENCE_CHARS]
+
+
+def course_text(row) -> str:
+    """What a course's sentences are cut from; its hash decides whether they are still valid."""
+    values = (row.get(f) for f in SENTENCE_FIELDS)
+    return "\x1f".join("" if v is None or pd.isna(v) else str(v) for v in values)
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+def store_exists(base: str) -> bool:
+    return os.path.exists(base + COURSES_SUFFIX)
+
+
+def _open_generation(base: str):
+    """(ids, offsets, hashes, model, generation, vectors, texts) of the live generation;
+    ValueError if its files do not belong together."""
+    with np.load(base + COURSES_SUFFIX, allow_pickle=False) as courses:
+        ids, offsets, hashes = courses["ids"], courses["offsets"], courses["hashes"]
+        model, generation = str(courses["model"]), str(courses["generation"])
+    prefix = f"{base}.{generation}"
+    vectors = np.load(prefix + VECTORS_SUFFIX, mmap_mode="r")
+    text_store = TextStore(prefix)
+    texts = text_store["lause"]
+    if text_store.version != generation or not len(vectors) == len(texts) == offsets[-1]:
+        raise ValueError(f"Lausehoidla '{base}' failid ei kuulu kokku.")
+    return ids, offsets, hashes, model, generation, vectors, texts
+
+
+class SentenceIndex:
+    """Sentence ranges of a CourseStore's rows: sentences of row r are starts[r]:ends[r]
+    (empty when the course has none or its text changed since the build)."""
+
+    def __init__(self, base: str, meta: pd.DataFrame):
+        ids, offsets, hashes, self.model, self.generation, self.vectors, self.texts = _open_generation(base)
+
+        positions = pd.Index(ids).get_indexer(meta["unique_ID"].astype(str))
+        records = meta.reindex(columns=list(SENTENCE_FIELDS)).to_dict("records")
+        current = np.array([text_hash(course_text(row)) for row in records])
+        valid = (positions >= 0) & (hashes[np.maximum(positions, 0)] == current)
+        self.starts = np.where(valid, offsets[np.maximum(positions, 0)], 0)
+        self.ends = np.where(valid, offsets[np.maximum(positions, 0) + 1], 0)
+        self.stale = int(((positions >= 0) & ~valid).sum())
+
+    def best(self, row: int, query_vec: np.ndarray, k: int) -> list[str]:
+        """The *k* sentences of *row* most similar to *query_vec*, in their original order."""
+        start, end = int(self.starts[row]), int(self.ends[row])
+        if end <= start:
+            return []
+        scores = np.asarray(self.vectors[start:end], dtype=np.float32) @ query_vec
+        top = np.sort(np.argsort(-scores, kind="stable")[:k])
+        return self.texts[start + top].tolist()
+
+
+def load_sentence_index(base: str | None, meta: pd.DataFrame) -> SentenceIndex | None:
+    if not base or not store_exists(base):
+        return None
+    try:
+        index = SentenceIndex(base, meta)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Hoiatus: lausehoidlat ei õnnestunud avada ({e}); kasutan juhtlauseid.")
+        return None
+    if index.model != EMBEDDING_MODEL:
+        print(f"Hoiatus: lausehoidla on tehtud mudeliga {index.model}, mitte {EMBEDDING_MODEL}; jätan kasutamata.")
+        return None
+    if index.stale:
+        print(f"Hoiatus: lausehoidlas on {index.stale} muutunud tekstiga kursust, neil kasutan juhtlauseid.")
+    return index
+
+
+def _existing(base: str, model_name: str) -> tuple[str | None, dict]:
+    """(generation, unique_ID -> (hash, sentences, vectors)) of a previous build with the
+    same model; (None, {}) if there is none or it cannot be read."""
+    if not store_exists(base):
+        return None, {}
+    try:
+        ids, offsets, hashes, model, generation, vectors, texts = _open_generation(base)
+    except (OSError, ValueError, KeyError):
+        return None, {}
+    if model != model_name:
+        return generation, {}
+    courses = {}
+    for i, (uid, digest) in enumerate(zip(ids.tolist(), hashes.tolist())):
+        start, end = offsets[i], offsets[i + 1]
+        courses[uid] = (digest, texts[np.arange(start, end)].tolist(), np.array(vectors[start:end]))
+    return generation, courses
+
+
+def _remove_generations(base: str, keep: set):
+    """Removes the files of every generation not in *keep* (and of the unversioned layout)."""
+    suffixes = (BLOB_SUFFIX, INDEX_SUFFIX, VECTORS_SUFFIX)
+    for path in glob.glob(f"{glob.escape(base)}.*"):
+        rest = path[len(base):]
+        generation = rest[1:].split(".", 1)[0] if rest not in suffixes else None
+        if rest.endswith(suffixes) and (generation is None or generation not in keep):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def build(csv_path: str, base: str, model_name: str = EMBEDDING_MODEL, batch_size: int = 64) -> dict:
+    from sentence_transformers import SentenceTransformer
+
+    start = time.perf_counter()
+    df = pd.read_csv(csv_path, usecols=["unique_ID", *SENTENCE_FIELDS]).drop_duplicates("unique_ID")
+    ids = df["unique_ID"].astype(str).tolist()
+    rows = df[list(SENTENCE_FIELDS)].to_dict("records")
+    hashes = [text_hash(course_text(row)) for row in rows]
+    previous, old = _existing(base, model_name)
+
+    todo = [i for i, (uid, digest) in enumerate(zip(ids, hashes)) if old.get(uid, (None,))[0] != digest]
+    new_sentences = {i: [s for f in SENTENCE_FIELDS for s in split_sentences(rows[i][f])] for i in todo}
+    flat = [s for i in todo for s in new_sentences[i]]
+    print(f"Kodeerin {len(flat):,} lauset {len(todo):,} kursusest ({len(ids) - len(todo):,} kursust muutumata).")
+    encoded = np.empty((0, 0), dtype=np.float16)
+    if flat:
+        model = SentenceTransformer(model_name)
+        encoded = np.asarray(model.encode(flat, batch_size=batch_size, normalize_embeddings=True), dtype=np.float32)
+        encoded /= np.maximum(np.linalg.norm(encoded, axis=1, keepdims=True), 1e-12)
+        encoded = encoded.astype(np.float16)
+
+    sentences, vectors, offsets, position = [], [], [0], 0
+    for i, uid in enumerate(ids):
+        if i in new_sentences:
+            course_sentences = new_sentences[i]
+            course_vectors = encoded[position:position + len(course_sentences)]
+            position += len(course_sentences)
+        else:
+            _, course_sentences, course_vectors = old[uid]
+        sentences += course_sentences
+        if len(course_sentences):
+            vectors.append(course_vectors)
+        offsets.append(len(sentences))
+    dim = vectors[0].shape[1] if vectors else 0
+    matrix = np.concatenate(vectors) if vectors else np.empty((0, dim), dtype=np.float16)
+
+    # Named after what it contains, so the files of a generation never change once live.
+    generation = text_hash("\x1f".join([model_name, *ids, *hashes]))
+    prefix = f"{base}.{generation}"
+    write_text_store(prefix, {"lause": sentences}, generation)
+    np.save(prefix + ".tmp" + VECTORS_SUFFIX, matrix)
+    os.replace(prefix + ".tmp" + VECTORS_SUFFIX, prefix + VECTORS_SUFFIX)
+    np.savez(base + ".tmp" + COURSES_SUFFIX, ids=np.asarray(ids, dtype=str), offsets=np.asarray(offsets, np.int64),
+             hashes=np.asarray(hashes, dtype=str), model=np.array(model_name), generation=np.array(generation))
+    os.replace(base + ".tmp" + COURSES_SUFFIX, base + COURSES_SUFFIX)
+    _remove_generations(base, {generation, previous})
+    return {"courses": len(ids), "encoded": len(todo), "sentences": len(sentences),
+            "mib": matrix.nbytes / 2**20, "seconds": time.perf_counter() - start}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("csv_path")
+    parser.add_argument("base")
+    parser.add_argument("--model", default=EMBEDDING_MODEL)
+    parser.add_argument("--batch-size", type=int, default=64)
+    args = parser.parse_args()
+
+    summary = build(args.csv_path, args.base, args.model, args.batch_size)
+    print(f"Valmis {summary['seconds']:.1f} s: {summary['courses']:,} kursust, {summary['sentences']:,} lauset "
+          f"({summary['mib']:.1f} MiB vektoreid), kodeeritud {summary['encoded']:,} kursust → {args.base}")
+
+
+if __name__ == "__main__":
+    main()
@@ -13,6 +13,7 @@ def init_session_state():
         "rag_context": None,
         "course_names": [],
         "results_display": pd.DataFrame(),
+        "dataset_version": None,
         "last_test_results": pd.DataFrame(),
         "last_test_summary": {"total": 0, "passed": 0, "failed": 0},
         "pending_query": None,
@@ -39,9 +40,13 @@ def update_tokens(usage):
         st.session_state.total_tokens["completion"] += usage.completion_tokens or 0
 
 
-def usage_to_dict(usage):
+def usage_to_dict(usage, stream_stats: dict | None = None):
+    """Token usage plus the stream timings (TTFT, stream time, tokens/s) and the answering
+    model of call_llm_stream."""
+    timings = {k: v for k, v in (stream_stats or {}).items()
+               if k in ("ttft_s", "stream_s", "tokens_per_s", "model", "hedged")}
     if not usage:
-        return None
+        return timings or None
     prompt_tokens = usage.prompt_tokens or 0
     completion_tokens = usage.completion_tokens or 0
     total_tokens = getattr(usage, "total_tokens", None)
@@ -51,4 +56,16 @@ def usage_to_dict(usage):
         "prompt": int(prompt_tokens),
         "completion": int(completion_tokens),
         "total": int(total_tokens),
+        **timings,
+    }
+
+
+def with_history_savings(usage_dict, history_info: dict):
+    """Adds the prompt tokens fit_history saved (local estimate) to a usage dict."""
+    if not usage_dict or not history_info["saved_tokens"]:
+        return usage_dict
+    return {
+        **usage_dict,
+        "history_saved": history_info["saved_tokens"],
+        "history_full": history_info["full_tokens"],
     }
@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+
+from tokens import count_tokens
+
+
+def _field(meta: pd.DataFrame, col: str, default: str = "?") -> pd.Series:
+    if col not in meta.columns:
+        return pd.Series(default, index=meta.index)
+    return meta[col].astype(object).where(meta[col].notna(), None).map(lambda v: default if v is None else str(v))
+
+
+def build_snippets(meta: pd.DataFrame):
+    """Pre-renders every course's context block (without its list number) once.
+    Returns (snippets, token_counts, names), all aligned with the rows of *meta*."""
+    nimi_en = _field(meta, "nimi_en", "")
+    name = _field(meta, "nimi_et", "")
+    name = name.where(name != "", nimi_en.replace("", "?"))
+
+    snippets = (
+        name + " (" + nimi_en + ")\n"
+        + "   Kood: " + _field(meta, "aine_kood") + "\n"
+        + "   EAP: " + _field(meta, "eap") + " | Semester: " + _field(meta, "semester")
+        + " | Keel: " + _field(meta, "keel") + " | Õppeviis: " + _field(meta, "veebiope") + "\n"
+        + "   Õppeaste: " + _field(meta, "oppeaste") + " | Linn: " + _field(meta, "linn") + "\n"
+        + "   Kirjeldus: " + _field(meta, "kirjeldus", "").str[:500] + "\n"
+        + "   Eesmärgid: " + _field(meta, "eesmargid", "").str[:300] + "\n"
+        + "   Õpiväljundid: " + _field(meta, "opivaljundid", "").str[:300]
+    )
+    snippets = snippets.to_numpy(dtype=object)
+    token_counts = np.fromiter((count_tokens(s) for s in snippets), dtype=np.int32, count=len(snippets))
+    return snippets, token_counts, name.to_numpy(dtype=object)
+
+
+def fit_to_budget(token_counts: np.ndarray, budget: int) -> int:
+    """How many of the (best-first) snippets fit into *budget* tokens; always at least one."""
+    return max(1, int(np.searchsorted(np.cumsum(token_counts), budget, side="right")))
@@ -0,0 +1,80 @@
+"""Parsing compact answers: whole and streamed picks, braces in reasons, unknown IDs.
+
+    python -m pytest test_compact_answer.py
+"""
+import json
+
+import pandas as pd
+
+from compact_answer import NO_MATCH_TEXT, CardStream, parse_picks
+
+COURSES = pd.DataFrame({
+    "unique_ID": ["LTAT.02.002", "MTAT.03.227"], "nimi_et": ["Masinõpe", "Andmekaeve"],
+    "aine_kood": ["LTAT.02.002", "MTAT.03.227"], "eap": [6.0, 3.0], "keel": ["eesti keel", "inglise keel"],
+    "veebiope": ["põimõpe", "veebiõpe"], "semester": ["kevad", "sügis"],
+})
+ALLOWED = set(COURSES["unique_ID"])
+
+
+def _answer(*picks) -> str:
+    return json.dumps({"kursused": [{"id": uid, "sobivus": reason} for uid, reason in picks]},
+                      ensure_ascii=False, indent=1)
+
+
+def _stream(text: str, step: int = 1) -> tuple[list[str], CardStream]:
+    cards = CardStream(COURSES)
+    return list(cards(text[i:i + step] for i in range(0, len(text), step))), cards
+
+
+def test_braces_inside_a_reason_do_not_lose_the_pick():
+    text = _answer(("LTAT.02.002", "Kasutab {scikit-learn} teeki"), ("MTAT.03.227", "Käsitleb } ja { märke"))
+
+    assert parse_picks(text, ALLOWED) == [("LTAT.02.002", "Kasutab {scikit-learn} teeki"),
+                                          ("MTAT.03.227", "Käsitleb } ja { märke")]
+
+
+def test_streamed_picks_match_the_whole_answer():
+    text = "Siin on vastus:\n" + _answer(("MTAT.03.227", "Andmed {ja} mudelid."), ("LTAT.02.002", "Alused."))
+    chunks, cards = _stream(text)
+
+    assert cards.picks == parse_picks(text, ALLOWED)
+    assert len(chunks) == 2 and chunks[0].startswith("- **Andmekaeve**")
+    assert chunks[1].startswith("\n\n- **Masinõpe**") and "Sobivus: Alused." in chunks[1]
+
+
+def test_each_card_appears_once_its_pick_is_complete():
+    text = _answer(("LTAT.02.002", "Esimene."), ("MTAT.03.227", "Teine."))
+    first_end = text.index("}") + 1
+    cards = CardStream(COURSES)
+    shown = []
+
+    def deltas():
+        yield text[:first_end - 1]
+        assert shown == []
+        yield text[first_end - 1:first_end]
+        assert len(shown) == 1
+        yield text[first_end:]
+
+    for chunk in cards(deltas()):
+        shown.append(chunk)
+    assert len(shown) == 2
+
+
+def test_unknown_and_repeated_ids_are_dropped():
+    text = _answer(("XXXX.00.000", "Väljamõeldud."), ("LTAT.02.002", "Sobib."), ("LTAT.02.002", "Jälle."))
+
+    assert parse_picks(text, ALLOWED) == [("LTAT.02.002", "Sobib.")]
+    assert _stream(text, step=7)[1].picks == [("LTAT.02.002", "Sobib.")]
+
+
+def test_malformed_pick_is_skipped_at_the_end():
+    text = '{"kursused": [{"id": "LTAT.02.002", "sobivus": oops}, {"id": "MTAT.03.227", "sobivus": "Hea."}]}'
+
+    assert parse_picks(text, ALLOWED) == [("MTAT.03.227", "Hea.")]
+    assert _stream(text, step=5)[1].picks == [("MTAT.03.227", "Hea.")]
+
+
+def test_no_picks_says_so():
+    chunks, _ = _stream('{"kursused": []}')
+
+    assert chunks == [NO_MATCH_TEXT]
@@ -0,0 +1,86 @@
+"""QueryEmbeddingCache: normalisation, the SQLite store, pruning and locking.
+
+    python -m pytest test_embedding_cache.py
+"""
+import threading
+
+import numpy as np
+
+import embedding_cache
+from embedding_cache import QueryEmbeddingCache
+
+
+class CountingEmbedder:
+    """Deterministic 4-d vectors from the text; counts the texts it was asked to encode."""
+
+    def __init__(self, gate: threading.Event | None = None):
+        self.encoded = []
+        self.gate = gate
+
+    def encode(self, texts, **kwargs):
+        if self.gate is not None:
+            self.gate.wait(5)
+        self.encoded += list(texts)
+        return np.array([[len(t), t.count("a"), t.count("e"), 1.0] for t in texts], dtype=np.float32)
+
+
+def test_normalised_repeats_hit_the_lru():
+    embedder = CountingEmbedder()
+    cache = QueryEmbeddingCache(embedder, "m")
+    first = cache.encode(["Masinõpe  algajatele"])
+    again = cache.encode(["masinõpe algajatele", "MASINÕPE ALGAJATELE"])
+
+    assert embedder.encoded == ["masinõpe algajatele"]
+    assert np.array_equal(again[0], first[0]) and np.array_equal(again[1], first[0])
+    # Duplicates within one call are looked up once.
+    assert cache.stats_snapshot() == {"hits": 1, "disk_hits": 0, "misses": 1, "size": 1}
+
+
+def test_disk_store_survives_restart_per_model(tmp_path):
+    db = str(tmp_path / "vektorid.sqlite")
+    QueryEmbeddingCache(CountingEmbedder(), "m1", db).encode(["andmebaasid"])
+
+    embedder = CountingEmbedder()
+    restarted = QueryEmbeddingCache(embedder, "m1", db)
+    restarted.encode(["andmebaasid"])
+    assert embedder.encoded == [] and restarted.stats["disk_hits"] == 1
+
+    other_model = CountingEmbedder()
+    QueryEmbeddingCache(other_model, "m2", db).encode(["andmebaasid"])
+    assert other_model.encoded == ["andmebaasid"]
+
+
+def test_disk_store_is_pruned_only_past_the_slack(tmp_path, monkeypatch):
+    monkeypatch.setattr(embedding_cache, "QUERY_CACHE_DB_MAX_ROWS", 10)
+    monkeypatch.setattr(embedding_cache, "CACHE_PRUNE_SLACK", 0.5)
+    cache = QueryEmbeddingCache(CountingEmbedder(), "m", str(tmp_path / "vektorid.sqlite"))
+
+    def db_rows():
+        return cache._db.execute("SELECT COUNT(*) FROM query_embeddings").fetchone()[0]
+
+    cache.encode([f"päring {i}" for i in range(15)])
+    assert db_rows() == 15
+    cache.encode(["päring 15"])
+    assert db_rows() == 10
+    assert cache._lookup("päring 15") is not None
+
+
+def test_a_miss_does_not_block_hits_from_other_threads():
+    gate = threading.Event()
+    embedder = CountingEmbedder()
+    cache = QueryEmbeddingCache(embedder, "m")
+    cache.encode(["statistika"])
+    embedder.gate = gate  # from now on every encode waits for the gate
+
+    slow = threading.Thread(target=cache.encode, args=(["keemia"],))
+    slow.start()
+    try:
+        hit = threading.Thread(target=cache.encode, args=(["statistika"],))
+        hit.start()
+        hit.join(2)
+        assert not hit.is_alive(), "a cache hit waited for another query's encode"
+    finally:
+        gate.set()
+        slow.join(5)
+    assert embedder.encoded == ["statistika", "keemia"]
+    assert cache.stats_snapshot()["hits"] == 1
@@ -0,0 +1,39 @@
+"""FilterIndex gives the same rows as build_filter_mask on the frame the app loads.
+
+    python -m pytest test_filter_index.py
+"""
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from benchmark import filter_candidates
+from config import DATA_CSV
+from data_loader import read_courses
+from filter_index import FilterIndex
+from filters import build_filter_mask
+
+FIXTURE_CSV = Path(__file__).with_name("testdata") / "kursused.csv"
+
+
+@pytest.fixture(params=[FIXTURE_CSV, Path(__file__).with_name(DATA_CSV)], ids=["fixture", "shipped"])
+def courses(request):
+    if not request.param.exists():
+        pytest.skip(f"{request.param} puudub")
+    return read_courses(request.param)
+
+
+def test_rows_for_matches_build_filter_mask(courses):
+    index = FilterIndex(courses)
+    for filters in filter_candidates(courses, samples=300):
+        expected = np.flatnonzero(build_filter_mask(courses, *filters).to_numpy())
+        assert np.array_equal(index.rows_for(filters), expected), filters
+
+
+def test_cached_rows_match_uncached(courses):
+    cached, uncached = FilterIndex(courses), FilterIndex(courses, cache_size=0)
+    candidates = filter_candidates(courses, samples=50)
+    first = [cached.rows_for(f) for f in candidates]
+    for filters, rows in zip(candidates, first):
+        assert np.array_equal(cached.rows_for(filters), rows)
+        assert np.array_equal(uncached.rows_for(filters), rows)
@@ -0,0 +1,60 @@
+"""fit_history: verbatim recent turns, summarised older ones, and the token budget.
+
+    python -m pytest test_history.py
+"""
+from history import fit_history, summarize_turn
+from tokens import count_tokens
+
+SYSTEM = {"role": "system", "content": "Oled kursusenõustaja."}
+
+
+def _chat(n_turns: int, answer_words: int = 20) -> list[dict]:
+    messages = []
+    for i in range(n_turns):
+        messages.append({"role": "user", "content": f"Küsimus {i}: mis kursus sobib?"})
+        messages.append({"role": "assistant", "content": f"- **Kursus {i}**\n" + "sõna " * answer_words})
+    return messages + [{"role": "user", "content": "Ja veel üks küsimus?"}]
+
+
+def _tokens(messages: list[dict]) -> int:
+    return sum(count_tokens(m["content"]) for m in messages)
+
+
+def test_short_chat_is_sent_unchanged():
+    messages = _chat(1)
+    sent, info = fit_history(SYSTEM, messages, budget=10_000, keep_turns=3)
+
+    assert sent == [SYSTEM] + messages
+    assert info["saved_tokens"] == 0 and info["turns_summarised"] == info["turns_dropped"] == 0
+
+
+def test_older_turns_become_summary_lines():
+    messages = _chat(5)
+    sent, info = fit_history(SYSTEM, messages, budget=10_000, keep_turns=2)
+
+    assert sent[1:] == messages[-3:]  # the last answered turn and the current question
+    assert "VARASEM VESTLUS" in sent[0]["content"]
+    assert "- Küsimus: Küsimus 0: mis kursus sobib? → soovitati: Kursus 0" in sent[0]["content"]
+    assert info["turns_summarised"] == 4
+    assert info["sent_tokens"] == _tokens(sent) < info["full_tokens"] == _tokens([SYSTEM] + messages)
+
+
+def test_summary_then_oldest_turns_are_dropped_to_fit_the_budget():
+    messages = _chat(6, answer_words=60)
+    _, roomy = fit_history(SYSTEM, messages, budget=10_000, keep_turns=3)
+    budget = roomy["sent_tokens"] - 5
+    sent, info = fit_history(SYSTEM, messages, budget=budget, keep_turns=3)
+
+    assert info["sent_tokens"] == _tokens(sent) <= budget
+    assert info["turns_dropped"] >= 1 and sent[-1] == messages[-1]
+
+    sent, info = fit_history(SYSTEM, messages, budget=1, keep_turns=3)
+    assert sent == [SYSTEM, messages[-1]]  # over budget, but the question always goes
+    assert info["turns_dropped"] == 4 + 2  # four summary lines, two verbatim turns
+
+
+def test_summary_lists_each_course_once():
+    turn = [{"role": "user", "content": "  Masinõpe\n algajale "},
+            {"role": "assistant", "content": "- **Masinõpe**\n- **Andmekaeve**\n**Masinõpe** sobib"}]
+
+    assert summarize_turn(turn) == "- Küsimus: Masinõpe algajale → soovitati: Masinõpe, Andmekaeve"
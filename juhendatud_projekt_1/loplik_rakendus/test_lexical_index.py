@@ -0,0 +1,58 @@
+"""Reciprocal rank fusion and the lexical paths of rag.retrieve.
+
+    python -m pytest test_lexical_index.py
+"""
+import numpy as np
+
+from config import EAP_DEFAULT, FILTER_NONE
+from lexical_index import reciprocal_rank_fusion
+from rag import retrieve
+
+
+def _rows_of(store, rows):
+    return store.meta["unique_ID"].iloc[rows].astype(str).tolist()
+
+
+def test_rrf_prefers_rows_ranked_by_several_lists():
+    rows, scores = reciprocal_rank_fusion([np.array([1, 2, 3]), np.array([3, 4, 1])], k=3, rrf_k=60)
+
+    assert rows.tolist() == [1, 3, 2]
+    assert np.allclose(scores, [1 / 61 + 1 / 63, 1 / 63 + 1 / 61, 1 / 62])
+
+
+def test_rrf_breaks_ties_by_row_id():
+    rows, _ = reciprocal_rank_fusion([np.array([7, 5]), np.array([5, 7])], k=5)
+
+    assert rows.tolist() == [5, 7]
+    assert reciprocal_rank_fusion([], k=3)[0].size == 0
+
+
+def test_exact_code_skips_the_embedder(store, embedder):
+    rows, scores, info = retrieve(" ltat.02.002? ", store, store.all_rows(), embedder, 5)
+
+    assert _rows_of(store, rows) == ["LTAT.02.002-v1", "LTAT.02.002-v2"]
+    assert info["strategy"] == "exact_code" and np.all(scores == 1)
+    assert embedder.encoded == []
+
+
+def test_exact_name_respects_the_filters(store, embedder):
+    spring = store.filter(("kevad", FILTER_NONE, FILTER_NONE, FILTER_NONE, FILTER_NONE, EAP_DEFAULT))
+    rows, _, info = retrieve("Masinõpe", store, spring, embedder, 5)
+
+    assert _rows_of(store, rows) == ["LTAT.02.002-v1"] and info["strategy"] == "exact_code"
+
+
+def test_filtered_out_exact_match_falls_back_to_search(store, embedder):
+    doctoral = store.filter((FILTER_NONE, FILTER_NONE, "doktoriõpe", FILTER_NONE, FILTER_NONE, EAP_DEFAULT))
+    rows, _, info = retrieve("LTAT.02.002", store, doctoral, embedder, 5)
+
+    assert info.get("strategy") != "exact_code" and embedder.encoded == ["LTAT.02.002"]
+    assert _rows_of(store, rows) == ["MTMS.01.099"]
+
+
+def test_code_inside_a_question_is_fused_in(store, embedder):
+    rows, _, info = retrieve("kas MTAT.03.227 sobib algajale?", store, store.all_rows(), embedder, 3)
+
+    assert info["mentioned_codes"] == 1 and info["fusion"] == "rrf"
+    assert _rows_of(store, rows)[0] == "MTAT.03.227"
+    assert info["query_vector"].shape == (store.matrix.shape[1],)
@@ -0,0 +1,109 @@
+"""Hedged dispatch against mock_llm_server with a stalling primary model.
+
+    python -m pytest test_llm_dispatch.py
+"""
+import threading
+import time
+
+import pytest
+
+import llm_client
+from llm_dispatch import HedgedCompletion, ModelLatency
+from mock_llm_server import serve
+
+PRIMARY, FALLBACK = "primary/model", "fallback/model"
+MESSAGES = [{"role": "system", "content": "1. Masinõpe (LTAT.02.002)\n   Kood: LTAT.02.002"},
+            {"role": "user", "content": "masinõpe"}]
+STALL_S = 5.0
+
+
+@pytest.fixture
+def mock(request):
+    stall_rate = getattr(request, "param", 1.0)
+    server = serve(ttft_s=0.02, stall_rate=stall_rate, stall_s=STALL_S, stall_models=(PRIMARY,))
+    client = llm_client.get_client("mock", f"http://127.0.0.1:{server.server_address[1]}/v1")
+    yield server, client
+    server.shutdown()
+
+
+def _latency() -> ModelLatency:
+    return ModelLatency(window=50, min_samples=3, default_s=0.3, min_s=0.05, max_s=STALL_S * 2)
+
+
+def _wait_idle(timeout_s: float = 1.0) -> int:
+    deadline = time.perf_counter() + timeout_s
+    while llm_client.stats_snapshot()["in_flight"] and time.perf_counter() < deadline:
+        time.sleep(0.01)
+    return llm_client.stats_snapshot()["in_flight"]
+
+
+def test_stalled_primary_hands_over_to_fallback(mock):
+    server, client = mock
+    completion = HedgedCompletion(client, MESSAGES, [PRIMARY, FALLBACK], _latency())
+    start = time.perf_counter()
+    text = "".join(completion.deltas())
+
+    assert text
+    assert time.perf_counter() - start < STALL_S / 2
+    assert completion.info() == {"model": FALLBACK, "attempts": 2, "hedged": 1}
+    assert server.stats["stalls"] == 1
+
+
+def test_cancelled_attempt_frees_its_slot_during_the_stall(mock):
+    _, client = mock
+    "".join(HedgedCompletion(client, MESSAGES, [PRIMARY, FALLBACK], _latency()).deltas())
+
+    assert _wait_idle() == 0
+
+
+def test_hedged_away_attempts_keep_the_deadline_from_collapsing(mock):
+    _, client = mock
+    latency = _latency()
+    for _ in range(5):
+        "".join(HedgedCompletion(client, MESSAGES, [PRIMARY, FALLBACK], latency).deltas())
+
+    snapshot = latency.snapshot()[PRIMARY]
+    assert snapshot["samples"] == 5
+    assert snapshot["hedged"] == 5
+    # Censored samples are at least the deadline they ran past, so it never falls to min_s.
+    assert latency.deadline(PRIMARY) >= 0.3
+
+
+@pytest.mark.parametrize("mock", [0.0], indirect=True)
+def test_fast_primary_is_not_hedged(mock):
+    server, client = mock
+    latency = _latency()
+    completion = HedgedCompletion(client, MESSAGES, [PRIMARY, FALLBACK], latency)
+    "".join(completion.deltas())
+
+    assert completion.info() == {"model": PRIMARY, "attempts": 1, "hedged": 0}
+    assert latency.snapshot()[PRIMARY]["samples"] == 1
+
+
+def test_deadline_bounds_a_stalled_last_model(mock):
+    _, client = mock
+    latency = _latency()
+    completion = HedgedCompletion(client, MESSAGES, [PRIMARY], latency, deadline_s=0.5)
+    start = time.perf_counter()
+    with pytest.raises(TimeoutError):
+        "".join(completion.deltas())
+
+    assert time.perf_counter() - start < STALL_S / 2
+    assert _wait_idle() == 0
+    assert latency.snapshot()[PRIMARY]["cancelled"] == 1
+    assert latency.snapshot()[PRIMARY]["samples"] == 1  # the 0.5 s wait, as a censored sample
+
+
+def test_cancel_wakes_the_stalled_reader(mock):
+    _, client = mock
+    unwoken = llm_client.stats_snapshot()["unwoken_aborts"]
+    "".join(HedgedCompletion(client, MESSAGES, [PRIMARY, FALLBACK], _latency()).deltas())
+
+    def workers() -> int:
+        return sum(t.name.endswith("(_run)") for t in threading.enumerate())
+
+    deadline = time.perf_counter() + 1.0
+    while workers() and time.perf_counter() < deadline:
+        time.sleep(0.01)
+    assert workers() == 0  # the stalled attempt's thread returned long before the stall ended
+    assert llm_client.stats_snapshot()["unwoken_aborts"] == unwoken
@@ -0,0 +1,74 @@
+"""ResponseCache: exact and similar hits, keys, eviction and pruning.
+
+    python -m pytest test_response_cache.py
+"""
+import itertools
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+import response_cache
+from response_cache import ResponseCache, response_key
+
+KEY = response_key(["B", "A"], "Semester: kevad", "model", "v1")
+
+
+def _unit(*values) -> np.ndarray:
+    vec = np.array(values, dtype=np.float32)
+    return vec / np.linalg.norm(vec)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResponseCache(str(tmp_path / "vastused.sqlite"), min_similarity=0.9)
+
+
+def test_key_ignores_course_order_but_not_the_rest():
+    assert KEY == response_key(["A", "B"], "Semester: kevad", "model", "v1")
+    assert KEY != response_key(["A", "B"], "", "model", "v1")
+    assert KEY != response_key(["A", "B"], "Semester: kevad", "model", "v2")
+
+
+def test_exact_query_hits_without_a_vector(cache):
+    entry_id = cache.store(KEY, "Masinõpe algajatele", _unit(1, 0), "vastus", {"total": 10})
+
+    def no_vector():
+        raise AssertionError("an exact hit needs no query vector")
+
+    assert cache.lookup(KEY, " masinõpe  ALGAJATELE", no_vector) == (entry_id, "vastus", {"total": 10}, 1.0)
+    assert cache.lookup(response_key(["A"], "", "model", "v1"), "masinõpe algajatele", no_vector) is None
+
+
+def test_similar_query_hits_above_the_threshold(cache):
+    cache.store(KEY, "masinõpe algajatele", _unit(1, 0), "vastus", None)
+
+    hit = cache.lookup(KEY, "masinõppe kursused algajale", lambda: _unit(1, 0.2))
+    assert hit[1] == "vastus" and 0.9 <= hit[3] < 1.0
+    assert cache.lookup(KEY, "keemia", lambda: _unit(0, 1)) is None
+    assert cache.stats_snapshot() == {"exact_hits": 0, "similar_hits": 1, "misses": 1, "evicted": 0, "size": 1}
+
+
+def test_evicted_answer_is_not_served_again(cache):
+    entry_id = cache.store(KEY, "masinõpe", _unit(1, 0), "halb vastus", None)
+    cache.evict(entry_id)
+
+    assert cache.lookup(KEY, "masinõpe", lambda: _unit(1, 0)) is None
+    assert cache.stats_snapshot()["evicted"] == 1
+
+
+def test_least_recently_used_rows_are_pruned_past_the_slack(tmp_path, monkeypatch):
+    monkeypatch.setattr(response_cache, "CACHE_PRUNE_SLACK", 0.5)
+    ticks = itertools.count()
+    monkeypatch.setattr(response_cache, "time", SimpleNamespace(time=lambda: float(next(ticks))))
+    cache = ResponseCache(str(tmp_path / "vastused.sqlite"), max_rows=4)
+    vectors = np.eye(8, dtype=np.float32)  # orthogonal: only exact queries can hit
+    for i in range(6):
+        cache.store(KEY, f"päring {i}", vectors[i], f"vastus {i}", None)
+    assert cache.stats_snapshot()["size"] == 6
+    cache.lookup(KEY, "päring 0", lambda: vectors[0])  # used again, so kept
+
+    cache.store(KEY, "päring 6", vectors[6], "vastus 6", None)
+    assert cache.stats_snapshot()["size"] == 4
+    assert cache.lookup(KEY, "päring 0", lambda: vectors[7]) is not None
+    assert cache.lookup(KEY, "päring 1", lambda: vectors[7]) is None
@@ -0,0 +1,60 @@
+"""RetrievalCache: keys, LRU bound, TTL, invalidation and the cached retrieval path.
+
+    python -m pytest test_result_cache.py
+"""
+import time
+
+from config import EAP_DEFAULT, FILTER_NONE
+from rag import cached_rank_for_context
+from result_cache import RetrievalCache, retrieval_key
+
+NO_FILTERS = (FILTER_NONE,) * 5 + (EAP_DEFAULT,)
+
+
+def test_key_normalises_the_query_and_the_eap_range():
+    assert retrieval_key(" Masinõpe  ", NO_FILTERS[:5] + ([1, 36],), "v1", 8) == \
+        retrieval_key("masinõpe", NO_FILTERS, "v1", 8)
+    assert retrieval_key("masinõpe", NO_FILTERS, "v1", 8) != retrieval_key("masinõpe", NO_FILTERS, "v2", 8)
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = RetrievalCache(maxsize=2, ttl_s=60)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+
+    assert cache.get("b") is None and cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.stats_snapshot()["evicted"] == 1
+
+
+def test_entries_expire_after_the_ttl():
+    cache = RetrievalCache(ttl_s=0.05)
+    cache.put("a", 1)
+    assert cache.get("a") == 1
+    time.sleep(0.1)
+
+    assert cache.get("a") is None
+    assert cache.stats_snapshot() == {"hits": 1, "misses": 1, "expired": 1, "evicted": 0, "invalidated": 0,
+                                      "size": 0, "hit_rate": 0.5}
+
+
+def test_invalidate_drops_everything():
+    cache = RetrievalCache()
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.invalidate()
+
+    assert cache.get("a") is None and cache.stats_snapshot()["invalidated"] == 2
+
+
+def test_hit_skips_embedding_and_keeps_the_query_vector(store, embedder):
+    cache = RetrievalCache()
+    first = cached_rank_for_context("andmete analüüs", store, NO_FILTERS, embedder, cache, 4)
+    again = cached_rank_for_context("Andmete  analüüs", store, NO_FILTERS, embedder, cache, 4)
+
+    assert embedder.encoded == ["andmete analüüs"]
+    assert again[0] == first[0] == len(store)
+    assert again[1].tolist() == first[1].tolist()
+    assert again[3]["result_cache"]["hit"] and not first[3]["result_cache"]["hit"]
+    assert again[3]["query_vector"] is first[3]["query_vector"]
@@ -0,0 +1,61 @@
+"""Pre-rendered snippets and fitting the context into the token budget.
+
+    python -m pytest test_snippets.py
+"""
+import numpy as np
+import pandas as pd
+
+from rag import build_context, rank_for_context
+from snippets import build_snippets, fit_to_budget
+from tokens import count_tokens
+
+QUERY = "andmete analüüs ja meetodid"
+
+
+def test_snippets_are_aligned_with_their_token_counts():
+    meta = pd.DataFrame({
+        "aine_kood": ["A.01.001", "B.02.002"], "nimi_et": ["Algebra", None], "nimi_en": ["Algebra", "Botany"],
+        "eap": [6.0, np.nan], "kirjeldus": ["x" * 900, None],
+    })
+    snippets, token_counts, names = build_snippets(meta)
+
+    assert names.tolist() == ["Algebra", "Botany"]  # the English name stands in for a missing one
+    assert snippets[0].startswith("Algebra (Algebra)\n   Kood: A.01.001\n   EAP: 6.0 | Semester: ?")
+    assert "Kirjeldus: " + "x" * 500 + "\n" in snippets[0]
+    assert "EAP: ? |" in snippets[1] and "Kirjeldus: \n" in snippets[1]
+    assert token_counts.tolist() == [count_tokens(s) for s in snippets]
+
+
+def test_fit_to_budget_counts_whole_snippets_and_keeps_one():
+    counts = np.array([100, 50, 30])
+
+    assert fit_to_budget(counts, 150) == 2
+    assert fit_to_budget(counts, 179) == 2
+    assert fit_to_budget(counts, 180) == 3
+    assert fit_to_budget(counts, 10) == 1
+
+
+def test_snippet_context_is_trimmed_to_the_budget(store, embedder):
+    top_rows, _, _ = rank_for_context(QUERY, store, store.all_rows(), embedder, 6, 10_000, encode=False)
+    budget = int(store.snippet_tokens[top_rows[:3]].sum())
+    fitted, scores, info = rank_for_context(QUERY, store, store.all_rows(), embedder, 6, budget, encode=False)
+
+    assert fitted.tolist() == top_rows[:3].tolist() and len(scores) == 3
+    assert info["context_courses"] == 3
+
+
+def test_encoded_context_fits_the_budget_with_more_courses(store, embedder):
+    top_rows, scores, _ = rank_for_context(QUERY, store, store.all_rows(), embedder, 8, encode=True)
+    budget = int(store.snippet_tokens[top_rows[:5]].sum())
+    text, names, shown, info = build_context(store, top_rows, scores, encode=True, token_budget=budget)
+
+    assert count_tokens(text) == info["context_tokens"] <= budget
+    assert info["context_courses_before"] == 5 < info["context_courses"] == len(shown) == len(names)
+    assert shown["unique_ID"].tolist() == store.meta["unique_ID"].iloc[top_rows[:len(shown)]].tolist()
+
+
+def test_encoded_context_keeps_one_course_over_budget(store, embedder):
+    top_rows, scores, _ = rank_for_context(QUERY, store, store.all_rows(), embedder, 4, encode=True)
+    _, _, shown, info = build_context(store, top_rows, scores, encode=True, token_budget=1)
+
+    assert info["context_courses"] == len(shown) == 1
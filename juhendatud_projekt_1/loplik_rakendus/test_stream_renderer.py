@@ -0,0 +1,78 @@
+"""StreamRenderer: coalesced flushes, paragraph boundaries and stream stats.
+
+    python -m pytest test_stream_renderer.py
+"""
+import time
+
+from llm import StreamRenderer, render_stream
+
+
+class RecordingPlaceholder:
+    def __init__(self):
+        self.rendered = []
+
+    def markdown(self, text):
+        self.rendered.append(text)
+
+
+def _renderer(flush_s: float = 3600):
+    placeholder = RecordingPlaceholder()
+    return StreamRenderer(placeholder, flush_s=flush_s), placeholder
+
+
+def test_pieces_are_coalesced_until_finish():
+    renderer, placeholder = _renderer()
+    for piece in ["Sobivad ", "kursused ", "on ", "need."]:
+        renderer.add(piece)
+
+    assert placeholder.rendered == []
+    assert renderer.finish() == "Sobivad kursused on need."
+    assert placeholder.rendered == ["Sobivad kursused on need."] and renderer.flushes == 1
+
+
+def test_paragraph_break_flushes_within_one_piece():
+    renderer, placeholder = _renderer()
+    for piece in ["- **Masinõpe**", "\n\n", "- **Andmekaeve**"]:
+        renderer.add(piece)
+
+    assert placeholder.rendered == ["- **Masinõpe**\n\n"]
+
+
+def test_paragraph_break_flushes_across_two_pieces():
+    renderer, placeholder = _renderer()
+    for piece in ["- **Masinõpe**\n", "\n- **Andmekaeve**", " sobib"]:
+        renderer.add(piece)
+
+    assert placeholder.rendered == ["- **Masinõpe**\n\n- **Andmekaeve**"]
+    renderer.finish()
+    assert placeholder.rendered[-1] == "- **Masinõpe**\n\n- **Andmekaeve** sobib"
+
+
+def test_single_newlines_do_not_flush():
+    renderer, placeholder = _renderer()
+    for piece in ["a\n", "b\n", "c"]:
+        renderer.add(piece)
+
+    assert placeholder.rendered == []
+
+
+def test_time_cadence_flushes():
+    renderer, placeholder = _renderer(flush_s=0.01)
+    renderer.add("esimene ")
+    time.sleep(0.02)
+    renderer.add("teine")
+
+    assert placeholder.rendered == ["esimene teine"]
+
+
+def test_render_stream_reports_timings():
+    def deltas():
+        time.sleep(0.05)
+        yield "Tere "
+        yield "maailm"
+
+    text, stats = render_stream(deltas(), RecordingPlaceholder())
+
+    assert text == "Tere maailm"
+    assert stats["ttft_s"] >= 0.05 and stats["stream_s"] >= stats["ttft_s"]
+    assert stats["flushes"] >= 1 and "tokens_per_s" in stats
@@ -2,18 +2,86 @@ import streamlit as st
 
 import pandas as pd
 
-from config import MODEL_NAME
+from compact_answer import CardStream, json_mode_requests
+from config import COMPACT_ANSWERS, CONTEXT_ENCODER
+from data_loader import get_models
 from llm import build_system_prompt
+from llm_dispatch import complete
 from rag import do_rag
 
 
-def run_test_cases(client, embedder, df, embeddings_df, test_cases_df, test_count):
+def answer_test_case(client, query: str, store, embedder, compact: bool = COMPACT_ANSWERS,
+                     encode: bool = CONTEXT_ENCODER):
+    """RAG and LLM for one test query as a first chat turn without filters.
+    Returns (answer_text, answer_ids, rag_found_ids, usage); answer_ids are the picks of a
+    compact answer, empty for a free-text one."""
+    context_text, course_names, results_display, _ = do_rag(query, store, store.all_rows(), embedder,
+                                                            encode=encode)
+
+    rag_found_ids = set()
+    if not results_display.empty and "unique_ID" in results_display.columns:
+        rag_found_ids = set(results_display["unique_ID"].tolist())
+
+    course_ids = results_display["unique_ID"].astype(str).tolist() if compact else None
+    system_prompt = build_system_prompt(
+        context_text if context_text else "",
+        course_names,
+        "filtrid puuduvad", len(store), len(store),
+        course_ids, encode,
+    )
+    messages_to_send = [system_prompt, {"role": "user", "content": query}]
+
+    try:
+        if not compact:
+            llm_response, usage, _ = complete(client, messages_to_send)
+            return llm_response, [], rag_found_ids, usage
+        cards = CardStream(results_display)
+        raw, usage, _ = complete(client, messages_to_send, model_request=json_mode_requests())
+        return "".join(cards([raw])), cards.picked_ids, rag_found_ids, usage
+    except Exception as e:
+        return f"VIGA: {e}", [], rag_found_ids, None
+
+
+def evaluate_case(expected_ids_str: str, rag_found_ids: set, llm_response: str, course_codes: list,
+                  answer_ids=()) -> tuple[bool, str]:
+    """(passed, reason) of one test case; expected "-" means no course should be recommended."""
+    expected_ids = set()
+    should_be_empty = False
+
+    if expected_ids_str == "-":
+        should_be_empty = True
+    else:
+        expected_ids = {x.strip() for x in expected_ids_str.split(",") if x.strip()}
+
+    missing_from_rag = [eid for eid in expected_ids if eid not in rag_found_ids]
+
+    if should_be_empty:
+        if (
+            len(rag_found_ids) == 0
+            or "ei leidu" in llm_response.lower()
+            or "ei leidnud" in llm_response.lower()
+            or "pole" in llm_response.lower()
+            or not any(x in llm_response for x in course_codes)
+        ):
+            return True, "Vastus tühi vastavalt ootusele (-)"
+        return False, "LLM/RAG tagastas aineid, kuigi ootus oli -"
+    if len(missing_from_rag) > 0:
+        return False, f"RAG ei leidnud ID-sid: {', '.join(missing_from_rag)}"
+    missing_ids = [eid for eid in expected_ids if eid not in llm_response and eid not in answer_ids]
+    if len(missing_ids) == 0:
+        return True, "RAG ja LLM leidsid kõik oodatud ained"
+    return False, f"RAG leidis, aga LLM vastuses puuduvad: {', '.join(missing_ids)}"
+
+
+def run_test_cases(client, test_cases_df, test_count):
     st.subheader(f"Testitulemused ({test_count} testi)")
+    embedder, store = get_models()
 
     test_cases_to_run = test_cases_df.head(test_count)
     results_list = []
     progress_bar = st.progress(0)
     progress_text = st.empty()
+    course_codes = store.meta["aine_kood"].tolist()
 
     for i, (_, row) in enumerate(test_cases_to_run.iterrows()):
         query = row.iloc[0]
@@ -21,72 +89,9 @@ def run_test_cases(client, embedder, df, embeddings_df, test_cases_df, test_coun
 
         progress_text.caption(f"Töötlus: test {i + 1}/{test_count} · päring: {query[:60]}")
 
-        expected_ids = set()
-        should_be_empty = False
-
-        if expected_ids_str == "-":
-            should_be_empty = True
-        else:
-            expected_ids = {x.strip() for x in expected_ids_str.split(",") if x.strip()}
-
-        merged = pd.merge(df, embeddings_df, on="unique_ID")
-        context_text, course_names, results_display = do_rag(query, merged, embedder, n=5)
-
-        rag_found_ids = set()
-        if not results_display.empty and "unique_ID" in results_display.columns:
-            rag_found_ids = set(results_display["unique_ID"].tolist()[:5])
-
-        system_prompt = build_system_prompt(
-            context_text if context_text else "",
-            course_names,
-            "filtrid puuduvad", len(merged), len(merged)
-        )
-
-        messages_to_send = [system_prompt, {"role": "user", "content": query}]
-
         print(f"Test case {i}: {query}")
-
-        llm_response = ""
-        try:
-            stream = client.chat.completions.create(
-                model=MODEL_NAME,
-                messages=messages_to_send,
-                stream=False
-            )
-            llm_response = stream.choices[0].message.content
-        except Exception as e:
-            llm_response = f"VIGA: {e}"
-
-        missing_from_rag = [eid for eid in expected_ids if eid not in rag_found_ids]
-
-        passed = False
-        reason = ""
-
-        if should_be_empty:
-            if (
-                len(rag_found_ids) == 0
-                or "ei leidu" in llm_response.lower()
-                or "ei leidnud" in llm_response.lower()
-                or "pole" in llm_response.lower()
-                or not any(x in llm_response for x in df["aine_kood"].tolist())
-            ):
-                passed = True
-                reason = "Vastus tühi vastavalt ootusele (-)"
-            else:
-                passed = False
-                reason = "LLM/RAG tagastas aineid, kuigi ootus oli -"
-        else:
-            if len(missing_from_rag) > 0:
-                passed = False
-                reason = f"RAG ei leidnud ID-sid: {', '.join(missing_from_rag)}"
-            else:
-                missing_ids = [eid for eid in expected_ids if eid not in llm_response]
-                if len(missing_ids) == 0:
-                    passed = True
-                    reason = "RAG ja LLM leidsid kõik oodatud ained"
-                else:
-                    passed = False
-                    reason = f"RAG leidis, aga LLM vastuses puuduvad: {', '.join(missing_ids)}"
+        llm_response, answer_ids, rag_found_ids, _ = answer_test_case(client, query, store, embedder)
+        passed, reason = evaluate_case(expected_ids_str, rag_found_ids, llm_response, course_codes, answer_ids)
 
         results_list.append({
             "Päring": query,
@@ -0,0 +1,108 @@
+"""Read-only side store for the long text columns of the course table.
+
+All texts of a dataset version are concatenated into one UTF-8 file that is
+opened with np.memmap; per column, an offsets array in the ``.idx.npz`` next
+to it says where each row's text starts. Reading a row is a slice and a
+decode, so a worker only ever touches the pages of the courses it shows, and
+like the embedding store those pages are shared by every process on the host.
+
+Files are named after the dataset version (``<base>.<version>.utf8``), so
+workers that load different versions never overwrite each other's files.
+"""
+import glob
+import os
+
+import numpy as np
+import pandas as pd
+
+BLOB_SUFFIX = ".utf8"
+INDEX_SUFFIX = ".idx.npz"
+
+
+class TextColumn:
+    """One column of the side store; rows[...] returns an object array of str (None = missing)."""
+
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray, missing: np.ndarray):
+        self._blob = blob
+        self._offsets = offsets
+        self._missing = missing
+
+    def __len__(self):
+        return len(self._missing)
+
+    @property
+    def nbytes(self) -> int:
+        """Heap bytes of this column in a worker; the texts themselves are in the shared mapping."""
+        return int(self._offsets.nbytes + self._missing.nbytes)
+
+    def _get(self, row: int):
+        if self._missing[row]:
+            return None
+        return self._blob[self._offsets[row]:self._offsets[row + 1]].tobytes().decode("utf-8")
+
+    def __getitem__(self, rows):
+        if np.isscalar(rows):
+            return self._get(int(rows))
+        rows = np.asarray(rows)
+        if rows.dtype == bool:
+            rows = np.flatnonzero(rows)
+        out = np.empty(len(rows), dtype=object)
+        out[:] = [self._get(int(r)) for r in rows]
+        return out
+
+
+class TextStore:
+    def __init__(self, path_prefix: str):
+        with np.load(path_prefix + INDEX_SUFFIX, allow_pickle=False) as index:
+            self.version = str(index["version"])
+            names = index["columns"].tolist()
+            arrays = {name: (index[f"{name}__offsets"], index[f"{name}__missing"]) for name in names}
+        size = os.path.getsize(path_prefix + BLOB_SUFFIX)
+        # np.memmap refuses empty files; an all-empty store needs no mapping anyway.
+        blob = np.memmap(path_prefix + BLOB_SUFFIX, dtype=np.uint8, mode="r") if size else np.empty(0, np.uint8)
+        self.disk_bytes = size
+        self.columns = {name: TextColumn(blob, *arrays[name]) for name in names}
+
+    def __getitem__(self, column: str) -> TextColumn:
+        return self.columns[column]
+
+
+def write_text_store(path_prefix: str, columns: dict, version: str):
+    """Writes {column: sequence of str/None}; the index is written last and marks completion."""
+    tmp = f"{path_prefix}.{os.getpid()}.tmp"
+    arrays = {}
+    position = 0
+    with open(tmp + BLOB_SUFFIX, "wb") as f:
+        for name, values in columns.items():
+            offsets = np.empty(len(values) + 1, dtype=np.int64)
+            missing = np.zeros(len(values), dtype=bool)
+            offsets[0] = position
+            for i, value in enumerate(values):
+                if value is None:
+                    missing[i] = True
+                else:
+                    data = value.encode("utf-8")
+                    f.write(data)
+                    position += len(data)
+                offsets[i + 1] = position
+            arrays[f"{name}__offsets"], arrays[f"{name}__missing"] = offsets, missing
+    np.savez(tmp + INDEX_SUFFIX, version=np.array(version), columns=np.array(list(columns), dtype=str), **arrays)
+    os.replace(tmp + BLOB_SUFFIX, path_prefix + BLOB_SUFFIX)
+    os.replace(tmp + INDEX_SUFFIX, path_prefix + INDEX_SUFFIX)
+
+
+def open_text_store(base: str, frame: pd.DataFrame, version: str) -> TextStore:
+    """Side store of *frame*'s columns for *version*, written first if this version has none yet.
+    Files of older versions are removed; workers still mapping them keep reading fine."""
+    path_prefix = f"{base}.{version}"
+    if not os.path.exists(path_prefix + INDEX_SUFFIX):
+        write_text_store(path_prefix, {
+            col: frame[col].astype(object).where(frame[col].notna(), None).tolist() for col in frame.columns
+        }, version)
+        for old in glob.glob(f"{glob.escape(base)}.*{INDEX_SUFFIX}") + glob.glob(f"{glob.escape(base)}.*{BLOB_SUFFIX}"):
+            if not old.startswith(path_prefix + ".") or old.endswith(".tmp" + BLOB_SUFFIX):
+                try:
+                    os.remove(old)
+                except OSError:
+                    pass
+    return TextStore(path_prefix)
@@ -0,0 +1,10 @@
+import math
+import re
+
+TOKEN_PIECE_RE = re.compile(r"\w+|[^\w\s]")
+
+
+def count_tokens(text) -> int:
+    """Local approximation of the LLM token count: one token per punctuation mark and
+    roughly one per four characters of every word (Estonian words split into several pieces)."""
+    return sum(max(1, math.ceil(len(piece) / 4)) for piece in TOKEN_PIECE_RE.findall(str(text)))
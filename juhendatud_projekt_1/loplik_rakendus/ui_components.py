@@ -4,7 +4,9 @@ from pathlib import Path
 
 import streamlit as st
 
-from config import ASSISTANT_AVATAR, EAP_DEFAULT, FILTER_NONE, USER_AVATAR
+from config import ASSISTANT_AVATAR, EAP_DEFAULT, FILTER_NONE, LLM_MODELS, USER_AVATAR
+from course_store import memory_summary
+from data_loader import get_response_cache
 from feedback import log_feedback
 from filters import get_active_filters, get_pending_filters_tuple
 from query_handlers import handle_first_query
@@ -20,6 +22,77 @@ def render_debug_expander(debug: dict, idx: int):
     with st.expander("🔍 Vaata kapoti alla (RAG ja filtrid)"):
         st.caption(f"**Aktiivsed filtrid:** {debug.get('filters', 'Info puudub')}")
         st.write(f"Filtrid jätsid andmestikku alles **{debug.get('filtered_count', 0)}** kursust.")
+        if debug.get("dataset_version"):
+            st.caption(f"**Andmestiku versioon:** {debug['dataset_version']}")
+        memory_report = debug.get("memory_report")
+        if memory_report is not None:
+            memory = memory_summary(memory_report)
+            st.caption(
+                f"**Kursuste tabel mälus:** {memory['now_mib']:.1f} MiB töötaja kohta "
+                f"(enne {memory['before_mib']:.1f} MiB, −{memory['saved']:.0%})"
+                + (f" · tekstid kettal {memory['disk_mib']:.1f} MiB, ühised kõigile töötajatele"
+                   if memory["disk_mib"] else "")
+            )
+            if st.checkbox("Näita mälu veergude kaupa", key=f"memory_report_{idx}"):
+                st.dataframe(memory_report, hide_index=True)
+        search_info = debug.get("search_info")
+        if search_info:
+            st.caption(
+                f"**Otsingustrateegia:** {search_info.get('strategy')} · "
+                f"selektiivsus {search_info.get('selectivity', 0):.1%} · "
+                f"otsing {search_info.get('search_ms', 0):.2f} ms · "
+                f"päringu vektor {search_info.get('embed_ms', 0):.1f} ms"
+                + (
+                    f" · BM25 {search_info['lexical_hits']} vastet ({search_info['lexical_ms']:.2f} ms)"
+                    if "lexical_hits" in search_info else ""
+                )
+                + (f" · mainitud ainekoode {search_info['mentioned_codes']}" if "mentioned_codes" in search_info else "")
+                + (", RRF" if search_info.get("fusion") == "rrf" else "")
+                + (
+                    f" · esimene käik {search_info['first_pass']}, täpselt üle hinnatud {search_info['rescored']}"
+                    if "first_pass" in search_info else ""
+                )
+            )
+        result_cache = (search_info or {}).get("result_cache")
+        if result_cache:
+            st.caption(
+                f"**Otsingutulemuste vahemälu:** {'tabamus' if result_cache['hit'] else 'arvutatud'} · "
+                f"tabamuste määr {result_cache['hit_rate']:.0%} ({result_cache['hits']}/"
+                f"{result_cache['hits'] + result_cache['misses']}) · aegunud {result_cache['expired']} · "
+                f"kirjeid {result_cache['size']}"
+            )
+        response_cache = debug.get("response_cache")
+        if response_cache:
+            st.caption(
+                f"**LLM-i vastuste vahemälu:** "
+                + (f"vastus vahemälust (sarnasus {response_cache['similarity']:.3f})"
+                   if response_cache["hit"] else "uus vastus salvestatud")
+                + f" · täpseid tabamusi {response_cache['exact_hits']} · sarnaseid {response_cache['similar_hits']}"
+                f" · möödas {response_cache['misses']} · kirjeid {response_cache['size']}"
+            )
+        for model, stats in (debug.get("llm_models") or {}).items():
+            st.caption(
+                f"**{model}:** päringuid {stats.get('requests', 0)} · esimesena {stats.get('wins', 0)} · "
+                f"varupäringuid {stats.get('hedged', 0)} · tühistatud {stats.get('cancelled', 0)} · "
+                f"vigu {stats.get('errors', 0)} · TTFT p95 "
+                + (f"{stats['p95_s']:.2f} s" if stats["p95_s"] is not None else "–")
+                + f" · ooteaeg {stats['deadline_s']:.1f} s"
+            )
+        if search_info and "context_tokens" in search_info:
+            before = search_info.get("context_tokens_before")
+            st.caption(
+                f"**LLM-i kontekst:** {search_info['context_courses']} kursust · "
+                f"~{search_info['context_tokens']:,} tokenit"
+                + (f" (plokkidena {search_info.get('context_courses_before', '?')} kursust ~{before:,} tokenit; "
+                   f"päringulähedased laused {search_info.get('sentences_by_query', 0)} kursusel)" if before else "")
+            )
+        cache_stats = (search_info or {}).get("query_cache")
+        if cache_stats:
+            st.caption(
+                f"**Päringuvektorite vahemälu:** mälust {cache_stats['hits']} · "
+                f"kettalt {cache_stats['disk_hits']} · arvutatud {cache_stats['misses']} · "
+                f"kirjeid mälus {cache_stats['size']}"
+            )
 
         st.write("**RAG otsingu tulemus (Top leitud kursust):**")
         ctx_df = debug.get("context_df")
@@ -37,6 +110,9 @@ def render_debug_expander(debug: dict, idx: int):
             disabled=True,
             key=f"prompt_area_{idx}",
         )
+        if debug.get("llm_raw"):
+            st.caption("**Mudeli kompaktne vastus** (kaardid on koostatud andmetest):")
+            st.code(debug["llm_raw"], language="json")
 
 
 def render_feedback_form(debug: dict, message_content: str, idx: int):
@@ -68,6 +144,10 @@ def render_feedback_form(debug: dict, message_content: str, idx: int):
                     ctx_ids, ctx_names,
                     message_content, rating, kato,
                 )
+                cache_info = debug.get("response_cache")
+                if rating == "👎 Halb" and cache_info and get_response_cache() is not None:
+                    # A bad answer must not be served to the next student asking the same.
+                    get_response_cache().evict(cache_info["id"])
                 st.success("Tagasiside salvestatud tagasiside_log.csv faili!")
 
 
@@ -80,16 +160,29 @@ def render_chat_history():
             st.markdown(message["content"])
             if message["role"] == "assistant" and "usage" in message and message["usage"]:
                 usage = message["usage"]
-                st.markdown(
-                    (
-                        '<p class="usage-caption">'
+                if "cached_total" in usage:
+                    usage_text = f"Vastus vahemälust · säästetud ~{usage['cached_total']:,} tokenit"
+                else:
+                    usage_text = (
                         f"LLM kasutus · sisend: {usage.get('prompt', 0):,} · "
                         f"väljund: {usage.get('completion', 0):,} · "
                         f"kokku: {usage.get('total', 0):,}"
-                        "</p>"
-                    ),
-                    unsafe_allow_html=True,
-                )
+                    )
+                    if usage.get("history_saved"):
+                        usage_text += (
+                            f" · ajaloo kärpimine säästis ~{usage['history_saved']:,} sisendtokenit "
+                            f"({usage['history_saved'] / usage['history_full']:.0%})"
+                        )
+                    if usage.get("ttft_s") is not None:
+                        usage_text += f" · esimene token {usage['ttft_s']:.2f} s"
+                        if usage.get("tokens_per_s"):
+                            usage_text += f" · {usage['tokens_per_s']:.0f} tokenit/s"
+                        usage_text += f" · voog kokku {usage['stream_s']:.1f} s"
+                    if usage.get("model") and usage["model"] != LLM_MODELS[0]:
+                        usage_text += f" · vastas varumudel {usage['model']}"
+                    elif usage.get("hedged"):
+                        usage_text += " · põhimudel jõudis varupäringust ette"
+                st.markdown(f'<p class="usage-caption">{usage_text}</p>', unsafe_allow_html=True)
             if message["role"] == "assistant" and "debug_info" in message:
                 render_debug_expander(message["debug_info"], i)
                 render_feedback_form(message["debug_info"], message["content"], i)
@@ -149,7 +242,7 @@ def render_top_panel(test_cases_df):
     return api_key, test_count, run_tests
 
 
-def render_chat_filter_gate(api_key, client, embedder, df, embeddings_df):
+def render_chat_filter_gate(api_key, client):
     pending_query = st.session_state.get("pending_query")
     if not pending_query:
         return
@@ -178,7 +271,7 @@ def render_chat_filter_gate(api_key, client, embedder, df, embeddings_df):
                     st.session_state.collecting_filter_values = False
                     query_to_run = st.session_state.pending_query
                     st.session_state.pending_query = None
-                    handle_first_query(query_to_run, client, embedder, df, embeddings_df, (
+                    handle_first_query(query_to_run, client, (
                         FILTER_NONE, FILTER_NONE, FILTER_NONE,
                         FILTER_NONE, FILTER_NONE, EAP_DEFAULT,
                     ))
@@ -265,4 +358,4 @@ def render_chat_filter_gate(api_key, client, embedder, df, embeddings_df):
                     query_to_run = st.session_state.pending_query
                     st.session_state.pending_query = None
                     st.session_state.collecting_filter_values = False
-                    handle_first_query(query_to_run, client, embedder, df, embeddings_df, filters)
+                    handle_first_query(query_to_run, client, filters)